@@ -1,9 +1,56 @@
 import streamlit as st
-import pandas as pd
+import html
+import os
 import numpy as np
-import json
+from functools import partial
 from datetime import datetime
 
+from src.cache import ARTIFACTS
+from src.duplicates import study_duplicate_keys
+from src.export import EXPORT_FORMATS, cached_export
+from src.forms import form_layout
+from src.metrics import gauge, recorder, span, timed
+from src.plots import (
+    PLOT_FORMATS, forest_plot, inverse_variance_weights, sensitivity_plot, summary_plot, traffic_light,
+    traffic_light_pages,
+)
+from src.definitions import SCALE_DEFINITIONS, ScaleDefinitionError
+from src.scoring import QUALITY_LABELS, get_scale, rate_assessment, reload_changed_scales
+from src.store import STUDY_TYPES
+from src.workspace import ConflictError, open_workspace
+from src.theme import APP_CSS, DEVELOPER_HTML, FOOTER_HTML, HEADER_HTML
+
+# Sort choices on the View All Studies page, mapped to backend sort fields;
+# relevance only applies while searching and otherwise keeps the date order
+SORT_OPTIONS = {
+    "Relevance": "relevance",
+    "Date Added": "study_id",
+    "Study Name": "study_name",
+    "Publication Year": "publication_year",
+    "Study Type": "study_type",
+    "Total Stars": "total_stars",
+    "Quality": "quality_rating"
+}
+PAGE_SIZES = [10, 25, 50, 100]
+PREVIEW_ROWS = 100
+# On-screen figures; downloads keep the 300-DPI default
+SCREEN_DPI = 110
+BOOTSTRAP_CHOICES = [0, 200, 1000]
+# Moves of every scale's own cut-offs compared on the Sensitivity Analysis page
+SENSITIVITY_SHIFTS = (-2, -1, 1, 2)
+# Bootstrap replicates of the meta-analysis run on this many processes
+META_WORKERS = min(4, os.cpu_count() or 1)
+# Latest publication year accepted, as in src.validation
+LATEST_YEAR = datetime.now().year
+# How often a session checks the shared review for other reviewers' changes
+WORKSPACE_POLL_SECONDS = 5
+
+
+def max_stars():
+    """Highest total of any scale, read on every rerun so reloaded scales resize the star sliders"""
+    return max(get_scale(study_type).max_stars for study_type in STUDY_TYPES)
+
+
 # Set page configuration
 st.set_page_config(
     page_title="Newcastle-Ottawa Scale Assessment Tool",
@@ -13,844 +60,911 @@ st.set_page_config(
 )
 
 # Custom CSS styling
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(135deg, #2c3e50 0%, #3498db 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-    }
-    
-    .developer-info {
-        background: linear-gradient(135deg, #f3f4f6, #e5e7eb);
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #3498db;
-        margin: 1rem 0;
-    }
-    
-    .assessment-container {
-        background: linear-gradient(135deg, #f8f9fa, #e9ecef);
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 4px solid #3498db;
-        margin: 1rem 0;
-    }
-    
-    .study-card {
-        background: white;
-        padding: 1rem;
-        border-radius: 8px;
-        border: 2px solid #dee2e6;
-        margin: 0.5rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .domain-header {
-        background: linear-gradient(135deg, #6c757d, #495057);
-        color: white;
-        padding: 0.5rem 1rem;
-        border-radius: 5px;
-        font-weight: bold;
-        margin: 1rem 0 0.5rem 0;
-    }
-    
-    .good-quality {
-        background-color: #28a745;
-        color: white;
-        padding: 0.2rem 0.5rem;
-        border-radius: 3px;
-        font-size: 0.8rem;
-    }
-    
-    .fair-quality {
-        background-color: #ffc107;
-        color: black;
-        padding: 0.2rem 0.5rem;
-        border-radius: 3px;
-        font-size: 0.8rem;
-    }
-    
-    .poor-quality {
-        background-color: #dc3545;
-        color: white;
-        padding: 0.2rem 0.5rem;
-        border-radius: 3px;
-        font-size: 0.8rem;
-    }
-    
-    .summary-container {
-        background: linear-gradient(135deg, #e8f5e8, #d1ecf1);
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 2px solid #28a745;
-        margin: 1rem 0;
-    }
-    
-    .star-display {
-        font-size: 1.2rem;
-        color: #ffd700;
-    }
-    
-    .quality-bar {
-        height: 30px;
-        border-radius: 5px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        color: white;
-        font-weight: bold;
-        margin: 2px 0;
-    }
-    
-    .quality-good { background-color: #28a745; }
-    .quality-fair { background-color: #ffc107; color: black; }
-    .quality-poor { background-color: #dc3545; }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'studies' not in st.session_state:
-    st.session_state.studies = []
+st.markdown(APP_CSS, unsafe_allow_html=True)
+
+# Initialize session state; sessions on the same review share one workspace
+if 'backend' not in st.session_state:
+    st.session_state.backend = open_workspace(st.query_params.get("review"))
 if 'current_study' not in st.session_state:
     st.session_state.current_study = {}
 
-# Newcastle-Ottawa Scale criteria
-NOS_CRITERIA = {
-    "Cohort Studies": {
-        "Selection": {
-            "representativeness": {
-                "question": "1. Representativeness of the exposed cohort",
-                "options": {
-                    "truly_representative": "Truly representative of the average population in the community (★)",
-                    "somewhat_representative": "Somewhat representative of the average population in the community (★)",
-                    "selected_group": "Selected group of users (e.g., nurses, volunteers)",
-                    "no_description": "No description of the derivation of the cohort"
-                },
-                "stars": {"truly_representative": 1, "somewhat_representative": 1, "selected_group": 0, "no_description": 0}
-            },
-            "selection_nonexposed": {
-                "question": "2. Selection of the non-exposed cohort",
-                "options": {
-                    "same_community": "Drawn from the same community as the exposed cohort (★)",
-                    "different_source": "Drawn from a different source",
-                    "no_description": "No description of the derivation of the non-exposed cohort"
-                },
-                "stars": {"same_community": 1, "different_source": 0, "no_description": 0}
-            },
-            "ascertainment_exposure": {
-                "question": "3. Ascertainment of exposure",
-                "options": {
-                    "secure_record": "Secure record (e.g., surgical records) (★)",
-                    "structured_interview": "Structured interview where blind to case/control status (★)",
-                    "written_self_report": "Written self-report",
-                    "no_description": "No description"
-                },
-                "stars": {"secure_record": 1, "structured_interview": 1, "written_self_report": 0, "no_description": 0}
-            },
-            "outcome_not_present": {
-                "question": "4. Demonstration that outcome of interest was not present at start of study",
-                "options": {
-                    "yes": "Yes (★)",
-                    "no": "No"
-                },
-                "stars": {"yes": 1, "no": 0}
-            }
-        },
-        "Comparability": {
-            "comparability": {
-                "question": "5. Comparability of cohorts on the basis of the design or analysis",
-                "options": {
-                    "most_important": "Study controls for the most important factor (★)",
-                    "additional_factor": "Study controls for any additional factor (★★)",
-                    "no_control": "No control for confounding factors"
-                },
-                "stars": {"most_important": 1, "additional_factor": 2, "no_control": 0},
-                "max_stars": 2
-            }
-        },
-        "Outcome": {
-            "assessment_outcome": {
-                "question": "6. Assessment of outcome",
-                "options": {
-                    "independent_blind": "Independent blind assessment (★)",
-                    "record_linkage": "Record linkage (★)",
-                    "self_report": "Self-report",
-                    "no_description": "No description"
-                },
-                "stars": {"independent_blind": 1, "record_linkage": 1, "self_report": 0, "no_description": 0}
-            },
-            "adequate_followup_length": {
-                "question": "7. Was follow-up long enough for outcomes to occur",
-                "options": {
-                    "yes": "Yes (★)",
-                    "no": "No"
-                },
-                "stars": {"yes": 1, "no": 0}
-            },
-            "adequacy_followup": {
-                "question": "8. Adequacy of follow up of cohorts",
-                "options": {
-                    "complete_followup": "Complete follow up - all subjects accounted for (★)",
-                    "small_loss": "Subjects lost to follow up unlikely to introduce bias - small number lost (★)",
-                    "high_loss": "High rate of follow up but no description of those lost",
-                    "no_statement": "No statement"
-                },
-                "stars": {"complete_followup": 1, "small_loss": 1, "high_loss": 0, "no_statement": 0}
-            }
-        }
-    },
-    "Case-Control Studies": {
-        "Selection": {
-            "case_definition": {
-                "question": "1. Is the case definition adequate?",
-                "options": {
-                    "independent_validation": "Yes, with independent validation (★)",
-                    "record_linkage": "Yes, e.g., record linkage or based on self-reports",
-                    "no_description": "No description"
-                },
-                "stars": {"independent_validation": 1, "record_linkage": 0, "no_description": 0}
-            },
-            "representativeness_cases": {
-                "question": "2. Representativeness of the cases",
-                "options": {
-                    "consecutive_series": "Consecutive or obviously representative series of cases (★)",
-                    "potential_selection": "Potential for selection biases or not stated"
-                },
-                "stars": {"consecutive_series": 1, "potential_selection": 0}
-            },
-            "selection_controls": {
-                "question": "3. Selection of Controls",
-                "options": {
-                    "community_controls": "Community controls (★)",
-                    "hospital_controls": "Hospital controls",
-                    "no_description": "No description"
-                },
-                "stars": {"community_controls": 1, "hospital_controls": 0, "no_description": 0}
-            },
-            "definition_controls": {
-                "question": "4. Definition of Controls",
-                "options": {
-                    "no_history": "No history of disease (endpoint) (★)",
-                    "no_description": "No description of source"
-                },
-                "stars": {"no_history": 1, "no_description": 0}
-            }
-        },
-        "Comparability": {
-            "comparability": {
-                "question": "5. Comparability of cases and controls on the basis of the design or analysis",
-                "options": {
-                    "most_important": "Study controls for the most important factor (★)",
-                    "additional_factor": "Study controls for any additional factor (★★)",
-                    "no_control": "No control for confounding factors"
-                },
-                "stars": {"most_important": 1, "additional_factor": 2, "no_control": 0},
-                "max_stars": 2
-            }
-        },
-        "Exposure": {
-            "ascertainment_exposure": {
-                "question": "6. Ascertainment of exposure",
-                "options": {
-                    "secure_record": "Secure record (e.g., surgical records) (★)",
-                    "structured_interview": "Structured interview where blind to case/control status (★)",
-                    "interview_not_blinded": "Interview not blinded to case/control status",
-                    "written_self_report": "Written self-report or medical record only",
-                    "no_description": "No description"
-                },
-                "stars": {"secure_record": 1, "structured_interview": 1, "interview_not_blinded": 0, "written_self_report": 0, "no_description": 0}
-            },
-            "same_method": {
-                "question": "7. Same method of ascertainment for cases and controls",
-                "options": {
-                    "yes": "Yes (★)",
-                    "no": "No"
-                },
-                "stars": {"yes": 1, "no": 0}
-            },
-            "non_response_rate": {
-                "question": "8. Non-Response rate",
-                "options": {
-                    "same_rate": "Same rate for both groups (★)",
-                    "non_respondents": "Non-respondents described",
-                    "rate_different": "Rate different and no designation"
-                },
-                "stars": {"same_rate": 1, "non_respondents": 0, "rate_different": 0}
-            }
-        }
-    },
-    "Cross-Sectional Studies": {
-        "Selection": {
-            "representativeness": {
-                "question": "1. Representativeness of the sample",
-                "options": {
-                    "truly_representative": "Truly representative of the average population (★)",
-                    "somewhat_representative": "Somewhat representative of the average population (★)",
-                    "selected_group": "Selected group of users",
-                    "no_description": "No description of the sampling strategy"
-                },
-                "stars": {"truly_representative": 1, "somewhat_representative": 1, "selected_group": 0, "no_description": 0}
-            },
-            "sample_size": {
-                "question": "2. Sample size",
-                "options": {
-                    "justified": "Justified and satisfactory (★)",
-                    "not_justified": "Not justified"
-                },
-                "stars": {"justified": 1, "not_justified": 0}
-            },
-            "non_respondents": {
-                "question": "3. Non-respondents",
-                "options": {
-                    "comparability": "Comparability between respondents and non-respondents characteristics is established (★)",
-                    "response_rate": "Response rate satisfactory or non-respondents described",
-                    "no_description": "No description of non-respondents"
-                },
-                "stars": {"comparability": 1, "response_rate": 0, "no_description": 0}
-            },
-            "exposure_outcome": {
-                "question": "4. Ascertainment of the exposure (or risk factor)",
-                "options": {
-                    "validated_tool": "Validated measurement tool (★)",
-                    "non_validated": "Non-validated measurement tool or unclear"
-                },
-                "stars": {"validated_tool": 1, "non_validated": 0}
-            }
-        },
-        "Comparability": {
-            "comparability": {
-                "question": "5. The subjects in different outcome groups are comparable",
-                "options": {
-                    "most_important": "Study controls for the most important confounding factor (★)",
-                    "additional_factor": "Study controls for additional confounding factors (★★)",
-                    "no_control": "No control for confounding factors"
-                },
-                "stars": {"most_important": 1, "additional_factor": 2, "no_control": 0},
-                "max_stars": 2
-            }
-        },
-        "Outcome": {
-            "assessment_outcome": {
-                "question": "6. Assessment of the outcome",
-                "options": {
-                    "independent_blind": "Independent blind assessment (★)",
-                    "record_linkage": "Record linkage (★)",
-                    "self_report": "Self-report",
-                    "no_description": "No description"
-                },
-                "stars": {"independent_blind": 1, "record_linkage": 1, "self_report": 0, "no_description": 0}
-            },
-            "statistical_test": {
-                "question": "7. Statistical test",
-                "options": {
-                    "appropriate": "The statistical test used to analyze the data is clearly described and appropriate (★)",
-                    "inappropriate": "The statistical test is not appropriate, not described or incomplete"
-                },
-                "stars": {"appropriate": 1, "inappropriate": 0}
-            }
-        }
-    }
-}
+# Scale files edited while the app runs take effect on the next rerun; stored
+# studies are only rescored when the scales were actually reloaded
+try:
+    reload_changed_scales()
+except ScaleDefinitionError as exc:
+    st.error(f"Scale definitions were not reloaded: {exc}")
+st.session_state.backend.refresh_scales()
+
 
-def calculate_total_stars(assessment, study_type):
-    """Calculate total stars for an assessment"""
-    total_stars = 0
-    criteria = NOS_CRITERIA[study_type]
-    
-    for domain_name, domain in criteria.items():
-        for criterion_name, criterion in domain.items():
-            if criterion_name in assessment:
-                selected_option = assessment[criterion_name]
-                if selected_option in criterion["stars"]:
-                    stars = criterion["stars"][selected_option]
-                    # Handle special case for comparability (can have 2 stars)
-                    if criterion_name == "comparability" and "max_stars" in criterion:
-                        if selected_option == "most_important":
-                            total_stars += 1
-                        elif selected_option == "additional_factor":
-                            total_stars += 2
-                    else:
-                        total_stars += stars
-    
-    return total_stars
-
-def get_quality_rating(total_stars, study_type):
-    """Determine quality rating based on total stars"""
-    if study_type in ["Cohort Studies", "Case-Control Studies"]:
-        max_stars = 9
-        if total_stars >= 7:
-            return "Good Quality", "#28a745"
-        elif total_stars >= 5:
-            return "Fair Quality", "#ffc107"
-        else:
-            return "Poor Quality", "#dc3545"
-    else:  # Cross-sectional
-        max_stars = 8
-        if total_stars >= 6:
-            return "Good Quality", "#28a745"
-        elif total_stars >= 4:
-            return "Fair Quality", "#ffc107"
-        else:
-            return "Poor Quality", "#dc3545"
-
-def create_quality_visualization(studies_data):
+def create_quality_visualization(studies):
     """Create simple quality visualization using HTML/CSS"""
-    if not studies_data:
+    if not studies:
         return None
     
-    html_content = '<div style="margin: 20px 0;">'
+    quality_classes = ("quality-good", "quality-fair", "quality-poor")
+    # Each study is scored out of its own type's maximum (8 to 10 stars)
+    max_stars = studies.domain_max.sum(axis=1)[studies.column('study_type')]
+    rows = [
+        f'''
+        <div class="quality-bar {quality_classes[quality]}" style="margin: 5px 0;">
+            <strong>{html.escape(name)}</strong> - {QUALITY_LABELS[quality]} ({stars}/{top} stars) {"★" * stars}
+        </div>
+        '''
+        for name, quality, stars, top in zip(
+            studies.column('study_name'), studies.column('quality_rating').tolist(),
+            studies.column('total_stars').tolist(), max_stars.tolist(),
+        )
+    ]
+    return '<div style="margin: 20px 0;">' + "".join(rows) + '</div>'
+
+
+@st.fragment
+@timed("view/study_card")
+def render_study_card(backend, study_id, study, version):
+    """Render one study's expander on the View All Studies page.
+
+    Each card is a fragment, so its checkbox only reruns that card.
+    ``version`` is the study's version when the page was drawn; deleting
+    fails if another reviewer changed the study since.
+    """
+    with st.expander(f"{study['study_name']} - {study['quality_rating']}", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.write(f"**Authors:** {study['authors']}")
+            st.write(f"**Year:** {study['publication_year']}")
+            st.write(f"**Journal:** {study['journal']}")
+            
+        with col2:
+            st.write(f"**Study Type:** {study['study_type']}")
+            st.write(f"**Stars:** {'★' * study['total_stars']}")
+            st.write(f"**Quality:** {study['quality_rating']}")
+            
+        with col3:
+            st.write(f"**DOI:** {study.get('doi', 'N/A')}")
+            st.write(f"**Assessed:** {study['assessment_date']}")
+        
+        if study.get('notes'):
+            st.write(f"**Notes:** {study['notes']}")
+        
+        # Show detailed assessment
+        if st.checkbox(f"Show detailed assessment", key=f"detail_{study_id}"):
+            domain_scores = backend.domain_scores(study_id, study)
+            
+            # Option labels already end with the option's stars
+            for domain_name, fields in form_layout(study['study_type']):
+                st.write(f"**{domain_name}**")
+                
+                for field in fields:
+                    selected_option = study['assessment'].get(field.name, "")
+                    if selected_option in field.option_keys:
+                        option_label = field.labels[field.option_keys.index(selected_option)]
+                        st.write(f"- {field.question}: {option_label}")
+                
+                st.write(f"*Domain Stars: {domain_scores[domain_name][0]}*")
+                st.write("")
+        
+        # Delete button
+        if st.button(f"Delete Study", key=f"delete_{study_id}", type="secondary"):
+            try:
+                backend.delete(study_id, expected_version=version)
+            except ConflictError as exc:
+                st.warning(f"{exc}. The list will refresh with the latest version.")
+            else:
+                st.rerun()
+
+
+def summary_table(studies):
+    """Study assessment table for the report page"""
+    return studies.frame()[
+        ['study_name', 'authors', 'publication_year', 'study_type', 'total_stars', 'quality_rating', 'assessment_date']
+    ].rename(columns={
+        'study_name': 'Study',
+        'authors': 'Authors',
+        'publication_year': 'Year',
+        'study_type': 'Type',
+        'total_stars': 'Stars',
+        'quality_rating': 'Quality',
+        'assessment_date': 'Assessment Date'
+    })
+
+
+def plot_buttons(name, render):
+    """PNG and SVG download buttons for a figure, rendered when clicked"""
+    columns = st.columns(len(PLOT_FORMATS))
+    for column, (fmt, mime) in zip(columns, PLOT_FORMATS.items()):
+        with column:
+            st.download_button(
+                label=f"📥 Download {fmt.upper()}",
+                data=partial(render, fmt),
+                file_name=f"nos_{name}.{fmt}",
+                mime=mime,
+                key=f"plot_{name}_{fmt}",
+                on_click="ignore",
+            )
+
+
+def export_button(studies, fmt, label, stem="nos_assessment_data", detailed=False):
+    """Download button that builds the export only when clicked"""
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=label,
+        data=lambda: cached_export(studies, fmt, detailed),
+        file_name=f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+        mime=mime,
+        key=f"export_{fmt}_{'detailed' if detailed else 'data'}",
+        on_click="ignore",
+    )
+
+
+def import_issues(violations, stem):
+    """Preview and CSV download of the problems found while importing"""
+    if len(violations):
+        st.subheader("⚠️ Import Issues")
+        st.dataframe(violations.head(PREVIEW_ROWS), use_container_width=True)
+        st.download_button(
+            label="📥 Download Import Issues (CSV)",
+            data=violations.to_csv(index=False),
+            file_name=f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+
+
+def save_study(backend, study_data, reference_id=None):
+    """Save a study from the form and confirm its rating; an assessed pending study leaves the queue"""
+    backend.save(study_data)
+    if reference_id is not None:
+        try:
+            backend.remove_reference(reference_id)
+        except ConflictError:
+            # Another reviewer assessed or removed it meanwhile; the duplicate check above covers the former
+            pass
+    # Our own save should not trigger the refresh meant for other reviewers' changes
+    st.session_state.seen_revision = backend.revision
     
-    for study in studies_data:
-        quality = study['quality_rating']
-        stars = study['total_stars']
-        star_text = "★" * stars
+    st.success(f"✅ Assessment saved successfully!")
+    max_stars = get_scale(study_data["study_type"]).max_stars
+    st.info(f"**Quality Rating:** {study_data['quality_rating']} ({study_data['total_stars']}/{max_stars} stars)")
+
+
+def reference_label(reference):
+    """Short description of a pending study for the picker"""
+    title = reference["study_name"]
+    title = title if len(title) <= 80 else title[:79] + "…"
+    first_author = (reference["authors"] or "").split(",")[0]
+    return ", ".join(str(part) for part in (title, first_author, reference["publication_year"]) if part)
+
+
+def discard_reference(backend, reference_id):
+    """Take a reference off the pending studies without assessing it"""
+    try:
+        backend.remove_reference(reference_id)
+    except ConflictError:
+        pass
+    st.session_state.pending_reference = None
+
+
+def pending_reference(backend):
+    """Pending study picked to fill in the form, as ``(reference_id, reference)``; ``(None, {})`` for a new study"""
+    count = backend.reference_count()
+    if not count:
+        return None, {}
+    # The next pending studies in import order; assessed ones leave the queue
+    queue = dict(backend.references(limit=PREVIEW_ROWS))
+    if st.session_state.get("pending_reference") not in queue:
+        st.session_state.pending_reference = None
+    reference_id = st.selectbox(
+        f"Start from a pending study ({count} imported references)", [None] + list(queue),
+        format_func=lambda i: "New study" if i is None else reference_label(queue[i]), key="pending_reference",
+    )
+    if reference_id is None:
+        return None, {}
+    st.button(
+        "Remove from Pending Studies", key="remove_reference", on_click=discard_reference,
+        args=(backend, reference_id),
+    )
+    return reference_id, queue[reference_id]
+
+
+@st.fragment
+@timed("add/form")
+def assessment_form(backend):
+    """Assessment form of the Add New Study page.
+
+    Changing the study type reruns only this fragment, not the whole page.
+    """
+    # Metadata of a reference imported on the Import Data page fills in the form
+    reference_id, reference = pending_reference(backend)
+    
+    # Outside the form so the criteria below follow the chosen type
+    study_type = st.selectbox(
+        "Study Type", list(STUDY_TYPES),
+        help="Variants such as AHRQ ask the same questions as their base type and only rate quality differently",
+    )
+    if SCALE_DEFINITIONS[study_type].description:
+        st.caption(SCALE_DEFINITIONS[study_type].description)
+    
+    with st.form("study_assessment"):
+        col1, col2 = st.columns(2)
         
-        quality_class = "quality-good" if quality == "Good Quality" else ("quality-fair" if quality == "Fair Quality" else "quality-poor")
+        with col1:
+            study_name = st.text_input(
+                "Study Name/Identifier", value=reference.get("study_name", ""), placeholder="e.g., Smith et al. 2023"
+            )
+            
+        with col2:
+            authors = st.text_input("Authors", value=reference.get("authors", ""), placeholder="Smith J, Brown K, Wilson L")
+            year = min(max(reference.get("publication_year") or 2023, 1900), LATEST_YEAR)
+            publication_year = st.number_input("Publication Year", min_value=1900, max_value=LATEST_YEAR, value=year)
         
-        html_content += f'''
-        <div class="quality-bar {quality_class}" style="margin: 5px 0;">
-            <strong>{study['study_name']}</strong> - {quality} ({stars}/9 stars) {star_text}
-        </div>
-        '''
+        journal = st.text_input("Journal", value=reference.get("journal", ""), placeholder="Journal of Clinical Medicine")
+        doi = st.text_input("DOI (optional)", value=reference.get("doi", ""), placeholder="10.1000/xyz123")
+        rater = st.text_input(
+            "Rater (optional)", placeholder="Your initials, for agreement between reviewers", key="rater"
+        )
+        
+        st.subheader(f"Assessment Criteria for {study_type}")
+        
+        assessment = {}
+        
+        # Questions and option labels are built once per process
+        for domain_name, fields in form_layout(study_type):
+            st.markdown(f'<div class="domain-header">{domain_name}</div>', unsafe_allow_html=True)
+            
+            for field in fields:
+                st.write(f"**{field.question}**")
+                
+                selected_idx = st.radio(
+                    f"Select option for {field.name}:",
+                    range(len(field.labels)),
+                    format_func=field.labels.__getitem__,
+                    key=field.name
+                )
+                
+                assessment[field.name] = field.option_keys[selected_idx]
+            
+            st.write("")  # Add spacing
+        
+        st.markdown('<div class="domain-header">Effect Size (optional)</div>', unsafe_allow_html=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            outcome = st.text_input("Outcome", value="Primary outcome", key="effect_outcome")
+        with col2:
+            effect = st.number_input("Effect size (e.g. log odds ratio)", value=None, format="%.4f", key="effect_size")
+        with col3:
+            variance = st.number_input("Variance", value=None, min_value=0.0, format="%.6f", key="effect_variance")
+        
+        # Notes section
+        notes = st.text_area("Additional Notes", placeholder="Any additional comments about the study quality...")
+        
+        submitted = st.form_submit_button("Save Assessment", type="primary")
+        
+        if submitted:
+            has_effect = effect is not None or variance is not None
+            if has_effect and (effect is None or not variance or not outcome.strip()):
+                st.error("Please provide an outcome, an effect size and a positive variance, or leave all three empty.")
+            elif study_name:
+                total_stars, quality_rating, quality_color = rate_assessment(assessment, study_type)
+                
+                study_data = {
+                    "study_name": study_name,
+                    "authors": authors,
+                    "publication_year": publication_year,
+                    "journal": journal,
+                    "doi": doi,
+                    "study_type": study_type,
+                    "assessment": assessment,
+                    "total_stars": total_stars,
+                    "quality_rating": quality_rating,
+                    "notes": notes,
+                    "rater": rater.strip(),
+                    "assessment_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+                if has_effect:
+                    study_data["effects"] = {outcome.strip(): {"effect": effect, "variance": variance}}
+                
+                # Same DOI, or same title, first author and year, from the same rater
+                duplicates = backend.find_duplicates(study_duplicate_keys(study_data))
+                if duplicates:
+                    st.session_state.pending_duplicate = (study_data, duplicates, reference_id)
+                else:
+                    save_study(backend, study_data, reference_id)
+            else:
+                st.error("Please provide a study name.")
+    
+    pending = st.session_state.get("pending_duplicate")
+    if pending is not None:
+        study_data, duplicates, duplicate_reference = pending
+        notice = st.empty()
+        notice.warning(
+            f"**{study_data['study_name']}** looks like a duplicate of "
+            f"{'study' if len(duplicates) == 1 else 'studies'} {', '.join(map(str, duplicates))} "
+            "(same DOI, or same title, first author and year)."
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Save Anyway", key="save_duplicate"):
+                del st.session_state.pending_duplicate
+                notice.empty()
+                save_study(backend, study_data, duplicate_reference)
+        with col2:
+            st.button(
+                "Discard", key="discard_duplicate", on_click=lambda: st.session_state.pop("pending_duplicate", None)
+            )
+
+
+@st.fragment
+@timed("report/metrics")
+def report_metrics(backend):
+    """Study counts per quality rating, maintained incrementally by the store"""
+    aggregates = backend.store.aggregates
+    total_studies = aggregates.total
+    good_quality, fair_quality, poor_quality = aggregates.quality_counts.tolist()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Studies", total_studies)
+    with col2:
+        st.metric("Good Quality", good_quality, delta=f"{good_quality/total_studies*100:.1f}%")
+    with col3:
+        st.metric("Fair Quality", fair_quality, delta=f"{fair_quality/total_studies*100:.1f}%")
+    with col4:
+        st.metric("Poor Quality", poor_quality, delta=f"{poor_quality/total_studies*100:.1f}%")
+
+
+@st.fragment
+@timed("report/quality_summary")
+def report_quality_summary(backend):
+    """Per-study quality bars and the study assessment table"""
+    studies = backend.store
+    st.subheader("📈 Quality Assessment Summary")
+    
+    # Simple HTML visualization
+    quality_viz = studies.cached("quality_html", lambda: create_quality_visualization(studies))
+    if quality_viz:
+        st.markdown(quality_viz, unsafe_allow_html=True)
+    
+    # Study data table
+    st.subheader("📊 Study Assessment Table")
+    
+    # Report tables are cached until the next change to the review
+    summary_df = studies.cached("report_summary", lambda: summary_table(studies))
+    st.dataframe(summary_df, use_container_width=True)
+
+
+@st.fragment
+@timed("report/distributions")
+def report_distributions(backend):
+    """Quality, study type and star distributions"""
+    aggregates = backend.store.aggregates
+    st.subheader("📊 Quality Distribution")
+    st.bar_chart(aggregates.quality_distribution())
+    
+    # Study type distribution
+    type_counts = aggregates.type_distribution()
+    if len(type_counts) > 1:
+        st.subheader("📊 Study Type Distribution")
+        st.bar_chart(type_counts)
+    
+    # Stars distribution
+    st.subheader("⭐ Stars Distribution")
+    st.bar_chart(aggregates.star_distribution())
+
+
+@st.fragment
+@timed("report/domains")
+def report_domains(backend):
+    """Domain percentages by study and on average"""
+    studies = backend.store
+    st.subheader("🔍 Domain Analysis")
+    
+    # Domain percentages were computed when each study was saved
+    domain_avg = studies.aggregates.domain_means()
+    domain_df = studies.cached(
+        "report_domains", lambda: studies.domain_frame()[domain_avg.index].fillna(0)
+    )
+    
+    # Domain performance by study
+    st.dataframe(domain_df, use_container_width=True)
+    
+    # Domain average performance
+    st.subheader("📊 Average Domain Performance")
+    st.bar_chart(domain_avg.sort_values(ascending=False))
+
+
+@st.fragment
+@timed("report/plots")
+def report_plots(backend):
+    """robvis-style plots; paging the traffic-light plot reruns only this section"""
+    studies = backend.store
+    st.subheader("🚦 Risk of Bias Plots")
+    # Studies count equally unless weighted by the precision of an outcome they report
+    weighting = st.selectbox(
+        "Weight studies in the summary plot by", (None,) + studies.outcomes,
+        format_func=lambda outcome: "Nothing (each study counts once)" if outcome is None else f"Inverse variance of {outcome}",
+        key="summary_weights",
+        help="robvis-style weighting: studies without an effect size for the outcome are left out",
+    )
+    weights = None if weighting is None else inverse_variance_weights(studies, weighting)
+    caption = "Summary plot" if weighting is None else f"Summary plot, weighted by inverse variance of {weighting}"
+    # Rendered once per dataset and weighting and then served from the cache
+    st.image(summary_plot(studies, weights=weights, dpi=SCREEN_DPI), caption=caption)
+    plot_buttons("summary", lambda fmt: summary_plot(studies, fmt, weights))
+    
+    pages = traffic_light_pages(studies)
+    plot_page = 0
+    if pages > 1:
+        plot_page = st.number_input(f"Traffic-light page (of {pages})", 1, pages, 1, key="plot_page") - 1
+    st.image(traffic_light(studies, plot_page, dpi=SCREEN_DPI), caption=f"Traffic-light plot, page {plot_page + 1} of {pages}")
+    plot_buttons(f"traffic_light_p{plot_page + 1}", lambda fmt: traffic_light(studies, plot_page, fmt))
+
+
+def diagnostics_panel(backend):
+    """Sidebar timings of recent reruns, shown while NOS_METRICS is set"""
+    metrics = recorder()
+    if metrics is None:
+        return
+    gauge("studies", backend.count())
+    gauge("cache_entries", len(ARTIFACTS))
+    gauge("cache_mb", round(ARTIFACTS.bytes / 2**20, 1))
+    with st.sidebar.expander("⏱️ Diagnostics", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Studies", metrics.gauges["studies"])
+            st.metric("Cache entries", metrics.gauges["cache_entries"])
+        with col2:
+            st.metric("Cache MB", metrics.gauges["cache_mb"])
+            lookups = ARTIFACTS.hits + ARTIFACTS.misses
+            st.metric("Cache hits", f"{ARTIFACTS.hits / lookups * 100:.0f}%" if lookups else "–")
+        
+        st.write("**Spans** (slowest total first)")
+        st.dataframe(metrics.stats(), hide_index=True, use_container_width=True)
+        
+        st.write("**Recent spans**")
+        for event in metrics.recent(10):
+            parent = f" ← {event['parent']}" if event["parent"] else ""
+            st.caption(f"{event['span']}{parent}: {event['seconds'] * 1000:.1f} ms")
+        
+        if metrics.path:
+            st.caption(f"Writing metrics to {metrics.path}")
+        if st.button("Reset timings", key="reset_metrics"):
+            metrics.reset()
+            st.rerun()
+
+
+@st.fragment
+@timed("agreement")
+def rater_agreement(backend):
+    """Agreement tables between the reviewers who tagged their assessments with a rater"""
+    from src.agreement import agreement
+    
+    studies = backend.store
+    replicates = st.selectbox(
+        "Bootstrap replicates for 95% confidence intervals", BOOTSTRAP_CHOICES, key="agreement_bootstrap"
+    )
+    try:
+        result = studies.cached(("agreement", replicates), lambda: agreement(studies, replicates))
+    except ValueError:
+        st.info("Enter a rater on the Add New Study page; agreement needs at least two raters of the same studies.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Raters", len(result.raters))
+    with col2:
+        st.metric("Studies rated by all", int(result.icc["studies"]))
+    with col3:
+        interval = f"{result.icc['icc_low']:.2f}–{result.icc['icc_high']:.2f}" if "icc_low" in result.icc else None
+        st.metric("Total-star ICC(2,1)", f"{result.icc['icc']:.2f}", delta=interval, delta_color="off")
+    st.caption(f"Raters: {', '.join(result.raters)}. Studies are matched on DOI, or on name when there is no DOI.")
+    
+    st.subheader("🔍 Agreement by Domain")
+    st.dataframe(result.domains, use_container_width=True)
+    st.subheader("📋 Agreement by Criterion")
+    st.dataframe(result.criteria, use_container_width=True)
+
+
+@st.fragment
+@timed("sensitivity_page")
+def sensitivity_analysis(backend):
+    """Good/Fair/Poor ratings of the review under alternative quality rules"""
+    from src.sensitivity import (
+        baseline_rule, cutoff_grid, evaluate, reclassification_table, scale_rule, shifted_rules, summary,
+    )
+    
+    studies = backend.store
+    present = list(studies.aggregates.type_distribution().index)
+    col1, col2 = st.columns(2)
+    with col1:
+        # Keyed by the maximum so the sliders start over when a reloaded scale changes it
+        top = max_stars()
+        good = st.slider("Good cut-offs (total stars)", 0, top, (min(5, top), top), key=f"sensitivity_good_{top}")
+        fair = st.slider("Fair cut-offs (total stars)", 0, top, (min(2, top), min(7, top)), key=f"sensitivity_fair_{top}")
+    with col2:
+        cutoff_types = st.multiselect(
+            "Apply the cut-offs to", present, default=present, key="sensitivity_types"
+        )
+        include_ahrq = st.checkbox("Include the AHRQ standards", value=True, key="sensitivity_ahrq")
+    
+    rules = [baseline_rule()] + shifted_rules(SENSITIVITY_SHIFTS)
+    if include_ahrq:
+        rules.append(scale_rule("AHRQ standards", [t for t in STUDY_TYPES if "AHRQ" in t]))
+    if cutoff_types:
+        rules += cutoff_grid(range(good[0], good[1] + 1), range(fair[0], fair[1] + 1), cutoff_types)
+    # Every rule is rated in one pass; the result is kept until the review changes
+    result = studies.cached(("sensitivity", tuple(rules)), lambda: evaluate(studies, rules))
+    table = summary(result)
+    changes = result.changes()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Rules compared", len(rules))
+    with col2:
+        st.metric("Studies whose rating depends on the rule", int((changes > 0).sum()))
+    with col3:
+        st.metric("Most reclassified", f"{table['Reclassified %'].max():.1f}%")
+    
+    st.subheader("📋 Ratings under Each Rule")
+    st.dataframe(table, use_container_width=True)
+    
+    named = table[table["Good cut-off"].isna()]
+    st.image(sensitivity_plot(studies, named, "rules", dpi=SCREEN_DPI), caption="Quality ratings under each rule")
+    plot_buttons("sensitivity_rules", lambda fmt: sensitivity_plot(studies, named, "rules", fmt))
+    if len(named) < len(table):
+        st.image(sensitivity_plot(studies, table, "cutoffs", dpi=SCREEN_DPI), caption="Total-star cut-off grid")
+        plot_buttons("sensitivity_cutoffs", lambda fmt: sensitivity_plot(studies, table, "cutoffs", fmt))
+    
+    st.subheader("🔀 Reclassification")
+    rule = st.selectbox(
+        "Compare the scale rules with", range(1, len(rules)), format_func=lambda r: rules[r].name,
+        key="sensitivity_rule",
+    )
+    if rule is not None:
+        st.dataframe(reclassification_table(result, rule), use_container_width=True)
     
-    html_content += '</div>'
-    return html_content
+    st.subheader("⚖️ Least Stable Ratings")
+    order = np.argsort(-changes, kind="stable")[:PREVIEW_ROWS]
+    order = order[changes[order] > 0]
+    if len(order):
+        unstable = studies.cached("report_summary", lambda: summary_table(studies)).iloc[order].copy()
+        unstable["Rules Changing Rating"] = changes[order]
+        st.dataframe(unstable, use_container_width=True)
+    else:
+        st.info("Every study keeps its rating under all of these rules.")
+
+
+@st.fragment
+@timed("meta_page")
+def meta_analysis(backend):
+    """Pooled effect sizes per outcome, stratified by quality and study type"""
+    from src.meta import METHODS, STRATA, effect_data, leave_one_out, quality_exclusion, stratified
+    
+    studies = backend.store
+    data = effect_data(studies)
+    if not data.outcomes:
+        st.info(
+            "No effect sizes yet. Enter an outcome, effect size and variance on the Add New Study page, "
+            "or import a file with Effect_<outcome> and Variance_<outcome> columns."
+        )
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        outcome = st.selectbox("Outcome", data.outcomes, key="meta_outcome")
+        method = st.radio(
+            "Model", METHODS, horizontal=True, key="meta_method",
+            format_func={"REML": "Random effects (REML)", "DL": "Random effects (DerSimonian-Laird)",
+                         "fixed": "Fixed effect"}.__getitem__,
+        )
+    with col2:
+        by = st.multiselect(
+            "Subgroups by", list(STRATA), default=list(STRATA), key="meta_strata",
+            format_func=lambda column: STRATA[column][0],
+        )
+        replicates = st.selectbox(
+            "Bootstrap replicates for 95% confidence intervals", BOOTSTRAP_CHOICES, key="meta_bootstrap"
+        )
+    
+    # Every outcome is pooled in one pass; results are kept until the review changes
+    table = studies.cached(
+        ("meta", method, tuple(by), replicates),
+        lambda: stratified(data, by, method, bootstrap=replicates, workers=META_WORKERS),
+    )
+    exclusion = studies.cached(("meta_exclusion", method), lambda: quality_exclusion(data, method))
+    subgroups = table.loc[outcome]
+    overall = subgroups.iloc[0]
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Studies", int(overall["Studies"]))
+    with col2:
+        st.metric(
+            "Pooled effect", f"{overall['Estimate']:.3f}",
+            delta=f"{overall['CI Low']:.3f} to {overall['CI High']:.3f}", delta_color="off",
+        )
+    with col3:
+        st.metric("I²", f"{overall['I² %']:.1f}%")
+    
+    st.subheader("📋 Pooled Estimates by Subgroup")
+    st.dataframe(subgroups, use_container_width=True)
+    st.image(forest_plot(studies, subgroups, dpi=SCREEN_DPI), caption=f"{outcome}: pooled effect by subgroup")
+    plot_buttons("forest", lambda fmt: forest_plot(studies, subgroups, fmt))
+    
+    st.subheader("🎚️ Excluding Lower-Quality Studies")
+    st.dataframe(exclusion.loc[outcome], use_container_width=True)
+    
+    st.subheader("🔍 Leave-One-Out Analysis")
+    if st.checkbox("Pool the outcome again without each study in turn", key="meta_leave_one_out"):
+        influence = studies.cached(
+            ("meta_leave_one_out", outcome, method), lambda: leave_one_out(data, outcome, method)
+        )
+        # Study names need not be unique, so rows are picked by position
+        order = np.argsort(-influence["Change"].abs().to_numpy(), kind="stable")[:PREVIEW_ROWS]
+        st.caption(f"The {len(order)} most influential studies.")
+        st.dataframe(influence.iloc[order], use_container_width=True)
+    
+    st.subheader("📊 All Outcomes")
+    st.dataframe(table.xs("All", level="By").droplevel("Subgroup"), use_container_width=True)
+
+
+@st.fragment(run_every=WORKSPACE_POLL_SECONDS)
+def workspace_status(backend):
+    """Shared review name in the sidebar; reruns the app when another reviewer saved"""
+    st.caption(f"👥 Shared review: **{backend.name}**")
+    if backend.revision != st.session_state.get("seen_revision"):
+        st.rerun()
+
+
 def main():
     # Header
-    st.markdown("""
-    <div class="main-header">
-        <h1>📊 Newcastle-Ottawa Scale Assessment Tool</h1>
-        <h3>Systematic Risk of Bias Assessment for Observational Studies</h3>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
     
     # Developer information
-    st.markdown("""
-    <div class="developer-info">
-        <strong>🎓 Developed by:</strong> Muhammad Nabeel Saddique<br>
-        <strong>📚 Institution:</strong> 4th Year MBBS Student, King Edward Medical University, Lahore, Pakistan<br>
-        <strong>🔬 Research Focus:</strong> Systematic Review, Meta-Analysis, Evidence-Based Medicine<br>
-        <strong>🏢 Founder:</strong> Nibras Research Academy - Mentoring young researchers in systematic reviews<br>
-        <strong>🛠️ Research Tools Expertise:</strong> Rayyan, Zotero, EndNote, WebPlotDigitizer, Meta-Converter, RevMan, MetaXL, Jamovi, CMA, OpenMeta, R Studio
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(DEVELOPER_HTML, unsafe_allow_html=True)
+    
+    backend = st.session_state.backend
+    st.session_state.seen_revision = backend.revision
     
     # Sidebar for navigation
     st.sidebar.header("🎛️ Assessment Controls")
+    with st.sidebar:
+        workspace_status(backend)
     
     # Navigation
     page = st.sidebar.selectbox(
         "Select Action",
-        ["Add New Study", "View All Studies", "Generate Report", "Export Data"]
+        [
+            "Add New Study", "View All Studies", "Generate Report", "Sensitivity Analysis", "Meta-Analysis", "Rater Agreement",
+            "Export Data", "Import Data",
+        ]
     )
     
-    if page == "Add New Study":
-        st.header("📝 Add New Study Assessment")
+    # Timed when NOS_METRICS is set; otherwise a no-op
+    with span(f"page/{page}"):
+        if page == "Add New Study":
+            st.header("📝 Add New Study Assessment")
+            
+            assessment_form(backend)
         
-        with st.form("study_assessment"):
-            col1, col2 = st.columns(2)
+        elif page == "View All Studies":
+            st.header("📚 All Study Assessments")
             
-            with col1:
-                study_name = st.text_input("Study Name/Identifier", placeholder="e.g., Smith et al. 2023")
-                study_type = st.selectbox("Study Type", list(NOS_CRITERIA.keys()))
+            if backend.count():
+                # Searches use the store's full-text index instead of scanning every study
+                search = st.text_input(
+                    "🔍 Search", placeholder="Study name, authors, journal or notes", key="search"
+                )
                 
-            with col2:
-                authors = st.text_input("Authors", placeholder="Smith J, Brown K, Wilson L")
-                publication_year = st.number_input("Publication Year", min_value=1900, max_value=2024, value=2023)
-            
-            journal = st.text_input("Journal", placeholder="Journal of Clinical Medicine")
-            doi = st.text_input("DOI (optional)", placeholder="10.1000/xyz123")
-            
-            st.subheader(f"Assessment Criteria for {study_type}")
-            
-            assessment = {}
-            criteria = NOS_CRITERIA[study_type]
-            
-            for domain_name, domain in criteria.items():
-                st.markdown(f'<div class="domain-header">{domain_name}</div>', unsafe_allow_html=True)
+                # Filtering, sorting and paging are done by the storage backend
+                with st.expander("🔎 Filter and Sort", expanded=False):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        study_types = st.multiselect("Study Type", list(STUDY_TYPES), key="filter_types")
+                        year_range = st.slider(
+                            "Publication Year", 1900, LATEST_YEAR, (1900, LATEST_YEAR), key="filter_years"
+                        )
+                        sort_label = st.selectbox("Sort by", list(SORT_OPTIONS), key="sort_by")
+                    with col2:
+                        qualities = st.multiselect("Quality", list(QUALITY_LABELS), key="filter_quality")
+                        # A new maximum resets the filter instead of hiding studies above the old one
+                        top = max_stars()
+                        star_range = st.slider("Total Stars", 0, top, (0, top), key=f"filter_stars_{top}")
+                        descending = st.checkbox("Descending", key="sort_descending")
                 
-                for criterion_name, criterion in domain.items():
-                    st.write(f"**{criterion['question']}**")
-                    
-                    # Create radio button options with star indicators
-                    options_display = []
-                    option_keys = []
-                    for key, description in criterion['options'].items():
-                        stars = criterion['stars'].get(key, 0)
-                        star_display = "★" * stars if stars > 0 else "☆"
-                        options_display.append(f"{description} {star_display}")
-                        option_keys.append(key)
-                    
-                    selected_idx = st.radio(
-                        f"Select option for {criterion_name}:",
-                        range(len(options_display)),
-                        format_func=lambda x: options_display[x],
-                        key=criterion_name
-                    )
-                    
-                    assessment[criterion_name] = option_keys[selected_idx]
+                filters = {
+                    'study_types': study_types or None,
+                    'qualities': qualities or None,
+                    'years': year_range,
+                    'stars': star_range,
+                    'search': search.strip() or None
+                }
+                matching = backend.count(**filters)
                 
-                st.write("")  # Add spacing
-            
-            # Notes section
-            notes = st.text_area("Additional Notes", placeholder="Any additional comments about the study quality...")
-            
-            submitted = st.form_submit_button("Save Assessment", type="primary")
-            
-            if submitted:
-                if study_name:
-                    total_stars = calculate_total_stars(assessment, study_type)
-                    quality_rating, quality_color = get_quality_rating(total_stars, study_type)
-                    
-                    study_data = {
-                        "study_name": study_name,
-                        "authors": authors,
-                        "publication_year": publication_year,
-                        "journal": journal,
-                        "doi": doi,
-                        "study_type": study_type,
-                        "assessment": assessment,
-                        "total_stars": total_stars,
-                        "quality_rating": quality_rating,
-                        "notes": notes,
-                        "assessment_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    st.session_state.studies.append(study_data)
-                    
-                    st.success(f"✅ Assessment saved successfully!")
-                    st.info(f"**Quality Rating:** {quality_rating} ({total_stars}/9 stars)")
-                else:
-                    st.error("Please provide a study name.")
-    
-    elif page == "View All Studies":
-        st.header("📚 All Study Assessments")
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    page_size = st.selectbox("Studies per page", PAGE_SIZES, index=1, key="page_size")
+                page_count = max(1, -(-matching // page_size))
+                with col2:
+                    page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+                
+                st.caption(f"Showing {min(matching, (page_number - 1) * page_size + 1)}–{min(matching, page_number * page_size)} of {matching} matching studies")
+                
+                for study_id, study in backend.query(
+                    order_by=SORT_OPTIONS[sort_label],
+                    descending=descending,
+                    offset=(page_number - 1) * page_size,
+                    limit=page_size,
+                    **filters
+                ):
+                    render_study_card(backend, study_id, study, backend.study_version(study_id))
+            else:
+                st.info("No studies assessed yet. Go to 'Add New Study' to start.")
         
-        if st.session_state.studies:
-            for idx, study in enumerate(st.session_state.studies):
-                with st.expander(f"{study['study_name']} - {study['quality_rating']}", expanded=False):
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.write(f"**Authors:** {study['authors']}")
-                        st.write(f"**Year:** {study['publication_year']}")
-                        st.write(f"**Journal:** {study['journal']}")
-                        
-                    with col2:
-                        st.write(f"**Study Type:** {study['study_type']}")
-                        st.write(f"**Stars:** {'★' * study['total_stars']}")
-                        st.write(f"**Quality:** {study['quality_rating']}")
-                        
-                    with col3:
-                        st.write(f"**DOI:** {study.get('doi', 'N/A')}")
-                        st.write(f"**Assessed:** {study['assessment_date']}")
-                    
-                    if study.get('notes'):
-                        st.write(f"**Notes:** {study['notes']}")
-                    
-                    # Show detailed assessment
-                    if st.checkbox(f"Show detailed assessment", key=f"detail_{idx}"):
-                        criteria = NOS_CRITERIA[study['study_type']]
-                        
-                        for domain_name, domain in criteria.items():
-                            st.write(f"**{domain_name}**")
-                            domain_stars = 0
-                            
-                            for criterion_name, criterion in domain.items():
-                                selected_option = study['assessment'].get(criterion_name, "")
-                                if selected_option in criterion['options']:
-                                    option_text = criterion['options'][selected_option]
-                                    stars = criterion['stars'].get(selected_option, 0)
-                                    
-                                    if criterion_name == "comparability" and "max_stars" in criterion:
-                                        if selected_option == "most_important":
-                                            stars = 1
-                                        elif selected_option == "additional_factor":
-                                            stars = 2
-                                    
-                                    domain_stars += stars
-                                    star_display = "★" * stars if stars > 0 else "☆"
-                                    st.write(f"- {criterion['question']}: {option_text} {star_display}")
-                            
-                            st.write(f"*Domain Stars: {domain_stars}*")
-                            st.write("")
-                    
-                    # Delete button
-                    if st.button(f"Delete Study", key=f"delete_{idx}", type="secondary"):
-                        st.session_state.studies.pop(idx)
-                        st.rerun()
-        else:
-            st.info("No studies assessed yet. Go to 'Add New Study' to start.")
-    
-    elif page == "Generate Report":
-        st.header("📊 Visual Risk of Bias Report")
+        elif page == "Generate Report":
+            st.header("📊 Visual Risk of Bias Report")
+            
+            if backend.count():
+                # Each section is a fragment with its own cached inputs
+                report_metrics(backend)
+                report_quality_summary(backend)
+                report_distributions(backend)
+                report_domains(backend)
+                report_plots(backend)
+                
+            else:
+                st.info("No studies to generate report. Please assess some studies first.")
         
-        if st.session_state.studies:
-            # Summary statistics
-            total_studies = len(st.session_state.studies)
-            good_quality = len([s for s in st.session_state.studies if s['quality_rating'] == 'Good Quality'])
-            fair_quality = len([s for s in st.session_state.studies if s['quality_rating'] == 'Fair Quality'])
-            poor_quality = len([s for s in st.session_state.studies if s['quality_rating'] == 'Poor Quality'])
+        elif page == "Export Data":
+            st.header("💾 Export Assessment Data")
             
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total Studies", total_studies)
-            with col2:
-                st.metric("Good Quality", good_quality, delta=f"{good_quality/total_studies*100:.1f}%")
-            with col3:
-                st.metric("Fair Quality", fair_quality, delta=f"{fair_quality/total_studies*100:.1f}%")
-            with col4:
-                st.metric("Poor Quality", poor_quality, delta=f"{poor_quality/total_studies*100:.1f}%")
-            
-            # Generate visualizations
-            st.subheader("📈 Quality Assessment Summary")
-            
-            # Simple HTML visualization
-            quality_viz = create_quality_visualization(st.session_state.studies)
-            if quality_viz:
-                st.markdown(quality_viz, unsafe_allow_html=True)
-            
-            # Study data table
-            st.subheader("📊 Study Assessment Table")
-            
-            # Create summary dataframe
-            summary_data = []
-            for study in st.session_state.studies:
-                summary_data.append({
-                    'Study': study['study_name'],
-                    'Authors': study['authors'],
-                    'Year': study['publication_year'],
-                    'Type': study['study_type'],
-                    'Stars': study['total_stars'],
-                    'Quality': study['quality_rating'],
-                    'Assessment Date': study['assessment_date']
-                })
-            
-            summary_df = pd.DataFrame(summary_data)
-            st.dataframe(summary_df, use_container_width=True)
-            
-            # Quality distribution using Streamlit charts
-            st.subheader("📊 Quality Distribution")
-            
-            quality_counts = summary_df['Quality'].value_counts()
-            st.bar_chart(quality_counts)
-            
-            # Study type distribution
-            if len(summary_df['Type'].unique()) > 1:
-                st.subheader("📊 Study Type Distribution")
-                type_counts = summary_df['Type'].value_counts()
-                st.bar_chart(type_counts)
-            
-            # Stars distribution
-            st.subheader("⭐ Stars Distribution")
-            stars_counts = summary_df['Stars'].value_counts().sort_index()
-            st.bar_chart(stars_counts)
-            
-            # Domain analysis
-            st.subheader("🔍 Domain Analysis")
-            
-            domain_analysis = []
-            for study in st.session_state.studies:
-                study_type = study['study_type']
-                assessment = study['assessment']
-                criteria = NOS_CRITERIA[study_type]
+            if backend.count():
+                studies = backend.store
                 
-                for domain_name, domain in criteria.items():
-                    domain_stars = 0
-                    max_domain_stars = len(domain)
-                    if domain_name == "Comparability":
-                        max_domain_stars = 2
-                    
-                    for criterion_name, criterion in domain.items():
-                        if criterion_name in assessment:
-                            selected_option = assessment[criterion_name]
-                            if selected_option in criterion["stars"]:
-                                stars = criterion["stars"][selected_option]
-                                if criterion_name == "comparability" and "max_stars" in criterion:
-                                    if selected_option == "most_important":
-                                        domain_stars += 1
-                                    elif selected_option == "additional_factor":
-                                        domain_stars += 2
-                                else:
-                                    domain_stars += stars
-                    
-                    domain_analysis.append({
-                        'Study': study['study_name'],
-                        'Domain': domain_name,
-                        'Stars': domain_stars,
-                        'Max Stars': max_domain_stars,
-                        'Percentage': (domain_stars / max_domain_stars * 100) if max_domain_stars > 0 else 0
-                    })
-            
-            domain_df = pd.DataFrame(domain_analysis)
-            
-            # Domain performance by study
-            pivot_df = domain_df.pivot_table(values='Percentage', index='Study', columns='Domain', fill_value=0)
-            st.dataframe(pivot_df, use_container_width=True)
-            
-            # Domain average performance
-            st.subheader("📊 Average Domain Performance")
-            domain_avg = domain_df.groupby('Domain')['Percentage'].mean().sort_values(ascending=False)
-            st.bar_chart(domain_avg)
-            
-        else:
-            st.info("No studies to generate report. Please assess some studies first.")
-    
-    elif page == "Export Data":
-        st.header("💾 Export Assessment Data")
-        
-        if st.session_state.studies:
-            # Prepare data for export
-            export_data = []
-            for study in st.session_state.studies:
-                row = {
-                    'Study_Name': study['study_name'],
-                    'Authors': study['authors'],
-                    'Publication_Year': study['publication_year'],
-                    'Journal': study['journal'],
-                    'DOI': study.get('doi', ''),
-                    'Study_Type': study['study_type'],
-                    'Total_Stars': study['total_stars'],
-                    'Quality_Rating': study['quality_rating'],
-                    'Assessment_Date': study['assessment_date'],
-                    'Notes': study.get('notes', '')
-                }
+                # Exports are built from the store in chunks only when a button is clicked
+                st.subheader("📋 Data Preview")
+                preview = studies.cached("export_preview", lambda: studies.export_frame(slice(0, 5)))
+                st.dataframe(preview, use_container_width=True)
                 
-                # Add individual criteria assessments
-                for criterion, response in study['assessment'].items():
-                    row[f'NOS_{criterion}'] = response
+                # Export options
+                col1, col2 = st.columns(2)
                 
-                export_data.append(row)
-            
-            df = pd.DataFrame(export_data)
-            
-            # Show preview
-            st.subheader("📋 Data Preview")
-            st.dataframe(df.head(), use_container_width=True)
-            
-            # Export options
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # CSV export
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="📥 Download as CSV",
-                    data=csv,
-                    file_name=f"nos_assessment_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
+                with col1:
+                    export_button(studies, "csv", "📥 Download as CSV")
+                    export_button(studies, "parquet", "📥 Download as Parquet")
+                
+                with col2:
+                    export_button(studies, "json", "📥 Download as JSON")
+                    export_button(studies, "arrow", "📥 Download as Arrow IPC")
+                
+                # Summary statistics
+                st.subheader("📈 Summary Statistics")
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.write("**Quality Distribution:**")
+                    quality_dist = studies.aggregates.quality_distribution()
+                    for quality, count in quality_dist[quality_dist > 0].items():
+                        percentage = (count / studies.aggregates.total) * 100
+                        st.write(f"- {quality}: {count} ({percentage:.1f}%)")
+                
+                with col2:
+                    st.write("**Study Type Distribution:**")
+                    type_dist = studies.aggregates.type_distribution()
+                    for study_type, count in type_dist.items():
+                        percentage = (count / studies.aggregates.total) * 100
+                        st.write(f"- {study_type}: {count} ({percentage:.1f}%)")
+                
+                # Detailed export with domain scores
+                st.subheader("📊 Detailed Domain Export")
+                
+                detailed_preview = studies.cached(
+                    "detailed_preview", lambda: studies.detailed_frame(slice(0, PREVIEW_ROWS))
                 )
-            
-            with col2:
-                # JSON export
-                json_data = json.dumps(st.session_state.studies, indent=2, default=str)
-                st.download_button(
-                    label="📥 Download as JSON",
-                    data=json_data,
-                    file_name=f"nos_assessment_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
+                st.dataframe(detailed_preview, use_container_width=True)
+                if len(studies) > PREVIEW_ROWS:
+                    st.caption(f"Showing the first {PREVIEW_ROWS} of {len(studies)} studies; the download has all of them.")
+                
+                # Download detailed export
+                export_button(
+                    studies, "csv", "📥 Download Detailed Domain Analysis (CSV)",
+                    stem="nos_detailed_domain_analysis", detailed=True,
                 )
+                
+                # Clear all data option
+                st.subheader("🗑️ Data Management")
+                if st.button("Clear All Assessment Data", type="secondary"):
+                    if st.checkbox("I confirm I want to delete all data"):
+                        backend.clear()
+                        st.success("All assessment data has been cleared.")
+                        st.rerun()
             
-            # Summary statistics
-            st.subheader("📈 Summary Statistics")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write("**Quality Distribution:**")
-                quality_dist = df['Quality_Rating'].value_counts()
-                for quality, count in quality_dist.items():
-                    percentage = (count / len(df)) * 100
-                    st.write(f"- {quality}: {count} ({percentage:.1f}%)")
-            
-            with col2:
-                st.write("**Study Type Distribution:**")
-                type_dist = df['Study_Type'].value_counts()
-                for study_type, count in type_dist.items():
-                    percentage = (count / len(df)) * 100
-                    st.write(f"- {study_type}: {count} ({percentage:.1f}%)")
+            else:
+                st.info("No data to export. Please assess some studies first.")
+        
+        elif page == "Sensitivity Analysis":
+            st.header("🎚️ Quality Rule Sensitivity Analysis")
             
-            # Detailed export with domain scores
-            st.subheader("📊 Detailed Domain Export")
+            if backend.count():
+                sensitivity_analysis(backend)
+            else:
+                st.info("No studies to analyse. Please assess some studies first.")
+        
+        elif page == "Meta-Analysis":
+            st.header("📈 Quality-Stratified Meta-Analysis")
             
-            detailed_export = []
-            for study in st.session_state.studies:
-                study_type = study['study_type']
-                assessment = study['assessment']
-                criteria = NOS_CRITERIA[study_type]
-                
-                base_row = {
-                    'Study_Name': study['study_name'],
-                    'Authors': study['authors'],
-                    'Publication_Year': study['publication_year'],
-                    'Journal': study['journal'],
-                    'Study_Type': study['study_type'],
-                    'Total_Stars': study['total_stars'],
-                    'Quality_Rating': study['quality_rating']
-                }
-                
-                # Calculate domain scores
-                for domain_name, domain in criteria.items():
-                    domain_stars = 0
-                    max_domain_stars = len(domain)
-                    if domain_name == "Comparability":
-                        max_domain_stars = 2
-                    
-                    for criterion_name, criterion in domain.items():
-                        if criterion_name in assessment:
-                            selected_option = assessment[criterion_name]
-                            if selected_option in criterion["stars"]:
-                                stars = criterion["stars"][selected_option]
-                                if criterion_name == "comparability" and "max_stars" in criterion:
-                                    if selected_option == "most_important":
-                                        domain_stars += 1
-                                    elif selected_option == "additional_factor":
-                                        domain_stars += 2
-                                else:
-                                    domain_stars += stars
-                    
-                    base_row[f'{domain_name}_Stars'] = domain_stars
-                    base_row[f'{domain_name}_Max_Stars'] = max_domain_stars
-                    base_row[f'{domain_name}_Percentage'] = (domain_stars / max_domain_stars * 100) if max_domain_stars > 0 else 0
+            if backend.count():
+                meta_analysis(backend)
+            else:
+                st.info("No studies to analyse. Please assess some studies first.")
+        
+        elif page == "Rater Agreement":
+            st.header("🤝 Inter-Rater Agreement")
+            rater_agreement(backend)
+        
+        elif page == "Import Data":
+            # Validation and parsing code is only loaded when this page is opened
+            from src.batch import detect_format
+            from src.importer import IMPORT_FORMATS, import_file, import_references
+            from src.references import REFERENCE_FORMATS
+            
+            st.header("📂 Import Assessment Data")
+            st.write("Resume a review from a JSON or CSV file downloaded from the Export Data page.")
+            
+            uploaded = st.file_uploader("Export file", type=list(IMPORT_FORMATS))
+            if uploaded is not None and st.button("Import Studies", type="primary"):
+                fmt = detect_format(uploaded.name, IMPORT_FORMATS)
+                progress = st.empty()
+                with st.spinner("Importing studies..."):
+                    result = import_file(
+                        backend, uploaded, fmt,
+                        progress=lambda read, imported: progress.caption(f"{read} rows read, {imported} imported"),
+                    )
                 
-                detailed_export.append(base_row)
-            
-            detailed_df = pd.DataFrame(detailed_export)
-            st.dataframe(detailed_df, use_container_width=True)
-            
-            # Download detailed export
-            detailed_csv = detailed_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download Detailed Domain Analysis (CSV)",
-                data=detailed_csv,
-                file_name=f"nos_detailed_domain_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
+                st.success(f"Imported {len(result.ids)} studies with recomputed scores.")
+                if result.skipped:
+                    st.warning(f"Skipped {result.skipped} rows with errors; see the issues below.")
+                if result.duplicates:
+                    st.warning(f"Skipped {result.duplicates} duplicate studies; see the issues below.")
+                import_issues(result.violations, "nos_import_issues")
+            
+            st.subheader("📚 Import References")
+            st.write(
+                "Add the records of a RIS, BibTeX or EndNote XML export from your reference manager as pending "
+                "studies, then pick them on the Add New Study page to assess them with their details filled in."
             )
             
-            # Clear all data option
-            st.subheader("🗑️ Data Management")
-            if st.button("Clear All Assessment Data", type="secondary"):
-                if st.checkbox("I confirm I want to delete all data"):
-                    st.session_state.studies = []
-                    st.success("All assessment data has been cleared.")
+            references_file = st.file_uploader("Reference manager export", type=list(REFERENCE_FORMATS))
+            if references_file is not None and st.button("Add Pending Studies", type="primary"):
+                fmt = detect_format(references_file.name, REFERENCE_FORMATS)
+                progress = st.empty()
+                with st.spinner("Reading references..."):
+                    result = import_references(
+                        backend, references_file, fmt,
+                        progress=lambda read, added: progress.caption(f"{read} records read, {added} added"),
+                    )
+                st.success(f"Added {len(result.ids)} pending studies.")
+                if result.skipped:
+                    st.warning(f"Skipped {result.skipped} records without a title; see the issues below.")
+                if result.duplicates:
+                    st.warning(
+                        f"Skipped {result.duplicates} duplicates of assessed studies, pending studies or earlier "
+                        "records; see the issues below."
+                    )
+                import_issues(result.violations, "nos_reference_issues")
+            
+            pending = backend.reference_count()
+            if pending:
+                st.caption(f"{pending} pending studies are waiting for assessment.")
+                if st.button("Clear Pending Studies", type="secondary"):
+                    backend.clear_references()
                     st.rerun()
-        
-        else:
-            st.info("No data to export. Please assess some studies first.")
+    
+    diagnostics_panel(backend)
     
     # Footer
     st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #666; padding: 1rem;">
-        <p><strong>Newcastle-Ottawa Scale Assessment Tool</strong></p>
-        <p>Developed for systematic review and meta-analysis research</p>
-        <p>© 2024 Muhammad Nabeel Saddique | Nibras Research Academy</p>
-        <p><em>For publication-quality bias assessment in observational studies</em></p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
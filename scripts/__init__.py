@@ -0,0 +1 @@
+"""Command-line tools declared in setup_file.py."""
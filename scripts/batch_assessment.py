@@ -0,0 +1,82 @@
+"""Score Newcastle-Ottawa Scale assessments without the Streamlit UI.
+
+Reads a CSV (the app's CSV export layout, one ``NOS_<criterion>`` column per
+criterion), JSON Lines or JSON file in chunks, scores every chunk with the
+same engine as the app and appends the results to a CSV, JSON Lines, JSON or
+Parquet file as it goes::
+
+    nos-batch --input studies.csv --output results.parquet --workers 0
+
+Every output row has the same ``Effect_<outcome>``/``Variance_<outcome>``
+columns.  JSON and JSON Lines records may report different outcomes, so
+unless ``--outcomes`` lists them the input is read through once first to
+collect them.
+"""
+import argparse
+import os
+import sys
+import time
+
+if __package__ in (None, ""):
+    # Allow ``python scripts/batch_assessment.py`` from a source checkout
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.batch import (
+    DEFAULT_CHUNKSIZE, INPUT_FORMATS, OUTPUT_FORMATS, ChunkWriter, read_chunks, scan_outcomes, score_chunks,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nos-batch", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", "-i", required=True, help="CSV, JSON Lines or JSON file of assessments")
+    parser.add_argument("--output", "-o", required=True, help="where to write the scored table")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, help="default: from the input file extension")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="default: from the output file extension")
+    parser.add_argument(
+        "--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+        help=f"rows read and scored at a time (default: {DEFAULT_CHUNKSIZE})",
+    )
+    parser.add_argument(
+        "--workers", "-j", type=int, default=1,
+        help="scoring processes; 0 uses every core (default: 1)",
+    )
+    parser.add_argument(
+        "--outcomes", type=lambda value: tuple(filter(None, (part.strip() for part in value.split(",")))),
+        help="comma-separated outcomes with effect columns (default: every outcome in the input)",
+    )
+    parser.add_argument("--quiet", "-q", action="store_true", help="do not report progress")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    unscored = 0
+    live = not args.quiet and sys.stderr.isatty()
+
+    try:
+        outcomes = args.outcomes
+        if outcomes is None:
+            outcomes = scan_outcomes(args.input, args.input_format)
+        chunks = read_chunks(args.input, args.chunksize, args.input_format)
+        with ChunkWriter(args.output, args.output_format) as writer:
+            for frame in score_chunks(chunks, workers, outcomes):
+                writer.write(frame)
+                unscored += int(frame["Total_Stars"].isna().sum())
+                if live:
+                    print(f"\r{writer.rows:,} studies scored", end="", file=sys.stderr, flush=True)
+    except (OSError, ValueError) as exc:
+        print(f"nos-batch: {exc}", file=sys.stderr)
+        return 2
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        print(f"\r{writer.rows:,} studies scored in {elapsed:.1f}s -> {args.output}", file=sys.stderr)
+    if unscored:
+        print(f"nos-batch: {unscored:,} rows have an unknown study type and were not scored", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
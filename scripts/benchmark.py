@@ -0,0 +1,230 @@
+"""Benchmark scoring, aggregation, export, import and analyses on synthetic reviews.
+
+Every benchmark runs on seeded reviews from ``src.synthetic`` at each of the
+``--sizes``, and the app's page reruns are timed through Streamlit's AppTest
+with the same review in the session.  Results are written as JSON so runs
+from two commits can be compared::
+
+    python scripts/benchmark.py --output before.json
+    git checkout my-branch
+    python scripts/benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if __package__ in (None, ""):
+    # Allow ``python scripts/benchmark.py`` from a source checkout
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+from src.agreement import agreement
+from src.batch import score_frame
+from src.cache import ARTIFACTS
+from src.export import EXPORT_FORMATS, export_bytes
+from src.importer import import_file, import_references
+from src.meta import effect_data, leave_one_out, quality_exclusion, stratified
+from src.plots import judgement_grid
+from src.references import REFERENCE_FORMATS
+from src.scoring import rate_assessment
+from src.search import SEARCH_FIELDS, SearchIndex
+from src.sensitivity import baseline_rule, cutoff_grid, evaluate, scale_rule, shifted_rules
+from src.storage import MemoryBackend
+from src.store import STUDY_TYPES, StudyStore
+from src.synthetic import generate_ratings, generate_studies, reference_export
+
+DEFAULT_SIZES = (10, 1000, 100000)
+# Agreement benchmarks split each size into this many raters of size / RATERS studies
+RATERS = 3
+# Meta-analysis benchmarks pool this many outcomes; leave-one-out grows with the square of the studies
+OUTCOMES = tuple(f"Outcome {i + 1}" for i in range(10))
+MAX_LEAVE_ONE_OUT = 10000
+RESULTS_VERSION = 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=lambda text: [int(size) for size in text.split(",")], default=list(DEFAULT_SIZES),
+        help="comma-separated review sizes (default: 10,1000,100000)",
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic reviews (default: 0)")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name starts with this; repeatable")
+    parser.add_argument("--skip-app", action="store_true", help="do not time Streamlit page reruns")
+    parser.add_argument("--output", "-o", default="benchmark-results.json", help="results file to write")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25,
+        help="slowdown ratio reported as a regression by --compare (default: 1.25)",
+    )
+    return parser.parse_args(argv)
+
+
+def measure(run, repeats, setup=None):
+    """Median and minimum seconds of ``run()`` over ``repeats`` runs, each after ``setup()``.
+
+    One untimed run goes first so lazy imports are not counted.
+    """
+    if setup is not None:
+        setup()
+    run()
+    samples = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return {"median": statistics.median(samples), "min": min(samples)}
+
+
+def benchmarks(studies, seed=0):
+    """``(name, run)`` pairs for one synthetic review"""
+    store = StudyStore(studies)
+    frame = store.export_frame()
+    files = {
+        "csv": frame.to_csv(index=False).encode("utf-8"),
+        "json": json.dumps(studies, default=str).encode("utf-8"),
+    }
+
+    def score_each():
+        # The assessment form's path: one study at a time
+        for study in studies:
+            rate_assessment(study["assessment"], study["study_type"])
+
+    yield "scoring/per_study", score_each
+    yield "scoring/vectorized", lambda: score_frame(frame.copy())
+    yield "aggregation/store_build", lambda: StudyStore(studies)
+    yield "aggregation/domain_frame", store.domain_frame
+    yield "aggregation/study_frame", store.frame
+    yield "aggregation/judgement_grid", lambda: judgement_grid(store)
+    for fmt in EXPORT_FORMATS:
+        yield f"export/{fmt}", lambda fmt=fmt: export_bytes(store, fmt)
+    yield "export/csv_detailed", lambda: export_bytes(store, "csv", detailed=True)
+    for fmt, data in files.items():
+        yield f"import/{fmt}", lambda fmt=fmt, data=data: import_file(MemoryBackend(), io.BytesIO(data), fmt)
+    for fmt in REFERENCE_FORMATS:
+        data = reference_export(studies, fmt).encode("utf-8")
+        yield f"references/{fmt}", lambda fmt=fmt, data=data: import_references(MemoryBackend(), io.BytesIO(data), fmt)
+
+    texts = [{field: study.get(field) for field in SEARCH_FIELDS} for study in studies]
+    yield "search/index", lambda: SearchIndex().add_many(enumerate(texts))
+    # The store's index is built by the untimed first run; repeats time lookups only
+    yield "search/prefix", lambda: store.search("auth 4")
+    yield "search/words", lambda: store.search("study 12 lancet")
+
+    # Every total cut-off pair for all study types and for each type alone: several hundred rules
+    grid = range(int(store.domain_max.sum(axis=1).max()) + 1)
+    rules = [baseline_rule(), scale_rule("AHRQ", [t for t in STUDY_TYPES if "AHRQ" in t])] + shifted_rules((-1, 1))
+    for types in [STUDY_TYPES] + [(t,) for t in STUDY_TYPES]:
+        rules += cutoff_grid(grid, grid, types)
+    yield "sensitivity/rules", lambda: evaluate(store, rules)
+
+    data = effect_data(StudyStore(generate_studies(len(studies), seed, outcomes=OUTCOMES)))
+    yield "meta/strata", lambda: stratified(data)
+    yield "meta/quality_exclusion", lambda: quality_exclusion(data)
+    if len(studies) <= MAX_LEAVE_ONE_OUT:
+        yield "meta/leave_one_out", lambda: leave_one_out(data, OUTCOMES[0])
+    yield "meta/bootstrap_200", lambda: stratified(data, bootstrap=200, workers=os.cpu_count() or 1)
+
+    rated = StudyStore(generate_ratings(max(1, len(studies) // RATERS), RATERS, seed=seed))
+    yield "agreement/point", lambda: agreement(rated)
+    yield "agreement/bootstrap_200", lambda: agreement(rated, bootstrap=200)
+
+
+def selected(name, only):
+    return not only or any(name.startswith(prefix) for prefix in only)
+
+
+def run_benchmarks(args):
+    results = []
+    for size in args.sizes:
+        studies = generate_studies(size, args.seed)
+        for name, run in benchmarks(studies, args.seed):
+            if not selected(name, args.only):
+                continue
+            # Cached frames and exports would turn every repeat after the first into a lookup
+            timing = measure(run, args.repeats, setup=ARTIFACTS.clear)
+            results.append({"name": name, "size": size, **timing})
+            print(f"{name:<28} {size:>8,} {timing['median'] * 1000:12.2f} ms", file=sys.stderr)
+        if args.skip_app or not selected("app/", args.only):
+            continue
+        from scripts.measure_startup import reruns
+
+        for page, seconds in reruns(size, args.repeats).items():
+            name = f"app/{page.lower().replace(' ', '_')}"
+            results.append({"name": name, "size": size, "median": seconds, "min": None})
+            print(f"{name:<28} {size:>8,} {seconds * 1000:12.2f} ms", file=sys.stderr)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print the change against an earlier results file; returns the number of regressions"""
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {(row["name"], row["size"]): row["median"] for row in json.load(handle)["results"]}
+    regressions = 0
+    print(f"{'benchmark':<28} {'size':>8} {'before':>12} {'after':>12} {'ratio':>7}")
+    for row in results:
+        before = baseline.get((row["name"], row["size"]))
+        if not before:
+            continue
+        ratio = row["median"] / before
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  slower"
+        print(
+            f"{row['name']:<28} {row['size']:>8,} {before * 1000:10.2f}ms "
+            f"{row['median'] * 1000:10.2f}ms {ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    report = {
+        "version": RESULTS_VERSION,
+        "environment": environment(),
+        "settings": {"sizes": args.sizes, "repeats": args.repeats, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"{len(results)} results -> {args.output}", file=sys.stderr)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
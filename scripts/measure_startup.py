@@ -0,0 +1,109 @@
+"""Measure cold-start and rerun time of the Streamlit app.
+
+Cold start runs in a fresh interpreter for each repeat: it times importing
+Streamlit and the first full run of ``NOS Scale.py``.  Reruns use Streamlit's
+AppTest on a session holding ``--studies`` synthetic studies, with effect
+sizes for two outcomes, and time every page of the app::
+
+    python scripts/measure_startup.py --studies 5000 --reruns 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if __package__ in (None, ""):
+    # Allow ``python scripts/measure_startup.py`` from a source checkout
+    sys.path.insert(0, ROOT)
+
+APP = os.path.join(ROOT, "NOS Scale.py")
+PAGES = (
+    "Add New Study", "View All Studies", "Generate Report", "Sensitivity Analysis", "Meta-Analysis", "Rater Agreement",
+    "Export Data", "Import Data",
+)
+# Outcomes the synthetic studies report effect sizes for, so the Meta-Analysis page has work to do
+OUTCOMES = ("Mortality", "Readmission")
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+finished = time.perf_counter()
+print(json.dumps({"import": imported - started, "first_run": finished - imported, "errors": len(at.exception)}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="measure_startup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--studies", type=int, default=1000, help="studies in the session (default: 1000)")
+    parser.add_argument("--reruns", type=int, default=5, help="timed reruns per page (default: 5)")
+    parser.add_argument("--cold-starts", type=int, default=3, help="fresh interpreters to time (default: 3)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser.parse_args(argv)
+
+
+def cold_start(repeats):
+    """Median Streamlit import and first-run time over fresh interpreters"""
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START, APP], cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process"] = time.perf_counter() - started
+        runs.append(result)
+    return {key: statistics.median(run[key] for run in runs) for key in ("import", "first_run", "process")}
+
+
+def reruns(studies, repeats):
+    """Median rerun time per page with ``studies`` in the session"""
+    from streamlit.testing.v1 import AppTest
+
+    from src.storage import MemoryBackend
+    from src.synthetic import generate_studies
+    from src.workspace import Workspace
+
+    at = AppTest.from_file(APP, default_timeout=120).run()
+    at.session_state.backend = Workspace("synthetic", MemoryBackend(generate_studies(studies, outcomes=OUTCOMES)))
+    timings = {}
+    for page in PAGES:
+        at.sidebar.selectbox[0].select(page).run()
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].message}")
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            at.run()
+            samples.append(time.perf_counter() - started)
+        timings[page] = statistics.median(samples)
+    return timings
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "studies": args.studies,
+        "cold_start": cold_start(args.cold_starts),
+        "rerun": reruns(args.studies, args.reruns),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    cold = results["cold_start"]
+    print(f"Cold start: {cold['process']:.2f}s process "
+          f"({cold['import']:.2f}s importing Streamlit, {cold['first_run']:.2f}s first run)")
+    print(f"Reruns with {args.studies:,} studies (median of {args.reruns}):")
+    for page, seconds in results["rerun"].items():
+        print(f"  {page:<20} {seconds * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Render report figures for a directory of exported reviews without the UI.
+
+Every ``*.json`` export (the app's JSON download) under the input directory is
+imported, validated and rescored, and its summary, traffic-light,
+distribution and domain figures are written to a folder of the same name
+under the output directory.  Reviews are rendered in parallel on a process
+pool, each imported once by the worker that draws all of its figures.  A
+manifest in the output directory records a hash of each input and the files
+written for it, so reviews that have not changed since the last run are
+skipped and figures a review no longer has (such as traffic-light pages
+after it shrank) are deleted::
+
+    nos-figures reviews/ figures/ --format png --format svg --workers 0
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if __package__ in (None, ""):
+    # Allow ``python scripts/render_figures.py`` from a source checkout
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.importer import import_file
+from src.plots import DPI, PLOT_FORMATS, ROWS_PER_PAGE, render, review_figures
+from src.storage import MemoryBackend
+
+MANIFEST = "nos-figures.json"
+# Bump when the figures change so every review is rendered again
+FIGURE_VERSION = 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nos-figures", description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="directory of exported reviews")
+    parser.add_argument("output", help="directory to write figures to")
+    parser.add_argument(
+        "--format", "-f", dest="formats", action="append", choices=tuple(PLOT_FORMATS),
+        help="figure format; repeat for several (default: png)",
+    )
+    parser.add_argument("--pattern", default="*.json", help="file name pattern of reviews (default: *.json)")
+    parser.add_argument("--dpi", type=int, default=DPI, help=f"resolution of PNG figures (default: {DPI})")
+    parser.add_argument(
+        "--rows-per-page", type=int, default=ROWS_PER_PAGE,
+        help=f"studies per traffic-light page (default: {ROWS_PER_PAGE})",
+    )
+    parser.add_argument(
+        "--workers", "-j", type=int, default=0,
+        help="rendering processes; 0 uses every core (default: 0)",
+    )
+    parser.add_argument("--force", action="store_true", help="render every review even if it is unchanged")
+    parser.add_argument("--quiet", "-q", action="store_true", help="only report errors")
+    return parser.parse_args(argv)
+
+
+def input_hash(path, settings):
+    """Hash of a review file together with the settings its figures depend on"""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render_review(path, target, formats, dpi, rows_per_page):
+    """Import one review and write all of its figures.
+
+    Returns ``(files, studies, skipped_rows)``.
+    """
+    backend = MemoryBackend()
+    result = import_file(backend, path)
+    os.makedirs(target, exist_ok=True)
+    files = []
+    for name, build in review_figures(backend.store, rows_per_page):
+        figure = build()
+        for fmt in formats:
+            file_name = os.path.join(target, f"{name}.{fmt}")
+            with open(file_name, "wb") as handle:
+                handle.write(render(figure, fmt, dpi))
+            files.append(file_name)
+    return files, len(result.ids), result.skipped
+
+
+def stale_files(target, previous, files):
+    """Figures in ``target`` from an earlier run that the latest one did not write again.
+
+    ``previous`` is the file list of the review's last manifest entry;
+    traffic-light pages are also looked for on disk in case the manifest was
+    lost.
+    """
+    candidates = set(previous)
+    for fmt in PLOT_FORMATS:
+        candidates.update(glob.glob(os.path.join(glob.escape(target), f"traffic_light*.{fmt}")))
+    return sorted(candidates - set(files))
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    # Written to a temporary file first so an interrupted run never corrupts it
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def find_reviews(root, pattern):
+    from fnmatch import fnmatch
+
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            if fnmatch(name, pattern):
+                yield os.path.join(directory, name)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    formats = args.formats or ["png"]
+    workers = args.workers or os.cpu_count() or 1
+    settings = {"version": FIGURE_VERSION, "formats": sorted(formats), "dpi": args.dpi, "rows": args.rows_per_page}
+    started = time.perf_counter()
+
+    if not os.path.isdir(args.input):
+        print(f"nos-figures: {args.input} is not a directory", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, MANIFEST)
+    manifest = load_manifest(manifest_path)
+
+    pending = {}
+    unchanged = 0
+    for path in find_reviews(args.input, args.pattern):
+        key = os.path.relpath(path, args.input)
+        digest = input_hash(path, settings)
+        entry = manifest.get(key)
+        if (
+            not args.force and entry and entry["hash"] == digest
+            and all(os.path.exists(name) for name in entry["files"])
+        ):
+            unchanged += 1
+            continue
+        target = os.path.join(args.output, os.path.splitext(key)[0])
+        pending[key] = (path, target, digest)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+        futures = {
+            pool.submit(render_review, path, target, formats, args.dpi, args.rows_per_page): key
+            for key, (path, target, _) in pending.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                files, studies, skipped = future.result()
+            except Exception as exc:
+                # One bad review, or a worker that died on it, fails only that review
+                failed += 1
+                manifest.pop(key, None)
+                save_manifest(manifest_path, manifest)
+                print(f"nos-figures: {key}: {type(exc).__name__}: {exc}", file=sys.stderr)
+                continue
+            previous = (manifest.get(key) or {}).get("files", [])
+            for name in stale_files(pending[key][1], previous, files):
+                if os.path.exists(name):
+                    os.remove(name)
+            manifest[key] = {"hash": pending[key][2], "files": sorted(files), "studies": studies}
+            save_manifest(manifest_path, manifest)
+            if skipped:
+                print(f"nos-figures: {key}: skipped {skipped} invalid rows", file=sys.stderr)
+            if not args.quiet:
+                print(f"{key}: {studies} studies, {len(files)} figures", file=sys.stderr)
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        print(
+            f"{len(pending) - failed} reviews rendered, {unchanged} unchanged, {failed} failed "
+            f"in {elapsed:.1f}s -> {args.output}",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Validate Newcastle-Ottawa Scale assessment files.
+
+Streams a CSV (the app's CSV export layout), JSON Lines or JSON file in
+chunks and reports, by row and column, unknown study types, answers that are
+not options of their criterion, missing required metadata, and stored total
+stars or quality ratings that do not match a recomputation::
+
+    nos-validate --input studies.csv --report violations.csv
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+if __package__ in (None, ""):
+    # Allow ``python scripts/validate_data.py`` from a source checkout
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.batch import DEFAULT_CHUNKSIZE, INPUT_FORMATS, ChunkWriter, read_chunks
+from src.validation import ERROR, VIOLATION_COLUMNS, summarize, validate_frame
+
+REPORT_FORMATS = ("csv", "jsonl", "json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nos-validate", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", "-i", required=True, help="CSV, JSON Lines or JSON file of assessments")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, help="default: from the input file extension")
+    parser.add_argument("--report", "-r", help="write every violation to this CSV, JSON Lines or JSON file")
+    parser.add_argument("--report-format", choices=REPORT_FORMATS, help="default: from the report file extension")
+    parser.add_argument(
+        "--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+        help=f"rows read and validated at a time (default: {DEFAULT_CHUNKSIZE})",
+    )
+    parser.add_argument("--show", type=int, default=20, help="violations to print (default: 20)")
+    parser.add_argument("--strict", action="store_true", help="fail on warnings as well as errors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    rows = 0
+    shown = []
+    counts = None
+    writer = None
+
+    try:
+        if args.report:
+            writer = ChunkWriter(args.report, args.report_format)
+            if writer.format not in REPORT_FORMATS:
+                raise ValueError(f"Reports can be written as {', '.join(REPORT_FORMATS)}")
+        for chunk in read_chunks(args.input, args.chunksize, args.input_format):
+            violations = validate_frame(chunk, first_row=rows + 1)
+            rows += len(chunk)
+            if writer is not None:
+                writer.write(violations)
+            if len(violations) and sum(map(len, shown)) < args.show:
+                shown.append(violations.head(args.show))
+            chunk_counts = summarize(violations)
+            counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        if counts is None:
+            # An empty input: still write the report header and count nothing
+            violations = pd.DataFrame(columns=list(VIOLATION_COLUMNS))
+            if writer is not None:
+                writer.write(violations)
+            counts = summarize(violations)
+    except (OSError, ValueError) as exc:
+        print(f"nos-validate: {exc}", file=sys.stderr)
+        return 2
+    finally:
+        if writer is not None:
+            writer.close()
+
+    counts = counts.astype(int)
+    errors = int(counts.xs(ERROR, level="severity").sum()) if ERROR in counts.index.get_level_values("severity") else 0
+    warnings = int(counts.sum()) - errors
+    elapsed = time.perf_counter() - started
+
+    with pd.option_context("display.width", 160, "display.max_colwidth", 60):
+        if shown and args.show:
+            print(pd.concat(shown).head(args.show).to_string(index=False))
+            print()
+        if len(counts):
+            print(counts.to_string())
+            print()
+    print(f"{rows:,} rows validated in {elapsed:.1f}s: {errors:,} errors, {warnings:,} warnings")
+    if args.report:
+        print(f"Full report: {args.report}")
+
+    failed = errors or (args.strict and warnings)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -82,12 +82,14 @@ setup(
             "nos-tool=src.main:main",
             "nos-batch=scripts.batch_assessment:main",
             "nos-validate=scripts.validate_data:main",
+            "nos-figures=scripts.render_figures:main",
         ],
     },
     include_package_data=True,
     package_data={
         "": ["*.json", "*.csv", "*.md", "*.txt", "*.yaml", "*.yml"],
         "data": ["templates/*", "examples/*"],
+        "src": ["scales/*.yaml", "scales/*.json"],
         "assets": ["images/*", "templates/*"],
     },
     keywords=[
@@ -0,0 +1 @@
+"""Core logic for the Newcastle-Ottawa Scale Assessment Tool, kept free of Streamlit."""
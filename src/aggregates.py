@@ -0,0 +1,69 @@
+"""Running summary counts for the report page.
+
+``SummaryAggregates`` holds quality counts, the star histogram, the study type
+distribution and per-domain star sums.  ``StudyStore`` updates it by the
+contribution of each study it adds or removes, so the report renders from a
+handful of small arrays no matter how many studies the review has.
+"""
+import numpy as np
+import pandas as pd
+
+from .scoring import QUALITY_LABELS
+
+
+class SummaryAggregates:
+    """Quality, type, star and domain totals maintained incrementally"""
+
+    def __init__(self, study_types, domains, domain_max):
+        self.study_types = tuple(study_types)
+        self.domains = tuple(domains)
+        # Max stars per (study type, domain), 0 where the domain does not apply
+        self.domain_max = np.asarray(domain_max)
+        self.total = 0
+        self.quality_counts = np.zeros(len(QUALITY_LABELS), dtype=np.int64)
+        self.type_counts = np.zeros(len(self.study_types), dtype=np.int64)
+        self.star_counts = np.zeros(int(self.domain_max.sum(axis=1).max()) + 1, dtype=np.int64)
+        # Integer star sums per (study type, domain) so removals never drift
+        self.domain_star_sums = np.zeros(self.domain_max.shape, dtype=np.int64)
+
+    def update(self, study_type, quality, total_stars, domain_stars, sign=1):
+        """Add (``sign=1``) or remove (``sign=-1``) the contribution of a batch of studies"""
+        self.total += sign * len(study_type)
+        self.quality_counts += sign * np.bincount(quality, minlength=len(self.quality_counts))
+        self.type_counts += sign * np.bincount(study_type, minlength=len(self.type_counts))
+        self.star_counts += sign * np.bincount(total_stars, minlength=len(self.star_counts))
+        for t in np.unique(study_type):
+            members = domain_stars[study_type == t]
+            self.domain_star_sums[t] += sign * np.where(members > 0, members, 0).sum(axis=0)
+
+    def quality_distribution(self):
+        return pd.Series(self.quality_counts, index=pd.Index(QUALITY_LABELS, name="Quality"), name="count")
+
+    def type_distribution(self):
+        """Study counts for the types present in the review"""
+        present = self.type_counts > 0
+        return pd.Series(
+            self.type_counts[present],
+            index=pd.Index(np.asarray(self.study_types)[present], name="Type"),
+            name="count",
+        )
+
+    def star_distribution(self):
+        """Study counts per total-star value that occurs in the review"""
+        stars = np.flatnonzero(self.star_counts)
+        return pd.Series(self.star_counts[stars], index=pd.Index(stars, name="Stars"), name="count")
+
+    def domain_means(self):
+        """Mean domain percentage over the studies each domain applies to"""
+        applies = self.domain_max > 0
+        studies = (self.type_counts[:, None] * applies).sum(axis=0)
+        fractions = np.divide(
+            self.domain_star_sums, self.domain_max,
+            out=np.zeros(self.domain_max.shape), where=applies,
+        ).sum(axis=0)
+        present = studies > 0
+        return pd.Series(
+            fractions[present] / studies[present] * 100,
+            index=pd.Index(np.asarray(self.domains)[present], name="Domain"),
+            name="Percentage",
+        )
@@ -0,0 +1,256 @@
+"""Inter-rater agreement between reviewers who assessed the same studies.
+
+``rating_array`` arranges a review's rater-tagged assessments as a rater ×
+study × criterion array of option codes, with matching arrays of domain and
+total stars.  Studies are matched across raters on their DOI, or on the study
+name when there is no DOI, and a study only counts towards a criterion if
+every rater answered it.
+
+Every statistic is computed from per-study sums: percent agreement (mean
+pairwise agreement), Cohen's kappa (the mean over rater pairs when there are
+more than two raters), Fleiss' kappa per criterion and per domain, and the
+ICC(2,1) of total stars.  The point estimate uses each study once and a
+bootstrap replicate uses multinomial study counts, so both are a single
+weighted matrix product over studies.  Replicates are drawn in chunks that
+can run on a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import MISSING
+
+BOOTSTRAP_CHUNK = 250
+STATISTICS = ("percent_agreement", "cohen_kappa", "fleiss_kappa")
+
+
+class RatingArray(NamedTuple):
+    raters: tuple
+    studies: tuple
+    criteria: tuple
+    domains: tuple
+    # (raters, studies, criteria) option codes, MISSING where a rater gave no answer
+    answers: np.ndarray
+    # (raters, studies, domains) stars, MISSING where a domain does not apply
+    domain_stars: np.ndarray
+    # (raters, studies), MISSING where a rater did not assess the study
+    total_stars: np.ndarray
+
+
+class AgreementResult(NamedTuple):
+    criteria: pd.DataFrame
+    domains: pd.DataFrame
+    icc: pd.Series
+    raters: tuple
+
+
+def study_keys(store):
+    """Key matching one study across raters: the DOI if there is one, else the study name"""
+    doi = pd.Series(store.column("doi"), dtype=object).fillna("").astype(str).str.strip().str.lower()
+    doi = doi.str.replace(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", "", regex=True)
+    name = pd.Series(store.column("study_name"), dtype=object).fillna("").astype(str)
+    name = name.str.lower().str.split().str.join(" ")
+    return np.where(doi != "", "doi:" + doi, "name:" + name)
+
+
+def rating_array(store):
+    """``RatingArray`` of the studies in ``store`` that carry a rater"""
+    with store.lock:
+        raters = store.column("rater").astype(str)
+        tagged = np.flatnonzero(raters != "")
+        keys = study_keys(store)[tagged]
+        answers = store.column("answers")[tagged]
+        domain_stars = store.column("domain_stars")[tagged]
+        total_stars = store.column("total_stars")[tagged]
+    rater_codes, rater_names = pd.factorize(raters[tagged], sort=True)
+    study_codes, study_names = pd.factorize(keys)
+    shape = (len(rater_names), len(study_names))
+
+    # A rater who assessed a study twice counts with their latest assessment
+    def scatter(values):
+        array = np.full(shape + values.shape[1:], MISSING, dtype=values.dtype)
+        array[rater_codes, study_codes] = values
+        return array
+
+    return RatingArray(
+        tuple(rater_names), tuple(study_names), store.criteria, store.domains,
+        scatter(answers), scatter(domain_stars), scatter(total_stars),
+    )
+
+
+def _columns(parts):
+    """Per-study parts flattened into one float block of the design matrix"""
+    n = len(parts[0])
+    return np.hstack([part.reshape(n, -1).astype(np.float64) for part in parts])
+
+
+class _CategoricalBlock:
+    """Per-study sums behind percent agreement and both kappas for a set of items"""
+
+    def __init__(self, codes, categories):
+        raters, _, items = codes.shape
+        self.shape = (raters, items, categories)
+        self.pairs = list(combinations(range(raters), 2))
+        valid = (codes != MISSING).all(axis=0)
+        onehot = (codes[..., None] == np.arange(categories)) & valid[None, :, :, None]
+        counts = onehot.sum(axis=0)
+        pairwise = (counts * (counts - 1)).sum(axis=-1) / (raters * (raters - 1))
+        agree = np.stack([(codes[a] == codes[b]) & valid for a, b in self.pairs], axis=1)
+        self.studies = valid.sum(axis=0)
+        # Per-rater one-hot counts are reordered to (studies, raters, items, categories)
+        self.columns = _columns([valid, pairwise, counts, onehot.transpose(1, 0, 2, 3), agree])
+
+    def widths(self):
+        raters, items, categories = self.shape
+        return [items, items, items * categories, raters * items * categories, len(self.pairs) * items]
+
+    def statistics(self, valid, pairwise, counts, onehot, agree):
+        """``(percent_agreement, cohen_kappa, fleiss_kappa)``, each (replicates, items), from summed columns"""
+        raters, items, categories = self.shape
+        replicates = len(valid)
+        n = valid[:, :, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            observed = pairwise / valid
+            shares = counts.reshape(replicates, items, categories) / (raters * n)
+            chance = (shares ** 2).sum(axis=-1)
+            fleiss = (observed - chance) / (1 - chance)
+
+            marginals = onehot.reshape(replicates, raters, items, categories) / n[:, None]
+            agree = agree.reshape(replicates, len(self.pairs), items) / valid[:, None]
+            cohen = np.stack([
+                (agree[:, p] - (marginals[:, a] * marginals[:, b]).sum(axis=-1))
+                / (1 - (marginals[:, a] * marginals[:, b]).sum(axis=-1))
+                for p, (a, b) in enumerate(self.pairs)
+            ]).mean(axis=0)
+        return observed, cohen, fleiss
+
+
+class _IntraclassBlock:
+    """Per-study sums behind the two-way random, absolute agreement ICC(2,1)"""
+
+    def __init__(self, scores):
+        self.raters = len(scores)
+        valid = (scores != MISSING).all(axis=0)
+        y = np.where(valid, scores, 0).T.astype(np.float64)
+        means = y.mean(axis=1)
+        self.studies = int(valid.sum())
+        self.columns = _columns([valid, valid * means, valid * means ** 2, (y ** 2).sum(axis=1), y])
+
+    def widths(self):
+        return [1, 1, 1, 1, self.raters]
+
+    def statistics(self, valid, mean_sum, mean_square_sum, square_sum, rater_sums):
+        k = self.raters
+        n = valid[:, 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grand = mean_sum[:, 0] / n
+            total_ss = square_sum[:, 0] - k * n * grand ** 2
+            row_ss = k * (mean_square_sum[:, 0] - n * grand ** 2)
+            column_means = rater_sums / n[:, None]
+            column_ss = n * ((column_means - grand[:, None]) ** 2).sum(axis=1)
+            error_ss = total_ss - row_ss - column_ss
+            msr = row_ss / (n - 1)
+            msc = column_ss / (k - 1)
+            mse = error_ss / ((n - 1) * (k - 1))
+            return (msr - mse) / (msr + (k - 1) * mse + k * (msc - mse) / n)
+
+
+class _AgreementModel:
+    """Column layout of the per-study design matrix and the statistics computed from its sums"""
+
+    def __init__(self, ratings):
+        self.blocks = [
+            _CategoricalBlock(ratings.answers, int(ratings.answers.max(initial=0)) + 1),
+            _CategoricalBlock(ratings.domain_stars, int(ratings.domain_stars.max(initial=0)) + 1),
+            _IntraclassBlock(ratings.total_stars),
+        ]
+        self.matrix = np.hstack([block.columns for block in self.blocks])
+        for block in self.blocks:
+            # Only the matrix is needed from here on, and the model is sent to worker processes
+            del block.columns
+        self.studies = len(self.matrix)
+
+    def statistics(self, sums):
+        """Rows of sums over studies -> (criterion stats, domain stats, icc) per row"""
+        results, start = [], 0
+        for block in self.blocks:
+            parts = []
+            for width in block.widths():
+                parts.append(sums[:, start:start + width])
+                start += width
+            results.append(block.statistics(*parts))
+        return results
+
+    def point(self):
+        return self.statistics(self.matrix.sum(axis=0, keepdims=True))
+
+    def replicates(self, seed, size):
+        rng = np.random.default_rng(seed)
+        weights = rng.multinomial(self.studies, np.full(self.studies, 1 / self.studies), size=size)
+        return self.statistics(weights @ self.matrix)
+
+
+def _bootstrap_chunk(model, seed, size):
+    return model.replicates(seed, size)
+
+
+def _bootstrap(model, replicates, seed, workers):
+    """Bootstrap statistics concatenated over chunks; chunk seeds do not depend on ``workers``"""
+    sizes = [min(BOOTSTRAP_CHUNK, replicates - start) for start in range(0, replicates, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers <= 1:
+        chunks = [model.replicates(s, size) for s, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_bootstrap_chunk, [model] * len(sizes), seeds, sizes))
+    return [
+        tuple(map(np.concatenate, zip(*parts))) if isinstance(parts[0], tuple) else np.concatenate(parts)
+        for parts in zip(*chunks)
+    ]
+
+
+def _table(names, counts, point, samples, alpha, index_name):
+    table = pd.DataFrame({"studies": counts.astype(np.int64)}, index=pd.Index(names, name=index_name))
+    for name, values in zip(STATISTICS, point):
+        table[name] = values[0]
+        if samples is not None:
+            table[f"{name}_low"] = np.nanpercentile(samples[name], 100 * alpha / 2, axis=0)
+            table[f"{name}_high"] = np.nanpercentile(samples[name], 100 * (1 - alpha / 2), axis=0)
+    return table[table["studies"] > 0]
+
+
+def agreement(store, bootstrap=0, confidence=0.95, seed=0, workers=1):
+    """Agreement between the raters of a review.
+
+    Returns an ``AgreementResult`` with one row per criterion and per domain
+    that at least one study has complete ratings for, and the ICC of total
+    stars.  With ``bootstrap`` replicates, percentile confidence intervals
+    are added as ``<statistic>_low`` and ``<statistic>_high``; ``workers``
+    above 1 draws them on a process pool.
+    """
+    ratings = rating_array(store)
+    if len(ratings.raters) < 2:
+        raise ValueError("Agreement needs assessments from at least two raters")
+    model = _AgreementModel(ratings)
+    criteria_point, domain_point, icc_point = model.point()
+    criteria_samples = domain_samples = icc_samples = None
+    alpha = 1 - confidence
+    if bootstrap:
+        criteria_draws, domain_draws, icc_samples = _bootstrap(model, bootstrap, seed, workers)
+        criteria_samples = dict(zip(STATISTICS, criteria_draws))
+        domain_samples = dict(zip(STATISTICS, domain_draws))
+
+    criteria_block, domain_block, icc_block = model.blocks
+    icc = pd.Series({"icc": icc_point[0], "studies": icc_block.studies}, name="Total_Stars")
+    if icc_samples is not None:
+        icc["icc_low"] = np.nanpercentile(icc_samples, 100 * alpha / 2)
+        icc["icc_high"] = np.nanpercentile(icc_samples, 100 * (1 - alpha / 2))
+    return AgreementResult(
+        _table(ratings.criteria, criteria_block.studies, criteria_point, criteria_samples, alpha, "Criterion"),
+        _table(ratings.domains, domain_block.studies, domain_point, domain_samples, alpha, "Domain"),
+        icc,
+        ratings.raters,
+    )
@@ -0,0 +1,369 @@
+"""Chunked reading, scoring and writing of assessment tables.
+
+Tables use the column names of the app's CSV export (``Study_Name``,
+``Study_Type``, ... and one ``NOS_<criterion>`` column per criterion).  The
+app's JSON records, with lowercase keys and a nested ``assessment`` dict, are
+flattened into the same layout.  Everything works one chunk at a time so
+memory stays bounded by the chunk size, not the input size.
+"""
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .metrics import timed
+from .scoring import MISSING, QUALITY_LABELS, get_scale
+from .store import EFFECT_PREFIX, EXPORT_COLUMNS, STUDY_TYPES, VARIANCE_PREFIX, criteria_union, domain_union
+
+INPUT_FORMATS = ("csv", "jsonl", "json")
+OUTPUT_FORMATS = ("csv", "jsonl", "json", "parquet")
+DEFAULT_CHUNKSIZE = 10000
+
+
+def detect_format(path, choices):
+    """File format from the extension of ``path``"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    extension = {"ndjson": "jsonl"}.get(extension, extension)
+    if extension not in choices:
+        raise ValueError(f"Cannot tell the format of {path!r}; expected one of: {', '.join(choices)}")
+    return extension
+
+
+def result_columns():
+    """Column layout of a scored table"""
+    return (
+        list(EXPORT_COLUMNS.values())
+        + [f"NOS_{name}" for name in criteria_union()]
+        + [f"{name}_Stars" for name in domain_union()]
+    )
+
+
+def flatten_record(record):
+    """Flatten one app JSON record into an export-style row"""
+    row = {
+        EXPORT_COLUMNS.get(key, key): value for key, value in record.items() if key not in ("assessment", "effects")
+    }
+    for name, option in (record.get("assessment") or {}).items():
+        row[f"NOS_{name}"] = option
+    for outcome, values in (record.get("effects") or {}).items():
+        row[f"{EFFECT_PREFIX}{outcome}"] = values.get("effect")
+        row[f"{VARIANCE_PREFIX}{outcome}"] = values.get("variance")
+    return row
+
+
+def effect_columns(frame):
+    """``Effect_<outcome>`` and ``Variance_<outcome>`` columns of a table, in table order"""
+    return [column for column in frame.columns if str(column).startswith((EFFECT_PREFIX, VARIANCE_PREFIX))]
+
+
+def outcome_columns(outcomes):
+    """``Effect_<outcome>`` and ``Variance_<outcome>`` column pairs of ``outcomes``"""
+    return [f"{prefix}{outcome}" for outcome in outcomes for prefix in (EFFECT_PREFIX, VARIANCE_PREFIX)]
+
+
+def scan_outcomes(source, fmt=None):
+    """Outcomes with effect columns anywhere in a file, in order of first appearance.
+
+    A CSV file has them in its header; JSON and JSON Lines records may each
+    report different outcomes, so those files are read through once (one
+    record at a time) to collect them.  ``source`` must be a path, since the
+    file is read again afterwards.
+    """
+    fmt = fmt or detect_format(source, INPUT_FORMATS)
+    if fmt == "csv":
+        columns = pd.read_csv(source, nrows=0).columns
+    elif fmt in ("jsonl", "json"):
+        columns = {}
+        with _open_text(source) as handle:
+            for record in _records(handle, fmt):
+                columns.update(dict.fromkeys(flatten_record(record)))
+    else:
+        raise ValueError(f"Unsupported input format {fmt!r}")
+    outcomes = {}
+    for column in map(str, columns):
+        for prefix in (EFFECT_PREFIX, VARIANCE_PREFIX):
+            if column.startswith(prefix):
+                outcomes[column[len(prefix):]] = None
+    return tuple(outcomes)
+
+
+def normalize_frame(frame, coerce=True, outcomes=None):
+    """Rename columns to the export layout, drop unknown ones and add any that are missing.
+
+    Effect size columns are kept after the scored columns.  With ``outcomes``
+    every chunk gets the columns of those outcomes, reported or not, followed
+    by any other effect columns the chunk has.  With ``coerce`` the year and
+    star columns are converted to nullable integers and effect columns to
+    floats; without it they keep their raw values for validation.
+    """
+    criteria = set(criteria_union())
+    renames = {}
+    for column in frame.columns:
+        if column in EXPORT_COLUMNS:
+            renames[column] = EXPORT_COLUMNS[column]
+        elif column in criteria:
+            renames[column] = f"NOS_{column}"
+    effects = effect_columns(frame)
+    if outcomes is not None:
+        declared = outcome_columns(outcomes)
+        effects = declared + [column for column in effects if column not in declared]
+    frame = frame.rename(columns=renames).reindex(columns=result_columns() + effects)
+    if not coerce:
+        return frame
+    frame["Publication_Year"] = pd.to_numeric(frame["Publication_Year"], errors="coerce").round().astype("Int32")
+    frame["Total_Stars"] = pd.to_numeric(frame["Total_Stars"], errors="coerce").round().astype("Int16")
+    for column in effects:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype(float)
+    return frame
+
+
+def iter_json_array(handle, blocksize=1 << 16):
+    """Yield the items of a JSON array from a text stream without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        block = handle.read(blocksize)
+        eof = not block
+        buffer, pos = buffer[pos:] + block, 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(" \t\r\n")
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number may continue in the next block
+            fill()
+            continue
+        pos = end
+        yield item
+
+
+@contextmanager
+def _open_text(source, encoding="utf-8", errors="strict"):
+    """Text stream over a path or an open (text or binary) file object"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding=encoding, errors=errors) as handle:
+            yield handle
+    elif isinstance(source, io.TextIOBase):
+        yield source
+    else:
+        text = io.TextIOWrapper(source, encoding=encoding, errors=errors)
+        try:
+            yield text
+        finally:
+            text.detach()
+
+
+def _records(handle, fmt):
+    """Records of a JSON Lines or JSON array text stream, one at a time"""
+    if fmt == "jsonl":
+        return (json.loads(line) for line in handle if line.strip())
+    return iter_json_array(handle)
+
+
+def read_chunks(source, chunksize=DEFAULT_CHUNKSIZE, fmt=None):
+    """Yield DataFrames of at most ``chunksize`` rows from a CSV, JSON Lines or JSON file.
+
+    ``source`` is a path or a file object (which then needs ``fmt`` or a
+    ``name``).  All three formats are streamed; a JSON array such as the
+    app's JSON export is parsed one record at a time.
+    """
+    fmt = fmt or detect_format(getattr(source, "name", source), INPUT_FORMATS)
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False, na_values=[""])
+    elif fmt in ("jsonl", "json"):
+        with _open_text(source) as handle:
+            records = _records(handle, fmt)
+            while True:
+                batch = list(islice(records, chunksize))
+                if not batch:
+                    break
+                yield pd.DataFrame([flatten_record(record) for record in batch])
+    else:
+        raise ValueError(f"Unsupported input format {fmt!r}")
+
+
+def _nullable(values, dtype):
+    array = pd.array(values, dtype=dtype)
+    array[values == MISSING] = pd.NA
+    return array
+
+
+def score_columns(frame):
+    """Total stars, quality codes and domain stars for a normalized frame.
+
+    Rows whose study type is not a ``NOS_CRITERIA`` key get MISSING (-1)
+    everywhere.
+    """
+    domains = domain_union()
+    totals = np.full(len(frame), MISSING, dtype=np.int16)
+    quality = np.full(len(frame), MISSING, dtype=np.intp)
+    domain_stars = np.full((len(frame), len(domains)), MISSING, dtype=np.int16)
+
+    for study_type in STUDY_TYPES:
+        members = np.flatnonzero((frame["Study_Type"] == study_type).to_numpy(dtype=bool))
+        if not len(members):
+            continue
+        scale = get_scale(study_type)
+        codes = scale.encode_columns(
+            {name: frame[f"NOS_{name}"].iloc[members] for name in scale.criteria}, len(members)
+        )
+        result = scale.score(codes)
+        totals[members] = result.total_stars
+        quality[members] = result.quality_codes
+        domain_stars[members[:, None], [domains.index(name) for name in scale.domains]] = result.domain_stars
+    return totals, quality, domain_stars
+
+
+@timed("scoring/frame")
+def score_frame(frame, outcomes=None):
+    """Normalize a chunk and fill in total stars, quality and domain stars"""
+    frame = normalize_frame(frame, outcomes=outcomes)
+    totals, quality, domain_stars = score_columns(frame)
+    domains = domain_union()
+    frame["Total_Stars"] = _nullable(totals, "Int16")
+    # Index MISSING (-1) picks the trailing None
+    frame["Quality_Rating"] = np.asarray(QUALITY_LABELS + (None,), dtype=object)[quality]
+    for j, name in enumerate(domains):
+        frame[f"{name}_Stars"] = _nullable(domain_stars[:, j], "Int16")
+    return frame
+
+
+def score_chunks(chunks, workers=1, outcomes=None):
+    """Score chunks in input order, optionally on a process pool.
+
+    ``outcomes`` fixes the effect columns of every scored chunk (see
+    ``normalize_frame``).  At most ``2 * workers`` chunks are in flight, so a
+    large input never piles up in memory waiting for the pool.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_frame(chunk, outcomes)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(score_frame, chunk, outcomes))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def arrow_schema(columns):
+    """Fixed Arrow schema for scored tables, so every Parquet row group matches"""
+    import pyarrow as pa
+
+    def column_type(column):
+        if column == "Publication_Year":
+            return pa.int32()
+        if column.endswith("_Stars"):
+            return pa.int16()
+        if column.startswith((EFFECT_PREFIX, VARIANCE_PREFIX)):
+            return pa.float64()
+        return pa.string()
+
+    return pa.schema([(column, column_type(column)) for column in columns])
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV, JSON Lines, JSON or Parquet file.
+
+    The first chunk fixes the columns of the file.  Later chunks are written
+    in that column order; a chunk with a column the file does not have
+    raises ``ValueError`` rather than writing a ragged CSV or dropping the
+    column from a Parquet file.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or detect_format(path, OUTPUT_FORMATS)
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format {self.format!r}")
+        self.rows = 0
+        self.columns = None
+        self._header_written = False
+        self._handle = None
+        self._parquet = None
+        if self.format != "parquet":
+            self._handle = open(path, "w", encoding="utf-8", newline="")
+            if self.format == "json":
+                self._handle.write("[\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        elif list(frame.columns) != self.columns:
+            unknown = [column for column in frame.columns if column not in self.columns]
+            if unknown:
+                raise ValueError(
+                    f"Columns not in the first chunk written to {self.path}: {', '.join(map(str, unknown))}"
+                )
+            frame = frame.reindex(columns=self.columns)
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._parquet is None:
+                self._schema = arrow_schema(frame.columns)
+                self._parquet = pq.ParquetWriter(self.path, self._schema)
+            self._parquet.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+        elif self.format == "csv":
+            # Written with the first chunk even if it is empty, and only then
+            frame.to_csv(self._handle, header=not self._header_written, index=False)
+            self._header_written = True
+        elif len(frame):
+            lines = frame.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n")
+            if self.format == "json":
+                if self.rows:
+                    self._handle.write(",\n")
+                lines = lines.replace("\n", ",\n")
+            self._handle.write(lines + "\n" if self.format == "jsonl" else lines)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._handle is not None:
+            if self.format == "json":
+                self._handle.write("\n]\n")
+            self._handle.close()
+            self._handle = None
@@ -0,0 +1,91 @@
+"""Process-wide LRU cache for artifacts derived from a review.
+
+Keys start with a dataset key, ``(store uid, store version)``, so an entry can
+never be served for data that has changed since it was built: every mutation
+of a ``StudyStore`` bumps its version.  The cache is bounded by entry count
+and by approximate size; the least recently used entries go first.  One
+instance, ``ARTIFACTS``, is shared by every page and session of the app.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MAX_ENTRIES = 128
+MAX_BYTES = 512 * 1024 * 1024
+
+
+def sizeof(value):
+    """Approximate memory footprint of a cached value in bytes"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if isinstance(nbytes, (int, np.integer)) else sys.getsizeof(value)
+
+
+class ArtifactCache:
+    """Thread-safe LRU mapping bounded by entries and bytes"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, build):
+        """Cached value for ``key``, calling ``build()`` on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        # Built outside the lock so other sessions are not blocked meanwhile
+        value = build()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def discard(self, owner):
+        """Drop every entry whose key starts with ``owner``"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == owner]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+ARTIFACTS = ArtifactCache()
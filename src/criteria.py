@@ -0,0 +1,10 @@
+"""Newcastle-Ottawa Scale criteria for each supported study type.
+
+The scales are defined in the YAML files of ``src/scales`` (see
+``src.definitions``); ``NOS_CRITERIA`` is the same data as nested dicts:
+``{study type: {domain: {criterion: {question, options, stars, max_stars}}}}``.
+"""
+from .definitions import SCALE_DEFINITIONS, criteria_mapping
+
+# Newcastle-Ottawa Scale criteria
+NOS_CRITERIA = criteria_mapping(SCALE_DEFINITIONS)
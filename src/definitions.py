@@ -0,0 +1,245 @@
+"""Scale definitions read from YAML or JSON files.
+
+Every file in ``src/scales``, followed by the directories listed in the
+``NOS_SCALES`` environment variable, defines one study type: its domains,
+criteria and options with their stars, and the quality rule that turns stars
+into a rating.  A definition may ``extends`` an earlier one to reuse its
+domains with a different quality rule, as the AHRQ variants do.  Files are
+read in name order and a later definition replaces an earlier one with the
+same name.
+
+Definitions are validated as they are loaded, once per process, and kept as
+immutable tuples.  ``src.scoring`` compiles them into scoring plans, and
+reloads them when ``files_signature`` shows a file was edited, added or
+removed.  ``fingerprint`` identifies what the definitions score, so stored
+scores can tell whether they were computed with the current scales.
+"""
+import hashlib
+import json
+import os
+from typing import NamedTuple
+
+SCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scales")
+DEFINITION_SUFFIXES = (".yaml", ".yml", ".json")
+QUALITY_LEVELS = ("good", "fair")
+
+
+class ScaleDefinitionError(ValueError):
+    """A scale definition file is malformed"""
+
+
+class Option(NamedTuple):
+    key: str
+    label: str
+    stars: int
+
+
+class Criterion(NamedTuple):
+    key: str
+    question: str
+    options: tuple
+    max_stars: int
+
+
+class Domain(NamedTuple):
+    name: str
+    criteria: tuple
+
+
+class QualityRule(NamedTuple):
+    """Minimum stars for a Good and a Fair rating; a study meeting neither is Poor.
+
+    A level is met when the total reaches its ``*_total`` and every domain in
+    its ``*_domains`` pairs reaches the given stars.
+    """
+    good_total: int = 0
+    fair_total: int = 0
+    # ((domain, minimum stars), ...)
+    good_domains: tuple = ()
+    fair_domains: tuple = ()
+
+
+class ScaleDefinition(NamedTuple):
+    name: str
+    domains: tuple
+    quality: QualityRule
+    description: str = ""
+    source: str = ""
+
+
+def _require(condition, source, message):
+    if not condition:
+        raise ScaleDefinitionError(f"{source}: {message}")
+
+
+def _stars(value, source, what):
+    valid = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+    _require(valid, source, f"{what} must be a non-negative integer, not {value!r}")
+    return value
+
+
+def _text(value, source, what):
+    valid = isinstance(value, str) and value.strip()
+    _require(valid, source, f"{what} must be a non-empty string, not {value!r}")
+    return value
+
+
+def _unique(keys, source, what):
+    seen = set()
+    for key in keys:
+        _require(key not in seen, source, f"duplicate {what} {key!r}")
+        seen.add(key)
+
+
+def _parse_domains(data, source):
+    _require(isinstance(data, list) and data, source, "'domains' must be a non-empty list")
+    domains = []
+    for domain in data:
+        _require(isinstance(domain, dict), source, "each domain must be a mapping")
+        name = _text(domain.get("name"), source, "domain name")
+        criteria = []
+        valid = isinstance(domain.get("criteria"), list) and domain["criteria"]
+        _require(valid, source, f"domain {name!r} needs a non-empty 'criteria' list")
+        for criterion in domain["criteria"]:
+            _require(isinstance(criterion, dict), source, f"each criterion of {name!r} must be a mapping")
+            key = _text(criterion.get("key"), source, f"criterion key in {name!r}")
+            where = f"criterion {key!r}"
+            valid = isinstance(criterion.get("options"), list) and criterion["options"]
+            _require(valid, source, f"{where} needs a non-empty 'options' list")
+            options = []
+            for option in criterion["options"]:
+                _require(isinstance(option, dict), source, f"each option of {where} must be a mapping")
+                options.append(Option(
+                    _text(option.get("key"), source, f"option key of {where}"),
+                    _text(option.get("label"), source, f"option label of {where}"),
+                    _stars(option.get("stars", 0), source, f"stars of {where}"),
+                ))
+            _unique((option.key for option in options), source, f"option of {where}")
+            top = max(option.stars for option in options)
+            max_stars = _stars(criterion.get("max_stars", top), source, f"max_stars of {where}")
+            _require(max_stars >= top, source, f"max_stars of {where} is below its best option")
+            question = _text(criterion.get("question"), source, f"question of {where}")
+            criteria.append(Criterion(key, question, tuple(options), max_stars))
+        domains.append(Domain(name, tuple(criteria)))
+    _unique((domain.name for domain in domains), source, "domain")
+    _unique((criterion.key for domain in domains for criterion in domain.criteria), source, "criterion")
+    return tuple(domains)
+
+
+def _parse_quality(data, domains, source):
+    valid = isinstance(data, dict) and set(data) == set(QUALITY_LEVELS)
+    _require(valid, source, "'quality' must define exactly 'good' and 'fair'")
+    domain_max = {domain.name: sum(c.max_stars for c in domain.criteria) for domain in domains}
+    rule = {}
+    for level in QUALITY_LEVELS:
+        condition = data[level]
+        valid = isinstance(condition, dict) and condition and set(condition) <= {"total", "domains"}
+        _require(valid, source, f"quality '{level}' needs a 'total' and/or 'domains'")
+        rule[f"{level}_total"] = _stars(condition.get("total", 0), source, f"{level} total")
+        minimums = condition.get("domains", {})
+        _require(isinstance(minimums, dict), source, f"{level} domains must map domain names to stars")
+        for name, stars in minimums.items():
+            _require(name in domain_max, source, f"{level} rule names unknown domain {name!r}")
+            stars = _stars(stars, source, f"{level} minimum for {name!r}")
+            _require(stars <= domain_max[name], source, f"{level} minimum for {name!r} is above the domain maximum")
+        rule[f"{level}_domains"] = tuple(minimums.items())
+    _require(rule["good_total"] <= sum(domain_max.values()), source, "good total is above the scale's maximum")
+    _require(rule["good_total"] >= rule["fair_total"], source, "good total is below the fair total")
+    return QualityRule(**rule)
+
+
+def parse_definition(data, source="<definition>", base=None):
+    """Validated ``ScaleDefinition`` from a parsed file; ``base`` is the definition it extends"""
+    _require(isinstance(data, dict), source, "a scale definition must be a mapping")
+    known = {"name", "description", "extends", "quality", "domains"}
+    _require(set(data) <= known, source, f"unknown fields {sorted(set(data) - known)}")
+    name = _text(data.get("name"), source, "'name'")
+    if base is not None:
+        _require("domains" not in data, source, "a definition that extends another cannot redefine its domains")
+        domains = base.domains
+    else:
+        domains = _parse_domains(data.get("domains"), source)
+    _require("quality" in data or base is not None, source, "'quality' is required")
+    quality = _parse_quality(data["quality"], domains, source) if "quality" in data else base.quality
+    description = data.get("description", base.description if base is not None else "")
+    return ScaleDefinition(name, domains, quality, description, source)
+
+
+def read_file(path):
+    """Parsed contents of a YAML or JSON definition file"""
+    with open(path, encoding="utf-8") as handle:
+        if path.endswith(".json"):
+            return json.load(handle)
+        import yaml
+
+        return yaml.load(handle, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def definition_files(directories=None):
+    """Definition files of the built-in and ``NOS_SCALES`` directories, in load order"""
+    if directories is None:
+        extra = os.environ.get("NOS_SCALES", "")
+        directories = [SCALES_DIR] + [path for path in extra.split(os.pathsep) if path]
+    files = []
+    for directory in directories:
+        files.extend(
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(DEFINITION_SUFFIXES)
+        )
+    return files
+
+
+def files_signature(directories=None):
+    """``(path, size, mtime)`` of every definition file; changes when one is edited, added or removed"""
+    signature = []
+    for path in definition_files(directories):
+        stat = os.stat(path)
+        signature.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def load_definitions(directories=None):
+    """``{name: ScaleDefinition}`` for every definition file, in load order"""
+    definitions = {}
+    for path in definition_files(directories):
+        data = read_file(path)
+        base = None
+        if isinstance(data, dict) and "extends" in data:
+            base = definitions.get(data["extends"])
+            _require(base is not None, path, f"extends unknown scale {data['extends']!r}; it must be loaded first")
+        definition = parse_definition(data, path, base)
+        definitions.pop(definition.name, None)
+        definitions[definition.name] = definition
+    if not definitions:
+        raise ScaleDefinitionError("No scale definitions found")
+    return definitions
+
+
+def criteria_mapping(definitions):
+    """Definitions as ``{study type: {domain: {criterion: {question, options, stars, max_stars}}}}``"""
+    return {
+        name: {
+            domain.name: {
+                criterion.key: {
+                    "question": criterion.question,
+                    "options": {option.key: option.label for option in criterion.options},
+                    "stars": {option.key: option.stars for option in criterion.options},
+                    "max_stars": criterion.max_stars,
+                }
+                for criterion in domain.criteria
+            }
+            for domain in definition.domains
+        }
+        for name, definition in definitions.items()
+    }
+
+
+def fingerprint(definitions):
+    """Hash of the criteria, stars and quality rules of ``definitions``; descriptions and paths do not count"""
+    data = [(definition.name, definition.domains, definition.quality) for definition in definitions.values()]
+    return hashlib.sha256(repr(data).encode("utf-8")).hexdigest()
+
+
+# Read once per process; ``src.scoring.reload_scales`` reads the files again
+SCALE_FILES = files_signature()
+SCALE_DEFINITIONS = load_definitions()
@@ -0,0 +1,94 @@
+"""Duplicate detection on normalized DOI and on a title/first-author/year key.
+
+``duplicate_keys`` turns a study's metadata into two hashable keys: its DOI
+without resolver prefix and case, and its normalized name, first author
+surname and year.  Both keys include the rater, so the same study assessed by
+two reviewers is not a duplicate.  ``DuplicateIndex`` maps keys to study ids
+and is updated as studies are added and removed, so checking a new study is a
+dictionary lookup and checking an import is one pass over its rows.
+"""
+import re
+import unicodedata
+
+_DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+_NON_WORD = re.compile(r"[\W_]+")
+_APOSTROPHE = re.compile("['\u2019]")
+_AUTHOR_SEPARATOR = re.compile(r"[,;]")
+
+
+def normalize_doi(doi):
+    """Lowercase DOI without a resolver URL or ``doi:`` prefix; "" when there is none"""
+    if doi is None or doi != doi:
+        return ""
+    return _DOI_PREFIX.sub("", str(doi).strip()).strip().lower()
+
+
+def normalize_text(text):
+    """Lowercase ASCII words separated by single spaces"""
+    if text is None or text != text:
+        return ""
+    text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    # "O'Brien" -> "obrien", so the surname stays one word
+    return _NON_WORD.sub(" ", _APOSTROPHE.sub("", text.lower())).strip()
+
+
+def _year(value):
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError, OverflowError):
+        return ""
+
+
+def duplicate_keys(doi, name, authors, year, rater=""):
+    """``(doi_key, title_key)`` of a study; either is None when the study lacks the fields"""
+    rater = normalize_text(rater)
+    doi = normalize_doi(doi)
+    title = normalize_text(name)
+    first_author = normalize_text(_AUTHOR_SEPARATOR.split(str(authors or ""), maxsplit=1)[0]).split(" ")[0]
+    return (
+        f"{rater}\x1f{doi}" if doi else None,
+        f"{rater}\x1f{title}\x1f{first_author}\x1f{_year(year)}" if title else None,
+    )
+
+
+def study_duplicate_keys(study):
+    """``duplicate_keys`` of a study dict"""
+    return duplicate_keys(
+        study.get("doi"), study.get("study_name"), study.get("authors"),
+        study.get("publication_year"), study.get("rater"),
+    )
+
+
+class DuplicateIndex:
+    """Study ids by DOI key and by title key"""
+
+    def __init__(self):
+        self._ids = ({}, {})
+
+    def add(self, study_id, keys):
+        for index, key in zip(self._ids, keys):
+            if key is not None:
+                index.setdefault(key, set()).add(study_id)
+
+    def remove(self, study_id, keys):
+        for index, key in zip(self._ids, keys):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(study_id)
+                if not ids:
+                    del index[key]
+
+    def find(self, keys):
+        """Sorted ids of the studies sharing either key"""
+        found = set()
+        for index, key in zip(self._ids, keys):
+            if key is not None:
+                found |= index.get(key, set())
+        return sorted(found)
+
+    def clear(self):
+        for index in self._ids:
+            index.clear()
+
@@ -0,0 +1,38 @@
+"""Render models for the assessment form, built once per process.
+
+``form_layout`` turns a scale definition into the domain headings, questions
+and radio labels the Add New Study page shows, so a rerun only looks them up.
+The cache is keyed by ``scale_revision`` and rebuilt after ``reload_scales``.
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+from .scoring import get_scale, scale_revision
+
+
+class CriterionField(NamedTuple):
+    name: str
+    question: str
+    option_keys: tuple
+    labels: tuple
+
+
+@lru_cache(maxsize=None)
+def _form_layout(study_type, revision):
+    return tuple(
+        (domain.name, tuple(
+            CriterionField(
+                criterion.key,
+                criterion.question,
+                tuple(option.key for option in criterion.options),
+                tuple(f"{option.label} {'★' * option.stars or '☆'}" for option in criterion.options),
+            )
+            for criterion in domain.criteria
+        ))
+        for domain in get_scale(study_type).definition.domains
+    )
+
+
+def form_layout(study_type):
+    """``((domain, (CriterionField, ...)), ...)`` for a study type's form"""
+    return _form_layout(study_type, scale_revision())
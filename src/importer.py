@@ -0,0 +1,172 @@
+"""Bulk import of the app's JSON and CSV exports.
+
+Files are read in chunks with ``src.batch.read_chunks``.  Each chunk is checked
+by ``validate_frame`` and the rows without blocking errors are handed to the
+backend's ``save_frame``, which encodes and rescores the whole chunk at once.
+Stored total stars and quality ratings are never trusted: a mismatch is
+reported, but the study is imported with its recomputed score.  Rows that
+duplicate a study already in the review, or an earlier row of the file, are
+reported as warnings and skipped (see ``src.duplicates``).
+
+``import_references`` adds the records of a reference manager export to the
+review's pending studies the same way, a chunk of records at a time.
+"""
+from itertools import islice
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .batch import DEFAULT_CHUNKSIZE, INPUT_FORMATS, normalize_frame, read_chunks
+from .duplicates import DuplicateIndex, duplicate_keys, study_duplicate_keys
+from .metrics import timed
+from .references import read_references
+from .validation import ERROR, VIOLATION_COLUMNS, WARNING, validate_frame
+
+IMPORT_FORMATS = INPUT_FORMATS
+# Errors in these columns are fixed by rescoring, so they do not block a row
+RESCORED_COLUMNS = ("Total_Stars", "Quality_Rating")
+
+
+class ImportResult(NamedTuple):
+    ids: list
+    skipped: int
+    violations: pd.DataFrame
+    duplicates: int
+
+
+def _first_match(find, keys):
+    """``(id, column)`` of the first study matching on DOI, then on title; None if neither does"""
+    if not find(keys):
+        return None
+    doi_key, title_key = keys
+    if doi_key is not None:
+        ids = find((doi_key, None))
+        if ids:
+            return ids[0], "DOI"
+    if title_key is not None:
+        ids = find((None, title_key))
+        if ids:
+            return ids[0], "Study_Name"
+    return None
+
+
+def duplicate_rows(backend, frame, rows):
+    """Rows of an import chunk that duplicate a stored study or an earlier row of the chunk.
+
+    ``frame`` is in the CSV export layout and ``rows`` holds its record
+    numbers.  Returns a boolean mask over ``frame`` and one warning per
+    duplicate in the ``src.validation`` violation layout.  Each row costs two
+    index lookups at most, so a chunk is checked in linear time.
+    """
+    columns = [frame[name].tolist() for name in ("DOI", "Study_Name", "Authors", "Publication_Year", "Rater")]
+    seen = DuplicateIndex()
+    mask = np.zeros(len(frame), dtype=bool)
+    found = []
+    for i, (row, values) in enumerate(zip(rows.tolist(), zip(*columns))):
+        keys = duplicate_keys(*values)
+        match = _first_match(backend.find_duplicates, keys)
+        if match is not None:
+            message = f"duplicate of study {match[0]}"
+        else:
+            match = _first_match(seen.find, keys)
+            if match is None:
+                seen.add(row, keys)
+                continue
+            message = f"duplicate of row {match[0]}"
+        mask[i] = True
+        column = match[1]
+        found.append((row, column, WARNING, message, values[0 if column == "DOI" else 1], None))
+    return mask, pd.DataFrame(found, columns=list(VIOLATION_COLUMNS))
+
+
+@timed("import")
+def import_file(backend, source, fmt=None, chunksize=DEFAULT_CHUNKSIZE, progress=None, skip_duplicates=True):
+    """Validate and save every importable study from an export file.
+
+    ``source`` is a path or file object accepted by ``read_chunks``.  Rows with
+    errors other than stale scores are skipped and listed in the result's
+    violations.  Duplicates are listed too and counted in ``duplicates``; they
+    are skipped unless ``skip_duplicates`` is off.  ``progress(rows_read,
+    rows_imported)`` is called after each chunk.
+    """
+    ids, skipped, duplicates, reports = [], 0, 0, []
+    first_row = 1
+    for chunk in read_chunks(source, chunksize, fmt):
+        raw = normalize_frame(chunk, coerce=False)
+        violations = validate_frame(raw, first_row)
+        blocking = violations["row"][
+            (violations["severity"] == ERROR) & ~violations["column"].isin(RESCORED_COLUMNS)
+        ]
+        rows = np.arange(first_row, first_row + len(raw))
+        keep = ~np.isin(rows, blocking.to_numpy())
+        skipped += int((~keep).sum())
+        duplicate, found = duplicate_rows(backend, raw[keep], rows[keep])
+        duplicates += len(found)
+        if skip_duplicates:
+            keep[np.flatnonzero(keep)[duplicate]] = False
+        ids.extend(backend.save_frame(raw[keep].reset_index(drop=True)))
+        for report in (violations, found):
+            if len(report):
+                reports.append(report)
+        first_row += len(raw)
+        if progress is not None:
+            progress(first_row - 1, len(ids))
+    violations = (
+        pd.concat(reports, ignore_index=True).sort_values("row", kind="stable", ignore_index=True)
+        if reports else pd.DataFrame(columns=list(VIOLATION_COLUMNS))
+    )
+    return ImportResult(ids, skipped, violations, duplicates)
+
+
+@timed("import/references")
+def import_references(backend, source, fmt=None, chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    """Add every new record of a RIS, BibTeX or EndNote XML file to the review's pending studies.
+
+    Records are parsed and saved ``chunksize`` at a time, so memory does not
+    grow with the file.  Records without a title are skipped and counted in
+    ``skipped``.  Records that duplicate an assessed study without a rater, a
+    pending study or an earlier record of the file are skipped and counted
+    in ``duplicates``.  Both are listed in the result's violations, with
+    ``row`` numbering the file's records.  ``progress(records_read,
+    references_added)`` is called after each chunk.
+    """
+    ids, skipped, duplicates, reports = [], 0, 0, []
+    records = read_references(source, fmt)
+    read = 0
+    while True:
+        chunk = list(islice(records, chunksize))
+        if not chunk:
+            break
+        # Earlier chunks are already pending, so only this chunk needs its own index
+        seen = DuplicateIndex()
+        new, found = [], []
+        for row, reference in enumerate(chunk, read + 1):
+            if not reference["study_name"]:
+                found.append((row, "Study_Name", ERROR, "missing title", None, None))
+                skipped += 1
+                continue
+            keys = study_duplicate_keys(reference)
+            for find, label in (
+                (backend.find_duplicates, "study"), (backend.find_references, "pending study"), (seen.find, "record"),
+            ):
+                match = _first_match(find, keys)
+                if match is not None:
+                    value = reference["doi"] if match[1] == "DOI" else reference["study_name"]
+                    found.append((row, match[1], WARNING, f"duplicate of {label} {match[0]}", value, None))
+                    duplicates += 1
+                    break
+            else:
+                seen.add(row, keys)
+                new.append(reference)
+        if new:
+            ids.extend(backend.add_references(new))
+        if found:
+            reports.append(pd.DataFrame(found, columns=list(VIOLATION_COLUMNS)))
+        read += len(chunk)
+        if progress is not None:
+            progress(read, len(ids))
+    violations = (
+        pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=list(VIOLATION_COLUMNS))
+    )
+    return ImportResult(ids, skipped, violations, duplicates)
@@ -0,0 +1,345 @@
+"""Fixed- and random-effects meta-analysis of study effect sizes, stratified by quality.
+
+Studies carry an effect size and its variance per outcome (see
+``StudyStore.outcomes``), on an additive scale such as log odds ratios or
+standardized mean differences.  Every analysis here is a row of study
+weights: a subgroup weighs its own studies 1 and the others 0, a
+leave-one-out analysis zeroes one study and a bootstrap replicate counts how
+often each study was drawn.  ``pool`` pools a whole (analyses, studies)
+weight matrix at once:
+
+- ``fixed``: inverse-variance weights
+- ``DL``: DerSimonian-Laird between-study variance from Cochran's Q
+- ``REML``: restricted maximum-likelihood between-study variance, iterated
+  from the DerSimonian-Laird estimate for every analysis together
+
+Bootstrap replicates are drawn in chunks that can run on a process pool,
+with chunk seeds that do not depend on the number of workers.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import QUALITY_LABELS
+from .store import STUDY_TYPES
+
+METHODS = ("REML", "DL", "fixed")
+# Columns of ``src.store.StudyStore`` that subgroups can be formed on, with their labels
+STRATA = {"quality_rating": ("Quality", QUALITY_LABELS), "study_type": ("Study type", STUDY_TYPES)}
+REML_ITERATIONS = 100
+REML_TOLERANCE = 1e-10
+# Analyses times studies pooled per block: small enough for the temporaries to be
+# reused between blocks, large enough for NumPy to amortise its overhead
+POOL_BLOCK = 2 ** 19
+# Bootstrap replicates per task, and per seed, of the process pool
+BOOTSTRAP_CHUNK = 250
+# Leave-one-out analyses pooled per matrix, bounding memory at this many rows times the studies
+LEAVE_ONE_OUT_CHUNK = 256
+# Quality-exclusion analyses: the worst quality code each one keeps
+QUALITY_SUBSETS = (("All studies", 2), ("Without Poor Quality", 1), ("Good Quality only", 0))
+
+
+class EffectData(NamedTuple):
+    outcomes: tuple
+    names: np.ndarray
+    # (studies, outcomes), NaN where a study did not report the outcome
+    effect: np.ndarray
+    variance: np.ndarray
+    # Codes into ``QUALITY_LABELS`` and ``STUDY_TYPES``
+    quality_rating: np.ndarray
+    study_type: np.ndarray
+
+
+class Pooled(NamedTuple):
+    """Pooled estimates, one entry per row of the weight matrix"""
+    studies: np.ndarray
+    estimate: np.ndarray
+    se: np.ndarray
+    tau2: np.ndarray
+    q: np.ndarray
+    i2: np.ndarray
+
+
+def effect_data(store, outcomes=None):
+    """``EffectData`` of the studies in ``store`` for ``outcomes`` (default: every outcome)"""
+    with store.lock:
+        outcomes = store.outcomes if outcomes is None else tuple(outcomes)
+        for outcome in outcomes:
+            if outcome not in store.outcomes:
+                raise KeyError(outcome)
+        columns = [store.outcomes.index(outcome) for outcome in outcomes]
+        return EffectData(
+            outcomes,
+            store.column("study_name").copy(),
+            store.column("effect")[:, columns],
+            store.column("variance")[:, columns],
+            store.column("quality_rating").copy(),
+            store.column("study_type").copy(),
+        )
+
+
+def pool(effect, variance, weights, method="REML"):
+    """``Pooled`` estimates of every row of ``weights``.
+
+    ``effect`` and ``variance`` are per study, or per row and study; a study
+    with weight 0 or a NaN effect does not take part.  Weights above 1 count
+    a study several times, as a bootstrap replicate does.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown pooling method {method!r}; expected one of: {', '.join(METHODS)}")
+    arrays = np.asarray(effect, dtype=float), np.asarray(variance, dtype=float), np.atleast_2d(weights)
+    rows, studies = np.broadcast_shapes(*(array.shape for array in arrays))
+    block = max(1, POOL_BLOCK // max(studies, 1))
+    if rows <= block:
+        return _pool(*arrays, method)
+    parts = [
+        _pool(*(array[start:start + block] if len(array) == rows else array for array in arrays), method)
+        for start in range(0, rows, block)
+    ]
+    return Pooled(*(np.concatenate(values) for values in zip(*parts)))
+
+
+def _pool(effect, variance, weights, method):
+    reported = ~np.isnan(effect)
+    # Effects shared by every row stay one-dimensional and broadcast against the weights
+    weights = weights * reported
+    y = np.where(reported, effect, 0.0)
+    v = np.where(reported, variance, 1.0)
+    n = weights.sum(axis=1)
+    studies = (weights > 0).sum(axis=1)
+    df = np.maximum(n - 1, 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Fixed effect and Cochran's Q
+        w = weights / v
+        s1 = w.sum(axis=1)
+        fixed = (w * y).sum(axis=1) / s1
+        q = (w * (y - fixed[:, None]) ** 2).sum(axis=1)
+        i2 = np.where(q > 0, np.maximum((q - df) / q, 0) * 100, 0.0)
+        tau2 = np.zeros(len(n))
+        if method != "fixed":
+            s2 = (weights / v ** 2).sum(axis=1)
+            tau2 = np.where(df > 0, np.maximum((q - df) / (s1 - s2 / s1), 0), 0.0)
+        if method == "REML":
+            tau2 = _reml(y, v, weights, tau2, df > 0)
+        w = weights / (v + tau2[:, None])
+        total = w.sum(axis=1)
+        estimate = (w * y).sum(axis=1) / total
+        se = np.sqrt(1 / total)
+    empty = n == 0
+    estimate[empty] = se[empty] = q[empty] = i2[empty] = tau2[empty] = np.nan
+    return Pooled(studies, estimate, se, tau2, q, i2)
+
+
+def _reml(y, v, weights, tau2, active):
+    """REML between-study variance by fixed-point iteration, starting from ``tau2``.
+
+    The update needs weighted sums of 1, y and (y - mu)^2 - v, which expand
+    into sums of 1, y and y^2 - v; with effects shared by every row these
+    are matrix products over the studies.
+    """
+    tau2 = np.where(active, tau2, 0.0)
+    rows = np.flatnonzero(active)
+    shared = y.ndim == 1
+    # Centring keeps the expanded squares small
+    y = y - y.mean()
+    moments = np.stack([np.ones_like(y), y, y * y - v], axis=-1)
+    # Rows still iterating, copied again only when some of them converge
+    v_rows, moments_rows = (v, moments) if shared else (v[rows], moments[rows])
+    weights_rows = weights[rows]
+    for _ in range(REML_ITERATIONS):
+        if not len(rows):
+            break
+        total_variance = v_rows + tau2[rows, None]
+        w = weights_rows / total_variance
+        # Squared weights, with a study drawn c times counting c times
+        w2 = w / total_variance
+        if shared:
+            s1, wy = (w @ moments[:, :2]).T
+            s2, w2y, w2r = (w2 @ moments).T
+        else:
+            s1, wy = np.einsum("ij,ijm->mi", w, moments_rows[..., :2])
+            s2, w2y, w2r = np.einsum("ij,ijm->mi", w2, moments_rows)
+        mu = wy / s1
+        update = np.maximum((w2r - 2 * mu * w2y + mu * mu * s2) / s2 + 1 / s1, 0)
+        moving = np.abs(update - tau2[rows]) > REML_TOLERANCE * (1 + tau2[rows])
+        tau2[rows] = update
+        if not moving.all():
+            rows = rows[moving]
+            weights_rows = weights_rows[moving]
+            if not shared:
+                v_rows, moments_rows = v_rows[moving], moments_rows[moving]
+    return tau2
+
+
+def _chi2_sf(x, df):
+    """Upper tail probability of a chi-squared statistic with a whole number of degrees of freedom"""
+    if not df or x != x:
+        return math.nan
+    half = x / 2
+    if df % 2 == 0:
+        term = total = math.exp(-half)
+        for j in range(1, df // 2):
+            term *= half / j
+            total += term
+        return min(total, 1.0)
+    total = math.erfc(math.sqrt(half))
+    term = math.sqrt(2 * x / math.pi) * math.exp(-half)
+    for j in range(1, (df + 1) // 2):
+        total += term
+        term *= x / (2 * j + 1)
+    return min(total, 1.0)
+
+
+def _table(pooled, index, confidence):
+    """Pooled estimates as a table with confidence intervals and p-values"""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = [math.erfc(abs(value) / math.sqrt(2)) for value in (pooled.estimate / pooled.se).tolist()]
+    return pd.DataFrame({
+        "Studies": pooled.studies,
+        "Estimate": pooled.estimate,
+        "SE": pooled.se,
+        "CI Low": pooled.estimate - z * pooled.se,
+        "CI High": pooled.estimate + z * pooled.se,
+        "p": p,
+        "Tau²": pooled.tau2,
+        "I² %": pooled.i2,
+        "Q": pooled.q,
+        "Q p": [_chi2_sf(q, max(int(k) - 1, 0)) for q, k in zip(pooled.q.tolist(), pooled.studies.tolist())],
+    }, index=index)
+
+
+def _design(data, by):
+    """``(weights, columns, labels)`` of the analyses behind ``stratified``.
+
+    ``weights`` is (analyses, studies), ``columns`` the outcome of each
+    analysis and ``labels`` its ``(outcome, by, subgroup)``.
+
+    Each outcome gets an analysis of all its studies and one per subgroup of
+    each of ``by`` that has studies.
+    """
+    weights, outcome_columns, labels = [], [], []
+    for j, outcome in enumerate(data.outcomes):
+        reported = ~np.isnan(data.effect[:, j])
+        groups = [("All", "All studies", reported)]
+        for column in by:
+            name, levels = STRATA[column]
+            codes = getattr(data, column)
+            groups += [(name, level, reported & (codes == code)) for code, level in enumerate(levels)]
+        for name, level, members in groups:
+            if members.any():
+                weights.append(members)
+                outcome_columns.append(j)
+                labels.append((outcome, name, level))
+    return np.asarray(weights, dtype=float).reshape(-1, len(data.names)), np.asarray(outcome_columns, dtype=np.intp), labels
+
+
+def stratified(data, by=tuple(STRATA), method="REML", confidence=0.95, bootstrap=0, seed=0, workers=1):
+    """Pooled estimate of every outcome over all studies and within each subgroup of ``by``.
+
+    ``by`` names ``STRATA`` columns.  Returns one row per outcome and
+    subgroup with at least one study, indexed by ``(Outcome, By,
+    Subgroup)``; subgroups of one column are followed by a test for
+    differences between them (``Q between``).  With ``bootstrap``
+    replicates, percentile intervals from resampling the studies of each
+    subgroup are added as ``Boot Low`` and ``Boot High``; ``workers`` above
+    1 draws them on a process pool.
+    """
+    weights, columns, labels = _design(data, by)
+    effect, variance = data.effect.T[columns], data.variance.T[columns]
+    pooled = pool(effect, variance, weights, method)
+    table = _table(pooled, pd.MultiIndex.from_tuples(labels, names=["Outcome", "By", "Subgroup"]), confidence)
+    table["Q between"] = np.nan
+    table["Q between p"] = np.nan
+    # Between-subgroup heterogeneity: Q of the subgroup estimates around their fixed-effect mean
+    for (outcome, name), rows in table.groupby(level=["Outcome", "By"], sort=False).indices.items():
+        if name == "All" or len(rows) < 2:
+            continue
+        w = 1 / pooled.se[rows] ** 2
+        mean = (w * pooled.estimate[rows]).sum() / w.sum()
+        between = float((w * (pooled.estimate[rows] - mean) ** 2).sum())
+        table.iloc[rows[0], table.columns.get_loc("Q between")] = between
+        table.iloc[rows[0], table.columns.get_loc("Q between p")] = _chi2_sf(between, len(rows) - 1)
+    if bootstrap:
+        samples = _bootstrap(effect, variance, weights, method, bootstrap, seed, workers)
+        alpha = 1 - confidence
+        table["Boot Low"] = np.nanpercentile(samples, 100 * alpha / 2, axis=1)
+        table["Boot High"] = np.nanpercentile(samples, 100 * (1 - alpha / 2), axis=1)
+    return table
+
+
+def quality_exclusion(data, method="REML", confidence=0.95):
+    """Pooled estimate of every outcome as lower-quality studies are excluded, indexed by ``(Outcome, Studies)``"""
+    weights, columns, labels = [], [], []
+    for j, outcome in enumerate(data.outcomes):
+        reported = ~np.isnan(data.effect[:, j])
+        for label, worst in QUALITY_SUBSETS:
+            weights.append(reported & (data.quality_rating <= worst))
+            columns.append(j)
+            labels.append((outcome, label))
+    weights = np.asarray(weights, dtype=float).reshape(-1, len(data.names))
+    pooled = pool(data.effect.T[columns], data.variance.T[columns], weights, method)
+    return _table(pooled, pd.MultiIndex.from_tuples(labels, names=["Outcome", "Studies"]), confidence)
+
+
+def leave_one_out(data, outcome, method="REML", confidence=0.95):
+    """Pooled estimate of ``outcome`` with each of its studies left out, indexed by the omitted study.
+
+    ``Change`` is the difference from the estimate of all studies.  Each
+    analysis pools every other study, so the cost grows with the square of
+    the number of studies; analyses are pooled ``LEAVE_ONE_OUT_CHUNK`` at a
+    time.
+    """
+    j = data.outcomes.index(outcome)
+    members = np.flatnonzero(~np.isnan(data.effect[:, j]))
+    if not len(members):
+        raise ValueError(f"No study reports {outcome!r}")
+    effect, variance = data.effect[members, j], data.variance[members, j]
+    overall = pool(effect, variance, np.ones(len(members)), method).estimate[0]
+    parts = []
+    for start in range(0, len(members), LEAVE_ONE_OUT_CHUNK):
+        omitted = np.arange(start, min(start + LEAVE_ONE_OUT_CHUNK, len(members)))
+        weights = np.ones((len(omitted), len(members)))
+        weights[np.arange(len(omitted)), omitted] = 0
+        parts.append(pool(effect, variance, weights, method))
+    pooled = Pooled(*(np.concatenate(values) for values in zip(*parts)))
+    table = _table(pooled, pd.Index(data.names[members], name="Omitted study"), confidence)
+    table.insert(2, "Change", table["Estimate"] - overall)
+    return table
+
+
+def _replicates(effect, variance, members, method, seed, size):
+    """Pooled estimates of ``size`` bootstrap samples of one analysis's studies"""
+    rng = np.random.default_rng(seed)
+    k = len(members)
+    effect, variance = effect[members], variance[members]
+    block = max(1, POOL_BLOCK // k)
+    estimates = []
+    for start in range(0, size, block):
+        samples = min(block, size - start)
+        # How often each study was drawn: one bincount over every sample, offset by sample
+        draws = rng.integers(0, k, size=(samples, k)) + np.arange(samples)[:, None] * k
+        counts = np.bincount(draws.ravel(), minlength=samples * k).reshape(samples, k)
+        estimates.append(pool(effect, variance, counts, method).estimate)
+    return np.concatenate(estimates)
+
+
+def _bootstrap(effect, variance, weights, method, replicates, seed, workers):
+    """(analyses, replicates) bootstrap estimates; each analysis resamples its own studies"""
+    sizes = [min(BOOTSTRAP_CHUNK, replicates - start) for start in range(0, replicates, BOOTSTRAP_CHUNK)]
+    tasks = []
+    for row, row_seed in enumerate(np.random.SeedSequence(seed).spawn(len(weights))):
+        members = np.flatnonzero(weights[row])
+        for chunk_seed, size in zip(row_seed.spawn(len(sizes)), sizes):
+            tasks.append((effect[row], variance[row], members, method, chunk_seed, size))
+    if workers <= 1:
+        chunks = [_replicates(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_replicates, *zip(*tasks)))
+    return np.concatenate(chunks).reshape(len(weights), replicates)
@@ -0,0 +1,170 @@
+"""Timing spans and gauges for finding slow reruns.
+
+Recording is switched on by the ``NOS_METRICS`` environment variable: ``1``
+keeps the numbers in memory and logs each span as JSON on the
+``src.metrics`` logger, and any other value is taken as the path of a JSON
+Lines metrics file that every span and gauge is appended to.  The app shows
+the collected numbers in a sidebar diagnostics panel.
+
+While recording is off, ``span`` returns a shared no-op context manager and
+functions wrapped by ``timed`` call straight through, so the instrumentation
+can stay in place in production.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+RECENT_SPANS = 200
+
+logger = logging.getLogger(__name__)
+
+_NO_SPAN = nullcontext()
+_local = threading.local()
+
+
+class Recorder:
+    """Per-name span statistics, the latest gauges and a window of recent spans"""
+
+    def __init__(self, path=None, recent=RECENT_SPANS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1) if path else None
+        self._recent_size = recent
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.gauges = {}
+            self._recent = deque(maxlen=self._recent_size)
+
+    def _emit(self, event):
+        if self._file is not None:
+            self._file.write(json.dumps(event, default=str) + "\n")
+        else:
+            logger.info(json.dumps(event, default=str))
+
+    def record(self, name, seconds, parent=None, **fields):
+        event = {"time": time.time(), "span": name, "seconds": seconds, "parent": parent, **fields}
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] = seconds
+            self._recent.append(event)
+            self._emit(event)
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+            self._emit({"time": time.time(), "gauge": name, "value": value})
+
+    def stats(self):
+        """One dict per span name with call count and total, mean, max and last milliseconds"""
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: -item[1][1])
+        return [
+            {
+                "span": name, "calls": count, "total_ms": total * 1000,
+                "mean_ms": total / count * 1000, "max_ms": top * 1000, "last_ms": last * 1000,
+            }
+            for name, (count, total, top, last) in items
+        ]
+
+    def recent(self, n=20):
+        """The last ``n`` spans, newest first"""
+        with self._lock:
+            return list(self._recent)[::-1][:n]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "fields", "parent", "started")
+
+    def __init__(self, recorder, name, fields):
+        self.recorder = recorder
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        _local.stack.pop()
+        self.recorder.record(self.name, seconds, self.parent, **self.fields)
+        return False
+
+
+def _from_environment():
+    setting = os.environ.get("NOS_METRICS", "").strip()
+    if setting in ("", "0"):
+        return None
+    return Recorder(None if setting == "1" else setting)
+
+
+_recorder = _from_environment()
+
+
+def enable(path=None):
+    """Start recording, optionally appending to a JSON Lines file"""
+    global _recorder
+    disable()
+    _recorder = Recorder(path)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = None
+
+
+def recorder():
+    """The active ``Recorder``, or None while recording is off"""
+    return _recorder
+
+
+def span(name, **fields):
+    """Context manager timing the enclosed block as ``name``"""
+    if _recorder is None:
+        return _NO_SPAN
+    return _Span(_recorder, name, fields)
+
+
+def timed(name):
+    """Decorator timing every call of a function as ``name``"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _Span(_recorder, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def gauge(name, value):
+    """Record the latest value of a size or count"""
+    if _recorder is not None:
+        _recorder.gauge(name, value)
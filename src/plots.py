@@ -0,0 +1,308 @@
+"""robvis-style risk of bias plots built from stored domain scores.
+
+Each applicable domain of a study is judged from its stars: all of the
+domain's stars is "Low risk", some is "Some concerns" and none is "High
+risk".  The overall judgement follows the quality rating (Good, Fair, Poor).
+
+Figures are drawn on bare ``matplotlib.figure.Figure`` objects with the Agg
+canvas, so rendering needs neither a display nor pyplot's global state.
+Rendered files are kept in the shared artifact cache under the review's
+content hash, and traffic-light plots of large reviews are split into pages
+of ``ROWS_PER_PAGE`` studies so each rerun renders at most one page.
+"""
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from .cache import ARTIFACTS
+from .metrics import span
+from .scoring import MISSING, QUALITY_COLORS
+
+JUDGEMENTS = ("Low risk", "Some concerns", "High risk")
+JUDGEMENT_COLORS = ("#02C100", "#E2DF07", "#BF0000")
+JUDGEMENT_SYMBOLS = ("+", "−", "×")
+NOT_APPLICABLE_COLOR = "#D9D9D9"
+PLOT_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DPI = 300
+ROWS_PER_PAGE = 40
+MAX_LABEL = 40
+
+
+def _figure(width, height):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width, height), layout="constrained")
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _label(name):
+    name = str(name)
+    return name if len(name) <= MAX_LABEL else name[:MAX_LABEL - 1] + "…"
+
+
+def judgement_grid(store, rows=slice(None)):
+    """Judgement codes per study for each applicable domain, with the overall judgement last.
+
+    Codes index ``JUDGEMENTS``; MISSING (-1) marks a domain that does not
+    apply to the study's type.  Returns ``(grid, column_labels)``.
+    """
+    all_stars = store.column("domain_stars")
+    applies = (all_stars != MISSING).any(axis=0)
+    stars = all_stars[rows][:, applies]
+    top = store.domain_max[store.column("study_type")[rows]][:, applies]
+    grid = np.where(stars == top, 0, np.where(stars > 0, 1, 2)).astype(np.int8)
+    grid[stars == MISSING] = MISSING
+    # Quality codes (Good, Fair, Poor) line up with the judgements
+    grid = np.column_stack([grid, store.column("quality_rating")[rows]])
+    return grid, [name for name, used in zip(store.domains, applies) if used] + ["Overall"]
+
+
+def _legend(figure, domains):
+    from matplotlib.lines import Line2D
+
+    handles = [
+        Line2D([], [], marker="o", linestyle="", markersize=9, color=color, label=label)
+        for label, color in zip(JUDGEMENTS, JUDGEMENT_COLORS)
+    ]
+    key = "   ".join(f"D{i + 1}: {name}" for i, name in enumerate(domains))
+    figure.legend(
+        handles=handles, loc="outside lower center", ncols=len(handles), frameon=False,
+        fontsize=8, title=key or None, title_fontsize=8,
+    )
+
+
+def traffic_light_figure(store, rows=slice(None)):
+    """Study-by-domain grid of judgement dots"""
+    grid, labels = judgement_grid(store, rows)
+    names = [_label(name) for name in store.column("study_name")[rows]]
+    n, m = grid.shape
+    figure = _figure(3.0 + 0.6 * m, 1.4 + 0.3 * max(n, 1))
+    ax = figure.add_subplot()
+
+    y, x = np.indices(grid.shape)
+    # Index MISSING (-1) picks the trailing not-applicable colour
+    colors = np.asarray(JUDGEMENT_COLORS + (NOT_APPLICABLE_COLOR,))[grid]
+    ax.scatter(x.ravel(), y.ravel(), s=220, c=colors.ravel(), edgecolors="white", linewidths=0.5)
+    for code, symbol in enumerate(JUDGEMENT_SYMBOLS):
+        cells = grid == code
+        if cells.any():
+            ax.scatter(x[cells], y[cells], s=50, c="black", marker=f"${symbol}$", linewidths=0)
+
+    ax.set_xticks(range(m), [f"D{j + 1}" for j in range(m - 1)] + ["Overall"])
+    ax.xaxis.tick_top()
+    ax.set_yticks(range(n), names, fontsize=8)
+    ax.set_xlim(-0.5, m - 0.5)
+    ax.set_ylim(max(n, 1) - 0.5, -0.5)
+    ax.tick_params(length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    _legend(figure, labels[:-1])
+    return figure
+
+
+def summary_shares(grid, weights=None):
+    """Weighted percentage of studies in each judgement, one row per grid column"""
+    weights = np.ones(len(grid)) if weights is None else np.asarray(weights, dtype=float)
+    counts = ((grid[:, :, None] == np.arange(len(JUDGEMENTS))) * weights[:, None, None]).sum(axis=0)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts * 100, totals, out=np.zeros(counts.shape), where=totals > 0)
+
+
+def inverse_variance_weights(store, outcome):
+    """Per-study weights of ``outcome`` for ``summary_plot``: 1 / variance, 0 where it was not reported"""
+    variance = store.column("variance")[:, store.outcomes.index(outcome)]
+    return np.divide(1.0, variance, out=np.zeros(len(variance)), where=~np.isnan(variance))
+
+
+def summary_figure(store, weights=None):
+    """Stacked bars of the share of studies in each judgement per domain"""
+    grid, labels = judgement_grid(store)
+    shares = summary_shares(grid, weights)
+    figure = _figure(7.0, 1.2 + 0.45 * len(labels))
+    ax = figure.add_subplot()
+    left = np.zeros(len(labels))
+    for k, (label, color) in enumerate(zip(JUDGEMENTS, JUDGEMENT_COLORS)):
+        ax.barh(labels, shares[:, k], left=left, color=color, edgecolor="white", label=label)
+        left += shares[:, k]
+    ax.invert_yaxis()
+    ax.set_xlim(0, 100)
+    ax.set_xlabel("Weighted studies (%)" if weights is not None else "Studies (%)")
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+    ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.25), ncols=len(JUDGEMENTS), frameon=False, fontsize=8)
+    return figure
+
+
+def _bars(ax, series, title, color):
+    ax.bar([str(label) for label in series.index], series.to_numpy(), color=color)
+    ax.set_title(title, fontsize=10)
+    ax.tick_params(axis="x", labelsize=8)
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+
+
+def distribution_figure(store):
+    """Quality, total-star and study type distributions side by side"""
+    aggregates = store.aggregates
+    figure = _figure(11.0, 3.4)
+    quality_ax, star_ax, type_ax = figure.subplots(1, 3)
+    _bars(quality_ax, aggregates.quality_distribution(), "Quality", QUALITY_COLORS)
+    _bars(star_ax, aggregates.star_distribution(), "Total stars", "#1f77b4")
+    _bars(type_ax, aggregates.type_distribution(), "Study type", "#6c757d")
+    quality_ax.set_ylabel("Studies")
+    return figure
+
+
+def domain_figure(store):
+    """Mean domain percentage across the studies each domain applies to"""
+    means = store.aggregates.domain_means().sort_values(ascending=False)
+    figure = _figure(7.0, 1.2 + 0.45 * max(len(means), 1))
+    ax = figure.add_subplot()
+    ax.barh(list(means.index), means.to_numpy(), color="#1f77b4")
+    ax.invert_yaxis()
+    ax.set_xlim(0, 100)
+    ax.set_xlabel("Mean domain score (%)")
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+    return figure
+
+
+def sensitivity_figure(table):
+    """Stacked bars of the share of studies rated Good, Fair and Poor under each rule.
+
+    ``table`` is a ``src.sensitivity.summary`` table, or some of its rows.
+    """
+    levels = ["Good", "Fair", "Poor"]
+    counts = table[levels].to_numpy(dtype=float)
+    totals = counts.sum(axis=1, keepdims=True)
+    shares = np.divide(counts * 100, totals, out=np.zeros(counts.shape), where=totals > 0)
+    labels = [_label(name) for name in table.index]
+    figure = _figure(7.0, 1.2 + 0.35 * len(labels))
+    ax = figure.add_subplot()
+    left = np.zeros(len(labels))
+    for k, (label, color) in enumerate(zip(levels, QUALITY_COLORS)):
+        ax.barh(labels, shares[:, k], left=left, color=color, edgecolor="white", label=label)
+        left += shares[:, k]
+    ax.invert_yaxis()
+    ax.set_xlim(0, 100)
+    ax.set_xlabel("Studies (%)")
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+    ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.25), ncols=len(levels), frameon=False, fontsize=8)
+    return figure
+
+
+def cutoff_figure(table):
+    """Heat maps of the Good share and the reclassified share over a grid of total-star cut-offs"""
+    grid = table.dropna(subset=["Good cut-off", "Fair cut-off"])
+    figure = _figure(10.0, 4.2)
+    for ax, column, cmap in zip(figure.subplots(1, 2), ("Good %", "Reclassified %"), ("Greens", "Reds")):
+        values = grid.pivot_table(index="Good cut-off", columns="Fair cut-off", values=column)
+        image = ax.imshow(values.to_numpy(), cmap=cmap, vmin=0, vmax=100, origin="lower", aspect="auto")
+        ax.set_xticks(range(len(values.columns)), [f"{v:.0f}" for v in values.columns], fontsize=8)
+        ax.set_yticks(range(len(values.index)), [f"{v:.0f}" for v in values.index], fontsize=8)
+        ax.set_xlabel("Fair cut-off (stars)")
+        ax.set_ylabel("Good cut-off (stars)")
+        ax.set_title(f"{column} of studies", fontsize=10)
+        figure.colorbar(image, ax=ax, shrink=0.8)
+    return figure
+
+
+def forest_figure(table):
+    """Forest plot of pooled estimates with their confidence intervals, one row per subgroup.
+
+    ``table`` is a ``src.meta.stratified`` or ``quality_exclusion`` table for
+    one outcome; the first row, all studies, is drawn as the overall estimate.
+    """
+    labels = [" / ".join(map(str, name)) if isinstance(name, tuple) else str(name) for name in table.index]
+    labels = [f"{label} (k={studies})" for label, studies in zip(labels, table["Studies"])]
+    estimate = table["Estimate"].to_numpy(dtype=float)
+    low, high = table["CI Low"].to_numpy(dtype=float), table["CI High"].to_numpy(dtype=float)
+    rows = np.arange(len(labels))
+    figure = _figure(7.0, 1.0 + 0.35 * len(labels))
+    ax = figure.add_subplot()
+    ax.errorbar(
+        estimate[1:], rows[1:], xerr=[estimate[1:] - low[1:], high[1:] - estimate[1:]],
+        fmt="s", color="#2c3e50", ecolor="#7f8c8d", capsize=3, markersize=5,
+    )
+    ax.fill(
+        [low[0], estimate[0], high[0], estimate[0]], [0, 0.25, 0, -0.25], color=QUALITY_COLORS[0],
+    )
+    ax.axvline(0, color="#95a5a6", linewidth=0.8, linestyle="--")
+    ax.axvline(estimate[0], color=QUALITY_COLORS[0], linewidth=0.8, linestyle=":")
+    ax.set_yticks(rows, [_label(label) for label in labels], fontsize=8)
+    ax.set_ylim(len(labels) - 0.5, -0.5)
+    ax.set_xlabel("Pooled effect size")
+    for spine in ("top", "right"):
+        ax.spines[spine].set_visible(False)
+    return figure
+
+
+def review_figures(store, rows_per_page=ROWS_PER_PAGE):
+    """``(name, build)`` pairs for every figure of a review's report"""
+    figures = [
+        ("summary", lambda: summary_figure(store)),
+        ("distribution", lambda: distribution_figure(store)),
+        ("domains", lambda: domain_figure(store)),
+    ]
+    pages = traffic_light_pages(store, rows_per_page)
+    for page in range(pages):
+        rows = slice(page * rows_per_page, (page + 1) * rows_per_page)
+        name = "traffic_light" if pages == 1 else f"traffic_light_p{page + 1}"
+        figures.append((name, lambda rows=rows: traffic_light_figure(store, rows)))
+    return figures
+
+
+def render(figure, fmt="png", dpi=DPI):
+    """Figure as PNG or SVG bytes"""
+    if fmt not in PLOT_FORMATS:
+        raise ValueError(f"Unsupported plot format {fmt!r}")
+    buffer = io.BytesIO()
+    with span("plots/render", fmt=fmt, dpi=dpi):
+        figure.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def _render_locked(store, build, fmt, dpi):
+    # Only drawing reads the store; saving the figure can run while others write
+    with store.lock:
+        figure = build()
+    return render(figure, fmt, dpi)
+
+
+def traffic_light_pages(store, rows_per_page=ROWS_PER_PAGE):
+    """Number of traffic-light pages for the review"""
+    return max(1, -(-len(store) // rows_per_page))
+
+
+def traffic_light(store, page=0, fmt="png", rows_per_page=ROWS_PER_PAGE, dpi=DPI):
+    """Rendered traffic-light plot for one page of studies"""
+    rows = slice(page * rows_per_page, (page + 1) * rows_per_page)
+    key = ("plots", store.content_hash(), "traffic_light", page, rows_per_page, fmt, dpi)
+    return ARTIFACTS.get(key, lambda: _render_locked(store, lambda: traffic_light_figure(store, rows), fmt, dpi))
+
+
+def summary_plot(store, fmt="png", weights=None, dpi=DPI):
+    """Rendered summary plot, optionally weighted per study"""
+    weight_key = None if weights is None else hashlib.sha1(np.asarray(weights, dtype=float).tobytes()).hexdigest()
+    key = ("plots", store.content_hash(), "summary", weight_key, fmt, dpi)
+    return ARTIFACTS.get(key, lambda: _render_locked(store, lambda: summary_figure(store, weights), fmt, dpi))
+
+
+def sensitivity_plot(store, table, kind="rules", fmt="png", dpi=DPI):
+    """Rendered ``sensitivity_figure`` (``kind="rules"``) or ``cutoff_figure`` (``kind="cutoffs"``) of a summary"""
+    build = {"rules": sensitivity_figure, "cutoffs": cutoff_figure}[kind]
+    table_key = hashlib.sha1(pd.util.hash_pandas_object(table).to_numpy().tobytes()).hexdigest()
+    key = ("plots", store.content_hash(), "sensitivity", kind, table_key, fmt, dpi)
+    return ARTIFACTS.get(key, lambda: render(build(table), fmt, dpi))
+
+
+def forest_plot(store, table, fmt="png", dpi=DPI):
+    """Rendered ``forest_figure`` of a meta-analysis table"""
+    table_key = hashlib.sha1(pd.util.hash_pandas_object(table).to_numpy().tobytes()).hexdigest()
+    key = ("plots", store.content_hash(), "forest", table_key, fmt, dpi)
+    return ARTIFACTS.get(key, lambda: render(forest_figure(table), fmt, dpi))
@@ -0,0 +1,345 @@
+"""Reference manager exports (RIS, BibTeX, EndNote XML) as study metadata.
+
+``read_references`` streams the records of a file as dicts with the study
+fields the assessment form asks for: ``study_name`` (the title), ``authors``
+as "Surname Initials" separated by commas, ``publication_year``, ``journal``
+and ``doi``.  RIS and BibTeX are read line by line and EndNote XML with
+``iterparse``, dropping each record once it is read, so memory stays bounded
+by one record however large the export is.
+
+Imported references wait in the review's queue of pending studies until
+someone assesses them (see ``src.importer.import_references``);
+``ReferenceQueue`` is that queue for in-memory reviews.
+"""
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from itertools import islice
+
+from .batch import _open_text, detect_format
+from .duplicates import DuplicateIndex, study_duplicate_keys
+
+REFERENCE_FORMATS = ("ris", "bib", "xml")
+REFERENCE_FIELDS = ("study_name", "authors", "publication_year", "journal", "doi")
+
+# RIS tags in order of preference; A2 and ED are editors, not authors
+RIS_FIELDS = {
+    "study_name": ("TI", "T1"),
+    "journal": ("JF", "JO", "T2", "JA", "J2"),
+    "publication_year": ("PY", "Y1", "DA"),
+    "doi": ("DO",),
+}
+RIS_AUTHORS = ("AU", "A1")
+BIBTEX_FIELDS = {
+    "study_name": ("title",),
+    "journal": ("journal", "journaltitle", "booktitle"),
+    "publication_year": ("year", "date"),
+    "doi": ("doi",),
+}
+# Entries that hold no reference; @string entries define macros for later values
+BIBTEX_SKIPPED = {"comment", "preamble", "string"}
+ENDNOTE_FIELDS = {
+    "study_name": ("titles/title",),
+    "journal": ("titles/secondary-title", "periodical/full-title", "alt-periodical/full-title", "periodical/abbr-1"),
+    "publication_year": ("dates/year", "dates/pub-dates/date"),
+    "doi": ("electronic-resource-num",),
+}
+
+_RIS_TAG = re.compile(r"^([A-Z][A-Z0-9])  ?- ?(.*)$")
+_YEAR = re.compile(r"\b(\d{4})\b")
+_DOI = re.compile(r"10\.\d{4,9}/\S+")
+_ET_AL = re.compile(r",?\s*\bet\s+al\b\.?$", re.IGNORECASE)
+_INITIALS = re.compile(r"^(?:[A-Z]\.?){1,3}$")
+_NAME_PARTS = re.compile(r"[\s.\-]+")
+_BIBTEX_START = re.compile(r"@\s*([A-Za-z]+)\s*([{(])")
+_BIBTEX_FIELD = re.compile(r"\s*,?\s*([\w\-:.]+)\s*=\s*")
+_BIBTEX_TOKEN = re.compile(r"[^,#}\s]+")
+_BRACES = re.compile(r"[{}]")
+_DELIMITERS = re.compile(r"[{}()]")
+_AND_OR_BRACE = re.compile(r"[{}]|\s+and\s+")
+# Accents such as \"o, {\"o}, \'{e} and \c{c}
+_LATEX_ACCENT = re.compile(r"\\([\"'`^~=.]|[cuvH](?=\s*\{))\s*\{?([A-Za-z])\}?")
+_LATEX_COMBINING = {
+    '"': "\u0308", "'": "\u0301", "`": "\u0300", "^": "\u0302", "~": "\u0303", "=": "\u0304",
+    ".": "\u0307", "c": "\u0327", "u": "\u0306", "v": "\u030c", "H": "\u030b",
+}
+_LATEX_ESCAPE = re.compile(r"\\([&%$#_])")
+_LATEX_COMMAND = re.compile(r"\\[A-Za-z]+\s*")
+
+
+def format_author(name):
+    """An author as "Surname Initials", from "Surname, Given", "Given Surname" or "Surname GI" """
+    name = _ET_AL.sub("", " ".join(name.split())).strip(" ,")
+    if not name:
+        return ""
+    if "," in name:
+        surname, given = (part.strip() for part in name.split(",", 1))
+    else:
+        parts = name.split(" ")
+        if len(parts) > 1 and _INITIALS.match(parts[-1]):
+            return name.replace(".", "")
+        surname, given = " ".join(parts[-1:]), " ".join(parts[:-1])
+    initials = "".join(word[0].upper() for word in _NAME_PARTS.split(given) if word)
+    return f"{surname} {initials}" if initials else surname
+
+
+def _reference(fields, authors):
+    """Reference dict from raw field values and formatted author names"""
+    year = _YEAR.search(fields.get("publication_year") or "")
+    doi = _DOI.search(fields.get("doi") or "")
+    return {
+        "study_name": " ".join((fields.get("study_name") or "").split()),
+        "authors": ", ".join(filter(None, authors)),
+        "publication_year": int(year.group(1)) if year else None,
+        "journal": " ".join((fields.get("journal") or "").split()),
+        "doi": doi.group(0).rstrip(".") if doi else "",
+    }
+
+
+def _first(values, tags):
+    """Value of the first of ``tags`` present in ``values``"""
+    for tag in tags:
+        if values.get(tag):
+            return values[tag]
+    return None
+
+
+def iter_ris(handle):
+    """Yield the references of a RIS file from a text stream"""
+    values, authors, tag = {}, [], None
+    for line in handle:
+        line = line.lstrip("\ufeff").rstrip("\r\n")
+        match = _RIS_TAG.match(line)
+        if match is None:
+            # Continuation of the previous field
+            if tag is not None and line.strip() and tag not in RIS_AUTHORS:
+                values[tag] = f"{values[tag]} {line.strip()}"
+            continue
+        tag, value = match.group(1), match.group(2).strip()
+        if tag == "ER":
+            fields = {field: _first(values, tags) for field, tags in RIS_FIELDS.items()}
+            yield _reference(fields, [format_author(author) for author in authors])
+            values, authors, tag = {}, [], None
+        elif tag in RIS_AUTHORS:
+            authors.append(value)
+        elif tag not in values:
+            values[tag] = value
+
+
+def _latex(text):
+    """Plain text of a BibTeX value: accents resolved, commands and braces dropped"""
+    if "\\" in text:
+        text = _LATEX_ACCENT.sub(lambda m: m.group(2) + _LATEX_COMBINING[m.group(1)], text)
+        text = _LATEX_COMMAND.sub("", _LATEX_ESCAPE.sub(r"\1", text))
+        text = unicodedata.normalize("NFC", text)
+    return " ".join(_BRACES.sub("", text).replace("~", " ").split())
+
+
+def _closing(text, start, opener):
+    """Index just past the delimiter closing the one at ``text[start]``, or -1 if it is not closed"""
+    braces = parens = 0
+    for match in (_BRACES if opener == "{" else _DELIMITERS).finditer(text, start):
+        char = match.group()
+        if char in "{}":
+            braces += 1 if char == "{" else -1
+        elif braces == 0:
+            parens += 1 if char == "(" else -1
+        if (braces if opener == "{" else parens) == 0:
+            return match.end()
+    return -1
+
+
+def _bibtex_value(body, pos, macros):
+    """``(value, end)`` of the field value starting at ``body[pos]``; parts joined by ``#`` are concatenated"""
+    parts = []
+    while pos < len(body):
+        char = body[pos]
+        if char == "{":
+            end = _closing(body, pos, "{")
+            end = len(body) if end < 0 else end
+            parts.append(body[pos + 1:end - 1])
+        elif char == '"':
+            # Braces may hide quotes: {"}
+            end = pos + 1
+            depth = 0
+            while end < len(body) and (body[end] != '"' or depth):
+                depth += {"{": 1, "}": -1}.get(body[end], 0)
+                end += 1
+            parts.append(body[pos + 1:end])
+            end += 1
+        else:
+            match = _BIBTEX_TOKEN.match(body, pos)
+            if match is None:
+                break
+            parts.append(macros.get(match.group().lower(), match.group()))
+            end = match.end()
+        pos = end
+        while pos < len(body) and body[pos].isspace():
+            pos += 1
+        if body[pos:pos + 1] != "#":
+            break
+        pos += 1
+        while pos < len(body) and body[pos].isspace():
+            pos += 1
+    return "".join(parts), pos
+
+
+def _bibtex_authors(value):
+    """Formatted names of a BibTeX author list, split on "and" outside braces"""
+    names, start, depth = [], 0, 0
+    for match in _AND_OR_BRACE.finditer(value):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+        elif depth == 0:
+            names.append(value[start:match.start()])
+            start = match.end()
+    names.append(value[start:])
+    authors = []
+    for name in map(str.strip, names):
+        if not name or name.lower() == "others":
+            continue
+        # {World Health Organization} is one name, not given names and a surname
+        braced = name.startswith("{") and name.endswith("}") and _closing(name, 0, "{") == len(name)
+        authors.append(_latex(name) if braced else format_author(_latex(name)))
+    return authors
+
+
+def _bibtex_fields(body, macros, pos=0):
+    """Raw ``{field: value}`` of the ``name = value`` pairs of an entry from ``body[pos]``"""
+    values = {}
+    while True:
+        match = _BIBTEX_FIELD.match(body, pos)
+        if match is None:
+            return values
+        value, pos = _bibtex_value(body, match.end(), macros)
+        values.setdefault(match.group(1).lower(), value)
+
+
+def _bibtex_reference(body, macros):
+    """Reference from the text of one entry between its delimiters"""
+    key_end = body.find(",")
+    values = _bibtex_fields(body, macros, key_end + 1 if key_end >= 0 else len(body))
+    fields = {field: _latex(_first(values, names) or "") for field, names in BIBTEX_FIELDS.items()}
+    return _reference(fields, _bibtex_authors(values.get("author", "")))
+
+
+def iter_bibtex(handle):
+    """Yield the references of a BibTeX file from a text stream.
+
+    Lines are collected from an entry's ``@type{`` to its closing brace, so
+    only the current entry is held in memory.
+    """
+    entry, opener, depth, macros = None, None, 0, {}
+    for line in handle:
+        while line:
+            if entry is None:
+                match = _BIBTEX_START.search(line)
+                if match is None:
+                    break
+                entry_type, opener = match.group(1).lower(), match.group(2)
+                entry, depth, line = [], 0, line[match.end() - 1:]
+            closer = "}" if opener == "{" else ")"
+            depth += line.count(opener) - line.count(closer)
+            if "\\" in line:
+                # Escaped delimiters do not nest
+                depth += line.count("\\" + closer) - line.count("\\" + opener)
+            if depth > 0:
+                entry.append(line)
+                break
+            # The entry ends on this line; anything after it may start the next one
+            text = "".join(entry) + line
+            end = _closing(text, 0, opener)
+            end = len(text) if end < 0 else end
+            if entry_type == "string":
+                macros.update(_bibtex_fields(text[1:end - 1], macros))
+            elif entry_type not in BIBTEX_SKIPPED:
+                yield _bibtex_reference(text[1:end - 1], macros)
+            line = text[end:]
+            entry = None
+
+
+def iter_endnote(source):
+    """Yield the references of an EndNote XML export from a path or binary file object"""
+    parents = []
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag != "record":
+            continue
+        fields = {}
+        for field, paths in ENDNOTE_FIELDS.items():
+            for path in paths:
+                found = element.find(path)
+                text = "".join(found.itertext()).strip() if found is not None else ""
+                if text:
+                    fields[field] = text
+                    break
+        authors = [format_author("".join(author.itertext())) for author in element.iterfind("contributors/authors/author")]
+        yield _reference(fields, authors)
+        # Records already read are dropped, so the tree never grows past one record
+        if parents:
+            parents[-1].remove(element)
+
+
+def read_references(source, fmt=None):
+    """Yield the references of a RIS, BibTeX or EndNote XML file one at a time.
+
+    ``source`` is a path or a file object (which then needs ``fmt`` or a
+    ``name``).  Text formats are read as UTF-8, with undecodable bytes
+    replaced rather than failing the whole import.
+    """
+    fmt = fmt or detect_format(getattr(source, "name", source), REFERENCE_FORMATS)
+    if fmt == "xml":
+        yield from iter_endnote(source)
+    elif fmt in ("ris", "bib"):
+        with _open_text(source, encoding="utf-8-sig", errors="replace") as handle:
+            yield from (iter_ris if fmt == "ris" else iter_bibtex)(handle)
+    else:
+        raise ValueError(f"Unsupported reference format {fmt!r}")
+
+
+class ReferenceQueue:
+    """Pending references of an in-memory review, by id in import order, with their duplicate keys"""
+
+    def __init__(self):
+        # Tuples of REFERENCE_FIELDS take far less memory than dicts for large imports
+        self._references = {}
+        self._index = DuplicateIndex()
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._references)
+
+    def add_many(self, references):
+        ids = []
+        for reference in references:
+            reference_id, self._next_id = self._next_id, self._next_id + 1
+            self._references[reference_id] = tuple(reference.get(field) for field in REFERENCE_FIELDS)
+            self._index.add(reference_id, study_duplicate_keys(reference))
+            ids.append(reference_id)
+        return ids
+
+    def get(self, reference_id):
+        return dict(zip(REFERENCE_FIELDS, self._references[reference_id]))
+
+    def page(self, offset=0, limit=None):
+        """``(reference_id, reference)`` pairs in import order"""
+        stop = None if limit is None else offset + limit
+        return [(reference_id, self.get(reference_id)) for reference_id in islice(self._references, offset, stop)]
+
+    def remove(self, reference_id):
+        reference = self.get(reference_id)
+        del self._references[reference_id]
+        self._index.remove(reference_id, study_duplicate_keys(reference))
+
+    def find(self, keys):
+        return self._index.find(keys)
+
+    def clear(self):
+        self._references.clear()
+        self._index.clear()
@@ -0,0 +1,222 @@
+"""Newcastle-Ottawa Scale scoring engine.
+
+Each study type's definition (see ``src.definitions``) is compiled once into
+integer option codes, a star lookup table, domain maxima and a quality
+threshold table, so a whole N x criteria matrix of answers is scored and
+rated in one NumPy pass.  The form, report, export and import paths all read
+the same compiled scale.
+"""
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from . import definitions
+from .criteria import NOS_CRITERIA
+
+QUALITY_LABELS = ("Good Quality", "Fair Quality", "Poor Quality")
+QUALITY_COLORS = ("#28a745", "#ffc107", "#dc3545")
+
+# Option code for a criterion that was not answered (or has an unknown key)
+MISSING = -1
+
+
+class ScoreResult(NamedTuple):
+    """Scores for a batch of assessments of one study type"""
+    total_stars: np.ndarray
+    domain_stars: np.ndarray
+    quality_codes: np.ndarray
+
+    def quality_labels(self):
+        return np.asarray(QUALITY_LABELS, dtype=object)[self.quality_codes]
+
+
+class CompiledScale:
+    """Array form of one study type's definition"""
+
+    def __init__(self, definition):
+        names, domain_index, option_keys, star_rows, criterion_max = [], [], [], [], []
+        for d, domain in enumerate(definition.domains):
+            for criterion in domain.criteria:
+                names.append(criterion.key)
+                domain_index.append(d)
+                option_keys.append(tuple(option.key for option in criterion.options))
+                star_rows.append([option.stars for option in criterion.options])
+                criterion_max.append(criterion.max_stars)
+
+        self.definition = definition
+        self.study_type = definition.name
+        self.domains = tuple(domain.name for domain in definition.domains)
+        self.criteria = tuple(names)
+        self.option_keys = tuple(option_keys)
+        self.option_codes = tuple({key: i for i, key in enumerate(keys)} for keys in option_keys)
+
+        # The extra trailing column is all zeros, so MISSING (-1) scores nothing
+        width = max(len(keys) for keys in option_keys) + 1
+        self.star_table = np.zeros((len(names), width), dtype=np.int16)
+        for i, stars in enumerate(star_rows):
+            self.star_table[i, :len(stars)] = stars
+
+        self.criterion_domain = np.asarray(domain_index, dtype=np.intp)
+        self.domain_matrix = np.zeros((len(names), len(self.domains)), dtype=np.int16)
+        self.domain_matrix[np.arange(len(names)), self.criterion_domain] = 1
+        self.domain_max = self.domain_matrix.T @ np.asarray(criterion_max, dtype=np.int16)
+        self.max_stars = int(self.domain_max.sum())
+
+        # Row 0 holds the Good minimums and row 1 the Fair ones: total stars, then stars per domain
+        quality = definition.quality
+        self.quality_table = np.zeros((2, 1 + len(self.domains)), dtype=np.int16)
+        self.quality_table[:, 0] = quality.good_total, quality.fair_total
+        for row, minimums in enumerate((quality.good_domains, quality.fair_domains)):
+            for name, stars in minimums:
+                self.quality_table[row, 1 + self.domains.index(name)] = stars
+        self.uses_domains = bool(quality.good_domains or quality.fair_domains)
+
+        arrays = (self.star_table, self.criterion_domain, self.domain_matrix, self.domain_max, self.quality_table)
+        for array in arrays:
+            array.flags.writeable = False
+
+    def encode(self, assessments):
+        """Encode an iterable of ``{criterion: option}`` dicts as an N x criteria code matrix"""
+        rows = [
+            [codes.get(assessment.get(name), MISSING) for name, codes in zip(self.criteria, self.option_codes)]
+            for assessment in assessments
+        ]
+        return np.asarray(rows, dtype=np.int8).reshape(len(rows), len(self.criteria))
+
+    def encode_columns(self, columns, n_rows=None):
+        """Encode a mapping of criterion name to an array of option keys (e.g. a DataFrame)"""
+        if n_rows is None:
+            n_rows = len(next(iter(columns.values()))) if len(columns) else 0
+        codes = np.full((n_rows, len(self.criteria)), MISSING, dtype=np.int8)
+        for j, (name, keys) in enumerate(zip(self.criteria, self.option_keys)):
+            if name in columns:
+                # Hash lookup; unknown keys and nulls become -1 (MISSING)
+                codes[:, j] = pd.Index(keys).get_indexer(columns[name])
+        return codes
+
+    def classify(self, total_stars, domain_stars=None):
+        """Map stars to quality codes (indexes into ``QUALITY_LABELS``).
+
+        ``domain_stars`` (N x domains) is required when the scale's quality
+        rule sets minimum stars per domain, as the AHRQ standards do.
+        """
+        total_stars = np.asarray(total_stars)
+        totals = total_stars.reshape(-1, 1)
+        if domain_stars is None:
+            if self.uses_domains:
+                raise ValueError(f"{self.study_type} rates quality from domain stars")
+            stars, table = totals, self.quality_table[:, :1]
+        else:
+            stars = np.hstack([totals, np.asarray(domain_stars).reshape(len(totals), -1)])
+            table = self.quality_table
+        met = (stars[:, None, :] >= table).all(axis=2)
+        return np.where(met[:, 0], 0, np.where(met[:, 1], 1, 2)).astype(np.int8).reshape(total_stars.shape)
+
+    def score(self, codes):
+        """Score and rate an N x criteria code matrix in one pass"""
+        codes = np.asarray(codes, dtype=np.intp).reshape(-1, len(self.criteria))
+        criterion_stars = self.star_table[np.arange(len(self.criteria)), codes]
+        domain_stars = criterion_stars @ self.domain_matrix
+        total_stars = domain_stars.sum(axis=1)
+        return ScoreResult(total_stars, domain_stars, self.classify(total_stars, domain_stars))
+
+
+_revision = 0
+_fingerprint = None
+
+
+@lru_cache(maxsize=None)
+def get_scale(study_type):
+    """Compiled scale for a study type, built once per process"""
+    return CompiledScale(definitions.SCALE_DEFINITIONS[study_type])
+
+
+def reload_scales():
+    """Read the scale definition files again and drop the compiled scales.
+
+    Changed criteria, stars and thresholds take effect; the set of study
+    types is fixed when the app starts, so a reload that adds, removes or
+    renames one raises ``ScaleDefinitionError`` and keeps the current scales.
+    Stored studies are rescored by their backend's ``refresh_scales``.
+    """
+    global _revision, _fingerprint
+    signature = definitions.files_signature()
+    loaded = definitions.load_definitions()
+    if set(loaded) != set(definitions.SCALE_DEFINITIONS):
+        raise definitions.ScaleDefinitionError("Adding, removing or renaming a study type needs a restart")
+    # Kept in the order the app started with, which an overriding file may change
+    loaded = {name: loaded[name] for name in definitions.SCALE_DEFINITIONS}
+    definitions.SCALE_FILES = signature
+    definitions.SCALE_DEFINITIONS.clear()
+    definitions.SCALE_DEFINITIONS.update(loaded)
+    NOS_CRITERIA.clear()
+    NOS_CRITERIA.update(definitions.criteria_mapping(loaded))
+    get_scale.cache_clear()
+    _fingerprint = None
+    _revision += 1
+
+
+def reload_changed_scales():
+    """``reload_scales`` if a definition file changed since the scales were read; True if it did.
+
+    Costs one ``stat`` per file, so the app runs it on every rerun.
+    """
+    if definitions.files_signature() == definitions.SCALE_FILES:
+        return False
+    reload_scales()
+    return True
+
+
+def scale_revision():
+    """Counter bumped by ``reload_scales``; lets caches of derived scores detect stale scales"""
+    return _revision
+
+
+def scale_fingerprint():
+    """``definitions.fingerprint`` of the current scales, for scores stored outside the process"""
+    global _fingerprint
+    if _fingerprint is None:
+        _fingerprint = definitions.fingerprint(definitions.SCALE_DEFINITIONS)
+    return _fingerprint
+
+
+def score_assessments(assessments, study_type):
+    """Score a list of assessment dicts of the same study type"""
+    scale = get_scale(study_type)
+    return scale.score(scale.encode(assessments))
+
+
+def rate_assessment(assessment, study_type):
+    """``(total_stars, quality_label, quality_color)`` for a single assessment"""
+    result = score_assessments([assessment], study_type)
+    code = int(result.quality_codes[0])
+    return int(result.total_stars[0]), QUALITY_LABELS[code], QUALITY_COLORS[code]
+
+
+def calculate_total_stars(assessment, study_type):
+    """Calculate total stars for an assessment"""
+    scale = get_scale(study_type)
+    return int(sum(
+        scale.star_table[i, codes.get(assessment.get(name), MISSING)]
+        for i, (name, codes) in enumerate(zip(scale.criteria, scale.option_codes))
+    ))
+
+
+def domain_scores(assessment, study_type):
+    """``{domain: (stars, max_stars, percentage)}`` for a single assessment"""
+    scale = get_scale(study_type)
+    stars = scale.score(scale.encode([assessment])).domain_stars[0]
+    return {
+        name: (int(got), int(top), got / top * 100 if top else 0.0)
+        for name, got, top in zip(scale.domains, stars, scale.domain_max)
+    }
+
+
+def get_quality_rating(total_stars, study_type, domain_stars=None):
+    """Determine quality rating based on total stars, and domain stars for scales with domain rules"""
+    code = int(get_scale(study_type).classify(
+        np.asarray([total_stars]), None if domain_stars is None else np.asarray([domain_stars])
+    )[0])
+    return QUALITY_LABELS[code], QUALITY_COLORS[code]
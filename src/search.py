@@ -0,0 +1,122 @@
+"""Full-text search over study names, authors, journals and notes.
+
+``SearchIndex`` is an inverted index from normalized words (see
+``src.duplicates.normalize_text``) to the studies containing them, with a
+sorted vocabulary for prefix lookups.  It is updated as studies are added and
+removed, so a search only touches the postings of the words it matches.
+
+Every query word must match a word of the study, either exactly or, for
+words of ``MIN_PREFIX`` or more characters, as a prefix.  Studies are ranked
+by the summed field weights of their matches, scaled by how rare each matched
+word is; a prefix match counts half as much as an exact one.
+"""
+import math
+from bisect import bisect_left, insort
+
+from .duplicates import normalize_text
+
+# Matches in the study name count three times as much as matches in the notes
+FIELD_WEIGHTS = {"study_name": 3.0, "authors": 2.0, "journal": 1.0, "notes": 1.0}
+SEARCH_FIELDS = tuple(FIELD_WEIGHTS)
+MIN_PREFIX = 2
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text):
+    """Normalized words of a text"""
+    return normalize_text(text).split()
+
+
+class SearchIndex:
+    """Inverted index of ``SEARCH_FIELDS`` by study id"""
+
+    def __init__(self):
+        # word -> {study_id: summed field weight}
+        self._postings = {}
+        self._vocabulary = []
+        # study_id -> words, so a study can be removed without its text
+        self._words = {}
+
+    def __len__(self):
+        return len(self._words)
+
+    def add(self, study_id, fields):
+        """Index one study; ``fields`` maps ``SEARCH_FIELDS`` names to text"""
+        self.add_many([(study_id, fields)])
+
+    def add_many(self, items):
+        """Index ``(study_id, fields)`` pairs; the vocabulary is sorted once for the batch"""
+        new_words = []
+        for study_id, fields in items:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for word in tokenize(fields.get(field)):
+                    weights[word] = weights.get(word, 0.0) + weight
+            for word, weight in weights.items():
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = {}
+                    new_words.append(word)
+                postings[study_id] = weight
+            self._words[study_id] = tuple(weights)
+        if len(new_words) > 16:
+            self._vocabulary.extend(new_words)
+            self._vocabulary.sort()
+        else:
+            for word in new_words:
+                insort(self._vocabulary, word)
+
+    def remove(self, study_id):
+        for word in self._words.pop(study_id, ()):
+            postings = self._postings[word]
+            del postings[study_id]
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+
+    def clear(self):
+        self._postings.clear()
+        self._vocabulary.clear()
+        self._words.clear()
+
+    def _matches(self, term):
+        """``(word, factor)`` for every indexed word matching a query term"""
+        if len(term) < MIN_PREFIX:
+            return [(term, 1.0)] if term in self._postings else []
+        vocabulary = self._vocabulary
+        matches = []
+        for i in range(bisect_left(vocabulary, term), len(vocabulary)):
+            word = vocabulary[i]
+            if not word.startswith(term):
+                break
+            matches.append((word, 1.0 if word == term else PREFIX_WEIGHT))
+        return matches
+
+    def search(self, query, limit=None):
+        """Ids of the studies matching every word of ``query``, best match first"""
+        terms = dict.fromkeys(tokenize(query))
+        if not terms:
+            return []
+        total = len(self._words)
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for word, factor in self._matches(term):
+                postings = self._postings[word]
+                weight = factor * math.log(1 + total / len(postings))
+                for study_id, field_weight in postings.items():
+                    score = field_weight * weight
+                    if score > term_scores.get(study_id, 0.0):
+                        term_scores[study_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    study_id: score + term_scores[study_id]
+                    for study_id, score in scores.items()
+                    if study_id in term_scores
+                }
+            if not scores:
+                return []
+        ranked = sorted(scores, key=lambda study_id: (-scores[study_id], study_id))
+        return ranked if limit is None else ranked[:limit]
@@ -0,0 +1,202 @@
+"""Sensitivity of a review's quality ratings to the Good/Fair/Poor rule.
+
+A ``SensitivityRule`` gives some study types a different ``QualityRule``
+(total and per-domain minimum stars, see ``src.definitions``); the other
+study types keep their scale's own rule.  ``cutoff_grid`` builds a grid of
+total-star cut-offs, ``shifted_rules`` moves every scale's own cut-offs up or
+down, and ``scale_rule`` rates studies with another scale's rule for the same
+criteria, such as the AHRQ standards.
+
+All rules are compiled into one table of minimums, rules x study types x
+(Good, Fair) x (total, domains...).  A rating only depends on a study's type
+and stars, so ``evaluate`` rates the review's distinct star profiles under
+every rule in one NumPy comparison and counts reclassifications per rule with
+the profiles' study counts as weights.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from . import definitions
+from .definitions import QualityRule
+from .metrics import timed
+from .scoring import QUALITY_LABELS, get_scale
+from .store import STUDY_TYPES
+
+LEVELS = tuple(label.split()[0] for label in QUALITY_LABELS)
+
+
+class SensitivityRule(NamedTuple):
+    name: str
+    # ((study_type, QualityRule), ...); study types not listed keep their own rule
+    rules: tuple
+    # (good, fair) total-star cut-offs of a ``cutoff_grid`` rule, for plotting the grid
+    cutoffs: tuple = ()
+
+
+class SensitivityResult(NamedTuple):
+    rules: tuple
+    # Quality codes per distinct (study type, stars) profile under the scale rules
+    baseline: np.ndarray
+    # (rules, profiles) quality codes under each rule
+    profile_codes: np.ndarray
+    # Profile of each study
+    inverse: np.ndarray
+    # (rules, level under the scale rules, level under the rule) study counts
+    reclassification: np.ndarray
+
+    def baseline_codes(self):
+        """Quality codes per study under the scale rules"""
+        return self.baseline[self.inverse]
+
+    def codes(self, rule):
+        """Quality codes per study under the rule at index ``rule``"""
+        return self.profile_codes[rule][self.inverse]
+
+    def changes(self):
+        """Number of rules under which each study's rating differs from the scale rules"""
+        return (self.profile_codes != self.baseline).sum(axis=0)[self.inverse]
+
+
+def _types(study_types):
+    return STUDY_TYPES if study_types is None else tuple(study_types)
+
+
+def cutoff_rule(good, fair, study_types=None):
+    """Total-star cut-offs for Good and Fair applied to ``study_types`` (default: all)"""
+    rule = QualityRule(good_total=good, fair_total=fair)
+    return SensitivityRule(
+        f"Good ≥ {good}, Fair ≥ {fair}", tuple((t, rule) for t in _types(study_types)), (good, fair),
+    )
+
+
+def cutoff_grid(good_cutoffs, fair_cutoffs, study_types=None):
+    """``cutoff_rule`` for every pair of cut-offs where Good needs at least as many stars as Fair"""
+    return [
+        cutoff_rule(good, fair, study_types)
+        for good in good_cutoffs
+        for fair in fair_cutoffs
+        if good >= fair
+    ]
+
+
+def shifted_rules(shifts, study_types=None):
+    """Every scale's own total cut-offs moved by each of ``shifts`` stars"""
+    rules = []
+    for shift in shifts:
+        pairs = []
+        for study_type in _types(study_types):
+            quality = get_scale(study_type).definition.quality
+            pairs.append((study_type, quality._replace(
+                good_total=max(quality.good_total + shift, 0), fair_total=max(quality.fair_total + shift, 0),
+            )))
+        rules.append(SensitivityRule(f"Own cut-offs {shift:+d}", tuple(pairs)))
+    return rules
+
+
+def scale_rule(name, scales):
+    """Each study type rated with the rule of the first of ``scales`` that has the same criteria"""
+    pairs = []
+    for study_type in STUDY_TYPES:
+        domains = definitions.SCALE_DEFINITIONS[study_type].domains
+        for scale in scales:
+            definition = definitions.SCALE_DEFINITIONS[scale]
+            if definition.domains == domains:
+                pairs.append((study_type, definition.quality))
+                break
+    return SensitivityRule(name, tuple(pairs))
+
+
+def baseline_rule():
+    """Every study type with its scale's own rule"""
+    return SensitivityRule("Scale rules", ())
+
+
+def rule_table(rules, domains):
+    """(rules, study types, 2, 1 + domains) minimum stars for Good and Fair.
+
+    ``domains`` are the store's domain columns; a domain that a study type
+    does not have keeps a minimum of 0.
+    """
+    table = np.zeros((len(rules), len(STUDY_TYPES), 2, 1 + len(domains)), dtype=np.int16)
+    for t, study_type in enumerate(STUDY_TYPES):
+        scale = get_scale(study_type)
+        columns = [1 + domains.index(name) for name in scale.domains]
+        table[:, t, :, 0] = scale.quality_table[:, 0]
+        table[:, t][..., columns] = scale.quality_table[:, 1:]
+    for r, rule in enumerate(rules):
+        for study_type, quality in rule.rules:
+            if study_type not in STUDY_TYPES:
+                raise ValueError(f"{rule.name}: unknown study type {study_type!r}")
+            t = STUDY_TYPES.index(study_type)
+            scale_domains = get_scale(study_type).domains
+            table[r, t] = 0
+            table[r, t, :, 0] = quality.good_total, quality.fair_total
+            for row, minimums in enumerate((quality.good_domains, quality.fair_domains)):
+                for name, stars in minimums:
+                    if name not in scale_domains:
+                        raise ValueError(f"{rule.name}: {study_type} has no domain {name!r}")
+                    table[r, t, row, 1 + domains.index(name)] = stars
+    return table
+
+
+def _classify(stars, table):
+    """Quality codes of (profiles, 1 + domains) stars against (..., profiles, 2, 1 + domains) minimums"""
+    met = (stars[:, None, :] >= table).all(axis=-1)
+    return np.where(met[..., 0], 0, np.where(met[..., 1], 1, 2)).astype(np.int8)
+
+
+@timed("sensitivity")
+def evaluate(store, rules):
+    """``SensitivityResult`` of the review in ``store`` under each of ``rules``"""
+    rules = tuple(rules)
+    with store.lock:
+        types = store.column("study_type").astype(np.int16)
+        totals = store.column("total_stars").astype(np.int16)
+        # Domains a type does not have are MISSING and only ever need 0 stars
+        domain_stars = np.maximum(store.column("domain_stars"), 0).astype(np.int16)
+        domains = store.domains
+    profiles, inverse, counts = np.unique(
+        np.column_stack([types, totals, domain_stars]),
+        axis=0, return_inverse=True, return_counts=True,
+    )
+    inverse = inverse.reshape(-1)
+    profile_types, stars = profiles[:, 0], profiles[:, 1:]
+
+    table = rule_table(rules, domains)
+    baseline = _classify(stars, rule_table([baseline_rule()], domains)[0, profile_types])
+    codes = _classify(stars, table[:, profile_types])
+
+    # One weighted bincount over (rule, baseline level, new level) cells
+    cells = (np.arange(len(rules))[:, None] * 9 + baseline * 3 + codes).ravel()
+    reclassification = np.bincount(
+        cells, weights=np.tile(counts, len(rules)), minlength=len(rules) * 9,
+    ).astype(np.int64).reshape(len(rules), 3, 3)
+    return SensitivityResult(rules, baseline, codes, inverse, reclassification)
+
+
+def summary(result):
+    """One row per rule: studies per level, and how many were reclassified up or down"""
+    counts = result.reclassification
+    levels = counts.sum(axis=1)
+    total = max(len(result.inverse), 1)
+    table = pd.DataFrame(levels, columns=list(LEVELS), index=pd.Index([rule.name for rule in result.rules], name="Rule"))
+    # Lower codes are better, so cells above the diagonal are downgrades
+    table["Upgraded"] = np.tril(counts, -1).sum(axis=(1, 2))
+    table["Downgraded"] = np.triu(counts, 1).sum(axis=(1, 2))
+    table["Reclassified"] = table["Upgraded"] + table["Downgraded"]
+    table["Good %"] = table["Good"] / total * 100
+    table["Reclassified %"] = table["Reclassified"] / total * 100
+    table["Good cut-off"] = [rule.cutoffs[0] if rule.cutoffs else np.nan for rule in result.rules]
+    table["Fair cut-off"] = [rule.cutoffs[1] if rule.cutoffs else np.nan for rule in result.rules]
+    return table
+
+
+def reclassification_table(result, rule):
+    """Studies by rating under the scale rules (rows) and under the rule at index ``rule`` (columns)"""
+    return pd.DataFrame(
+        result.reclassification[rule],
+        index=pd.Index(LEVELS, name="Scale rules"),
+        columns=pd.Index(LEVELS, name=result.rules[rule].name),
+    )
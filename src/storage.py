@@ -0,0 +1,537 @@
+"""Storage backends behind the app's save, delete and list operations.
+
+``MemoryBackend`` keeps a review in a ``StudyStore`` for the lifetime of the
+session.  ``SQLiteBackend`` persists it to a SQLite database in WAL mode with
+indexes on study type, quality rating, year and DOI; list pages are answered
+with indexed, paged SQL queries and the columnar store used by the report and
+export pages is only loaded when one of those pages asks for it.  Each row also
+stores its duplicate keys (see ``src.duplicates``) in indexed columns, so
+duplicate checks never load the store.  Text searches (see ``src.search``) are
+answered from the store's full-text index by both backends.
+
+References imported from a reference manager (see ``src.references``) wait
+in a queue of pending studies next to the review, with the same duplicate
+keys, until they are assessed.
+
+Stored total stars and quality ratings follow the scale definitions: the
+database records the fingerprint of the scales its rows were scored with,
+and rows are rescored when it is opened or ``refresh_scales`` is called
+after the definitions changed.
+
+Set ``NOS_DATABASE`` to a file path to make ``open_backend`` use SQLite.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .duplicates import duplicate_keys, study_duplicate_keys
+from .references import REFERENCE_FIELDS, ReferenceQueue
+from .scoring import QUALITY_LABELS, domain_scores, get_scale, scale_fingerprint
+from .store import STUDY_TYPES, TEXT_FIELDS, StudyStore
+
+SORT_FIELDS = (
+    "study_id", "study_name", "publication_year", "study_type",
+    "total_stars", "quality_rating", "assessment_date", "relevance",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    study_id INTEGER PRIMARY KEY,
+    study_name TEXT NOT NULL,
+    authors TEXT,
+    publication_year INTEGER,
+    journal TEXT,
+    doi TEXT,
+    study_type TEXT NOT NULL,
+    assessment TEXT NOT NULL,
+    total_stars INTEGER NOT NULL,
+    quality_rating TEXT NOT NULL,
+    notes TEXT,
+    assessment_date TEXT,
+    rater TEXT,
+    effects TEXT,
+    doi_key TEXT,
+    title_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_studies_type ON studies (study_type);
+CREATE INDEX IF NOT EXISTS idx_studies_quality ON studies (quality_rating);
+CREATE INDEX IF NOT EXISTS idx_studies_year ON studies (publication_year);
+CREATE INDEX IF NOT EXISTS idx_studies_doi ON studies (doi);
+CREATE TABLE IF NOT EXISTS pending_references (
+    reference_id INTEGER PRIMARY KEY,
+    study_name TEXT NOT NULL,
+    authors TEXT,
+    publication_year INTEGER,
+    journal TEXT,
+    doi TEXT,
+    doi_key TEXT,
+    title_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pending_doi_key ON pending_references (doi_key);
+CREATE INDEX IF NOT EXISTS idx_pending_title_key ON pending_references (title_key);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+# Created once the duplicate key columns exist, which older databases only have after migrating
+KEY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_studies_doi_key ON studies (doi_key);
+CREATE INDEX IF NOT EXISTS idx_studies_title_key ON studies (title_key);
+"""
+
+COLUMNS = (
+    "study_name", "authors", "publication_year", "journal", "doi", "study_type",
+    "assessment", "total_stars", "quality_rating", "notes", "assessment_date", "rater", "effects",
+)
+
+
+class StorageBackend:
+    """Interface shared by the storage backends.
+
+    Filters for ``query`` and ``count``: ``study_types`` and ``qualities`` are
+    collections of labels, ``years`` and ``stars`` inclusive ``(low, high)``
+    ranges and ``search`` a full-text query; ``None`` means no filter.  Sorting
+    by ``relevance`` ranks search matches best first, and falls back to
+    ``study_id`` without a search.
+    """
+
+    def save(self, study):
+        """Persist one study dict and return its id"""
+        return self.save_many([study])[0]
+
+    def save_many(self, studies):
+        raise NotImplementedError
+
+    def save_frame(self, frame):
+        """Persist studies from a table in the CSV export layout and return their ids"""
+        staged = StudyStore()
+        staged.extend_frame(frame)
+        return self.save_many(staged.to_records())
+
+    def update(self, study_id, study):
+        """Replace a stored study with a new version of it"""
+        raise NotImplementedError
+
+    def delete(self, study_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, **filters):
+        raise NotImplementedError
+
+    def query(self, order_by="study_id", descending=False, offset=0, limit=None, **filters):
+        """``(study_id, study)`` pairs for one page of matching studies"""
+        raise NotImplementedError
+
+    @property
+    def store(self):
+        """Columnar ``StudyStore`` holding the whole review"""
+        raise NotImplementedError
+
+    def domain_scores(self, study_id, study):
+        """``{domain: (stars, max_stars, percentage)}`` for one study"""
+        return domain_scores(study["assessment"], study["study_type"])
+
+    def find_duplicates(self, keys):
+        """Ids of stored studies sharing either of ``keys`` (see ``src.duplicates.duplicate_keys``)"""
+        return self.store.find_duplicates(keys)
+
+    def refresh_scales(self):
+        """Rescore stored studies if the scales were reloaded since they were scored; True if they were"""
+        raise NotImplementedError
+
+    def add_references(self, references):
+        """Queue reference dicts (see ``src.references``) as pending studies and return their ids"""
+        raise NotImplementedError
+
+    def reference_count(self):
+        raise NotImplementedError
+
+    def references(self, offset=0, limit=None):
+        """``(reference_id, reference)`` pairs for one page of pending studies, in import order"""
+        raise NotImplementedError
+
+    def remove_reference(self, reference_id):
+        raise NotImplementedError
+
+    def find_references(self, keys):
+        """Ids of pending references sharing either of ``keys``"""
+        raise NotImplementedError
+
+    def clear_references(self):
+        raise NotImplementedError
+
+
+class MemoryBackend(StorageBackend):
+    """Session-lifetime storage in a ``StudyStore``"""
+
+    def __init__(self, studies=()):
+        self._store = StudyStore(studies)
+        self._references = ReferenceQueue()
+
+    @property
+    def store(self):
+        return self._store
+
+    def save_many(self, studies):
+        return self._store.extend(studies)
+
+    def save_frame(self, frame):
+        return self._store.extend_frame(frame)
+
+    def update(self, study_id, study):
+        self._store.update(study_id, study)
+
+    def delete(self, study_id):
+        self._store.remove(study_id)
+
+    def clear(self):
+        self._store.clear()
+
+    def count(self, **filters):
+        return _store_count(self._store, **filters)
+
+    def query(self, order_by="study_id", descending=False, offset=0, limit=None, **filters):
+        return _store_query(self._store, order_by, descending, offset, limit, **filters)
+
+    def domain_scores(self, study_id, study):
+        return self._store.domain_scores(self._store.position(study_id))
+
+    def refresh_scales(self):
+        return self._store.refresh_scales()
+
+    def add_references(self, references):
+        return self._references.add_many(references)
+
+    def reference_count(self):
+        return len(self._references)
+
+    def references(self, offset=0, limit=None):
+        return self._references.page(offset, limit)
+
+    def remove_reference(self, reference_id):
+        self._references.remove(reference_id)
+
+    def find_references(self, keys):
+        return self._references.find(keys)
+
+    def clear_references(self):
+        self._references.clear()
+
+
+def _store_mask(store, study_types=None, qualities=None, years=None, stars=None, search=None):
+    mask = np.ones(len(store), dtype=bool)
+    if study_types is not None:
+        codes = [STUDY_TYPES.index(t) for t in study_types]
+        mask &= np.isin(store.column("study_type"), codes)
+    if qualities is not None:
+        codes = [QUALITY_LABELS.index(q) for q in qualities]
+        mask &= np.isin(store.column("quality_rating"), codes)
+    for name, bounds in (("publication_year", years), ("total_stars", stars)):
+        if bounds is not None:
+            column = store.column(name)
+            mask &= (column >= bounds[0]) & (column <= bounds[1])
+    if search:
+        mask &= np.isin(store.ids, store.search(search))
+    return mask
+
+
+def _store_count(store, **filters):
+    with store.lock:
+        return int(_store_mask(store, **filters).sum())
+
+
+def _store_query(store, order_by="study_id", descending=False, offset=0, limit=None, **filters):
+    """``StorageBackend.query`` answered from a columnar store"""
+    if order_by not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {order_by!r}")
+    search = filters.get("search")
+    with store.lock:
+        rows = np.flatnonzero(_store_mask(store, **filters))
+        if order_by == "relevance" and search:
+            ranks = pd.Index(store.search(search)).get_indexer(store.ids[rows])
+        else:
+            column = store.column("study_id" if order_by == "relevance" else order_by)
+            ranks = np.unique(column[rows], return_inverse=True)[1]
+        order = rows[np.lexsort((store.ids[rows], -ranks if descending else ranks))]
+        stop = None if limit is None else offset + limit
+        return [(int(store.ids[i]), store.get(i)) for i in order[offset:stop]]
+
+
+def _rank_sql(column, labels):
+    """SQL expression ordering a label column the way the store orders its codes"""
+    cases = " ".join(f"WHEN '{label}' THEN {i}" for i, label in enumerate(labels))
+    return f"CASE {column} {cases} END"
+
+
+class SQLiteBackend(StorageBackend):
+    """Persistent storage in a SQLite database"""
+
+    LOAD_CHUNK = 2000
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        # Streamlit runs each rerun on its own thread; the lock serialises access
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+            self._conn.executescript(KEY_INDEXES)
+        self._store = None
+        self._rescore()
+
+    def _migrate(self):
+        """Bring databases created by earlier versions up to the current schema"""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(studies)")}
+        for column in ("rater", "effects", "doi_key", "title_key"):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE studies ADD COLUMN {column} TEXT")
+        if "title_key" not in existing:
+            rows = self._conn.execute(
+                "SELECT study_id, doi, study_name, authors, publication_year, rater FROM studies"
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE studies SET doi_key = ?, title_key = ? WHERE study_id = ?",
+                [duplicate_keys(*row[1:]) + (row[0],) for row in rows],
+            )
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _row(study):
+        """Values for ``COLUMNS`` followed by the study's duplicate keys"""
+        values = dict(study, assessment=json.dumps(study["assessment"]))
+        values["effects"] = json.dumps(study["effects"]) if study.get("effects") else None
+        return tuple(values.get(column) for column in COLUMNS) + study_duplicate_keys(study)
+
+    @staticmethod
+    def _study(row):
+        study = dict(zip(COLUMNS, row))
+        # NULL text reads back as "", as it does from a StudyStore
+        for field in TEXT_FIELDS:
+            if study[field] is None:
+                study[field] = ""
+        study["assessment"] = json.loads(study["assessment"])
+        effects = study.pop("effects")
+        if effects:
+            study["effects"] = json.loads(effects)
+        return study
+
+    def _insert(self, studies):
+        columns = COLUMNS + ("doi_key", "title_key")
+        insert = f"INSERT INTO studies ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        return [self._conn.execute(insert, self._row(study)).lastrowid for study in studies]
+
+    def save_many(self, studies):
+        studies = list(studies)
+        with self._lock, self._conn:
+            ids = self._insert(studies)
+            if self._store is not None:
+                self._store.extend(studies, ids)
+        return ids
+
+    def save_frame(self, frame):
+        # Scored in bulk by a staging store; rows are written with the scores it computed
+        staged = StudyStore()
+        staged.extend_frame(frame)
+        with self._lock, self._conn:
+            ids = self._insert(staged.to_records())
+            if self._store is not None:
+                self._store.extend_frame(frame, ids)
+        return ids
+
+    def update(self, study_id, study):
+        assignments = ", ".join(f"{column} = ?" for column in COLUMNS + ("doi_key", "title_key"))
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE studies SET {assignments} WHERE study_id = ?", self._row(study) + (study_id,)
+            )
+            if not cursor.rowcount:
+                raise KeyError(study_id)
+            if self._store is not None:
+                self._store.update(study_id, study)
+
+    def delete(self, study_id):
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM studies WHERE study_id = ?", (study_id,))
+            if not cursor.rowcount:
+                raise KeyError(study_id)
+            if self._store is not None:
+                self._store.remove(study_id)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM studies")
+            if self._store is not None:
+                self._store.clear()
+
+    @staticmethod
+    def _where(study_types=None, qualities=None, years=None, stars=None):
+        clauses, params = [], []
+        for column, labels in (("study_type", study_types), ("quality_rating", qualities)):
+            if labels is not None:
+                labels = list(labels)
+                clauses.append(f"{column} IN ({', '.join('?' * len(labels))})" if labels else "0")
+                params.extend(labels)
+        for column, bounds in (("publication_year", years), ("total_stars", stars)):
+            if bounds is not None:
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend(bounds)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, **filters):
+        if filters.get("search"):
+            return _store_count(self.store, **filters)
+        filters.pop("search", None)
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM studies{where}", params).fetchone()[0]
+
+    def query(self, order_by="study_id", descending=False, offset=0, limit=None, **filters):
+        if order_by not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {order_by!r}")
+        if filters.get("search"):
+            # Searches need the full-text index of the columnar store
+            return _store_query(self.store, order_by, descending, offset, limit, **filters)
+        filters.pop("search", None)
+        key = {
+            "relevance": "study_id",
+            "study_type": _rank_sql("study_type", STUDY_TYPES),
+            "quality_rating": _rank_sql("quality_rating", QUALITY_LABELS),
+        }.get(order_by, order_by)
+        where, params = self._where(**filters)
+        sql = (
+            f"SELECT study_id, {', '.join(COLUMNS)} FROM studies{where} "
+            f"ORDER BY {key} {'DESC' if descending else 'ASC'}, study_id LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        return [(row[0], self._study(row[1:])) for row in rows]
+
+    @property
+    def store(self):
+        """Columnar copy of the database, loaded in chunks on first use"""
+        with self._lock:
+            if self._store is None:
+                store = StudyStore()
+                cursor = self._conn.execute(f"SELECT study_id, {', '.join(COLUMNS)} FROM studies ORDER BY study_id")
+                while True:
+                    rows = cursor.fetchmany(self.LOAD_CHUNK)
+                    if not rows:
+                        break
+                    store.extend([self._study(row[1:]) for row in rows], [row[0] for row in rows])
+                self._store = store
+            return self._store
+
+    def domain_scores(self, study_id, study):
+        if self._store is not None:
+            return self._store.domain_scores(self._store.position(study_id))
+        return super().domain_scores(study_id, study)
+
+    def find_duplicates(self, keys):
+        doi_key, title_key = keys
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT study_id FROM studies WHERE doi_key = ? OR title_key = ? ORDER BY study_id",
+                (doi_key, title_key),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _rescore(self):
+        """Rescore every row if the database was scored with other scales; True if it was"""
+        fingerprint = scale_fingerprint()
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'scales'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return False
+        with self._conn:
+            last = -1
+            while True:
+                rows = self._conn.execute(
+                    "SELECT study_id, study_type, assessment FROM studies WHERE study_id > ? ORDER BY study_id LIMIT ?",
+                    (last, self.LOAD_CHUNK),
+                ).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                updates = []
+                for study_type in {row[1] for row in rows} & set(STUDY_TYPES):
+                    members = [row for row in rows if row[1] == study_type]
+                    scale = get_scale(study_type)
+                    result = scale.score(scale.encode(json.loads(row[2]) for row in members))
+                    updates.extend(
+                        (int(total), QUALITY_LABELS[quality], row[0])
+                        for row, total, quality in zip(members, result.total_stars, result.quality_codes)
+                    )
+                self._conn.executemany(
+                    "UPDATE studies SET total_stars = ?, quality_rating = ? WHERE study_id = ?", updates
+                )
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('scales', ?)", (fingerprint,))
+        return True
+
+    def refresh_scales(self):
+        with self._lock:
+            rescored = self._rescore()
+            refreshed = self._store is not None and self._store.refresh_scales()
+        return rescored or refreshed
+
+    def add_references(self, references):
+        columns = REFERENCE_FIELDS + ("doi_key", "title_key")
+        insert = (
+            f"INSERT INTO pending_references ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        )
+        with self._lock, self._conn:
+            return [
+                self._conn.execute(
+                    insert, tuple(reference.get(field) for field in REFERENCE_FIELDS) + study_duplicate_keys(reference)
+                ).lastrowid
+                for reference in references
+            ]
+
+    def reference_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_references").fetchone()[0]
+
+    def references(self, offset=0, limit=None):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT reference_id, {', '.join(REFERENCE_FIELDS)} FROM pending_references "
+                "ORDER BY reference_id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return [(row[0], dict(zip(REFERENCE_FIELDS, row[1:]))) for row in rows]
+
+    def remove_reference(self, reference_id):
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM pending_references WHERE reference_id = ?", (reference_id,))
+            if not cursor.rowcount:
+                raise KeyError(reference_id)
+
+    def find_references(self, keys):
+        doi_key, title_key = keys
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT reference_id FROM pending_references WHERE doi_key = ? OR title_key = ? ORDER BY reference_id",
+                (doi_key, title_key),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear_references(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pending_references")
+
+
+def open_backend(path=None):
+    """SQLite backend for ``path`` (default: ``NOS_DATABASE``), or an in-memory one if neither is set"""
+    path = path or os.environ.get("NOS_DATABASE")
+    return SQLiteBackend(path) if path else MemoryBackend()
@@ -0,0 +1,802 @@
+"""Columnar store for study assessments.
+
+Studies are kept as parallel NumPy columns instead of a list of dicts: study
+type, quality rating and every criterion answer are small integer codes into
+fixed category tuples, and text fields are object arrays.  DataFrame and Arrow
+views are built from slices of those columns and kept in the shared
+``ARTIFACTS`` cache under the store's ``(uid, version)`` key until the next
+mutation, so pages read columns directly instead of re-materializing rows on
+every rerun.
+
+Domain stars and percentages are computed when studies are added and stored
+as columns too; they are only recomputed when a study changes or the scales
+are reloaded (see ``StudyStore.refresh_scales``).  Effect sizes and their
+variances for meta-analysis are two float matrices with a column per
+outcome, NaN where a study does not report it.  Report totals live in a
+``SummaryAggregates`` that is updated with each add and delete, and the
+duplicate index behind ``find_duplicates`` and the full-text index behind
+``search`` are built on first use and then kept up to date the same way.
+
+A store may be shared by several sessions (see ``src.workspace``): mutations
+and multi-column reads hold the store's ``lock``, so a page never sees a half
+written study.
+"""
+import hashlib
+import threading
+import uuid
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import SummaryAggregates
+from .cache import ARTIFACTS
+from .criteria import NOS_CRITERIA
+from .duplicates import DuplicateIndex, duplicate_keys
+from .metrics import span, timed
+from .scoring import MISSING, QUALITY_LABELS, get_scale, scale_revision
+from .search import SEARCH_FIELDS, SearchIndex, tokenize
+
+STUDY_TYPES = tuple(NOS_CRITERIA)
+TEXT_FIELDS = ("study_name", "authors", "journal", "doi", "notes", "assessment_date", "rater")
+# Arguments of ``src.duplicates.duplicate_keys``, in order
+DUPLICATE_KEY_FIELDS = ("doi", "study_name", "authors", "publication_year", "rater")
+
+# Column names used by the CSV export, in export order
+EXPORT_COLUMNS = {
+    "study_name": "Study_Name",
+    "authors": "Authors",
+    "publication_year": "Publication_Year",
+    "journal": "Journal",
+    "doi": "DOI",
+    "study_type": "Study_Type",
+    "total_stars": "Total_Stars",
+    "quality_rating": "Quality_Rating",
+    "assessment_date": "Assessment_Date",
+    "notes": "Notes",
+    "rater": "Rater",
+}
+# Column prefixes of each outcome's effect size and variance in flat tables
+EFFECT_PREFIX = "Effect_"
+VARIANCE_PREFIX = "Variance_"
+DETAILED_COLUMNS = {
+    field: EXPORT_COLUMNS[field]
+    for field in ("study_name", "authors", "publication_year", "journal", "study_type", "total_stars", "quality_rating")
+}
+
+
+def _locked(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _ordered_union(groups):
+    seen = {}
+    for group in groups:
+        for item in group:
+            seen.setdefault(item, None)
+    return tuple(seen)
+
+
+def parse_effects(effects):
+    """``(outcomes, effect, variance)`` arrays from a list of study ``effects`` dicts.
+
+    Each dict maps an outcome name to ``{"effect": float, "variance": float}``;
+    outcomes a study did not report are NaN.  Raises ``ValueError`` for a
+    non-finite effect or a variance that is not positive.
+    """
+    effects = [study_effects or {} for study_effects in effects]
+    outcomes = tuple(_ordered_union(effects))
+    effect = np.full((len(effects), len(outcomes)), np.nan)
+    variance = np.full((len(effects), len(outcomes)), np.nan)
+    for i, study_effects in enumerate(effects):
+        for outcome, values in study_effects.items():
+            j = outcomes.index(outcome)
+            effect[i, j], variance[i, j] = float(values["effect"]), float(values["variance"])
+    check_effects(outcomes, effect, variance)
+    return outcomes, effect, variance
+
+
+def check_effects(outcomes, effect, variance):
+    """Raise ``ValueError`` unless every reported effect is finite with a positive, finite variance"""
+    reported = ~np.isnan(effect) | ~np.isnan(variance)
+    with np.errstate(invalid="ignore"):
+        valid = np.isfinite(effect) & np.isfinite(variance) & (variance > 0)
+    bad = reported & ~valid
+    if bad.any():
+        outcome = outcomes[np.flatnonzero(bad.any(axis=0))[0]]
+        raise ValueError(f"Effect of {outcome!r} needs a finite effect size and a positive variance")
+
+
+def criteria_union():
+    """Criterion names across all study types, in first-seen order"""
+    return _ordered_union(get_scale(t).criteria for t in STUDY_TYPES)
+
+
+def domain_union():
+    """Domain names across all study types, in first-seen order"""
+    return _ordered_union(get_scale(t).domains for t in STUDY_TYPES)
+
+
+class _TypeLayout:
+    """Mapping between one study type's local option codes and the store's shared codes"""
+
+    def __init__(self, study_type, criteria, option_categories, domains):
+        scale = get_scale(study_type)
+        self.scale = scale
+        self.columns = np.asarray([criteria.index(name) for name in scale.criteria], dtype=np.intp)
+        self.domain_columns = np.asarray([domains.index(name) for name in scale.domains], dtype=np.intp)
+        width = max(len(categories) for categories in option_categories) + 1
+        # Trailing -1 column in both tables so MISSING maps to MISSING
+        self.to_store = np.full((len(scale.criteria), width), MISSING, dtype=np.int8)
+        self.to_local = np.full((len(scale.criteria), width), MISSING, dtype=np.int8)
+        for i, (name, keys) in enumerate(zip(scale.criteria, scale.option_keys)):
+            categories = option_categories[self.columns[i]]
+            for local, key in enumerate(keys):
+                shared = categories.index(key)
+                self.to_store[i, local] = shared
+                self.to_local[i, shared] = local
+        self._rows = np.arange(len(scale.criteria))[None, :]
+
+    def store_codes(self, local_codes):
+        return self.to_store[self._rows, local_codes]
+
+    def local_codes(self, answers):
+        return self.to_local[self._rows, answers[:, self.columns]]
+
+
+class StudyStore:
+    """Append-friendly columnar collection of study assessments"""
+
+    def __init__(self, studies=(), capacity=64):
+        self.lock = threading.RLock()
+        self._build_layouts()
+        self._n = 0
+        self._next_id = 0
+        # Outcomes with effect sizes, in first-seen order; one effect and variance column each
+        self.outcomes = ()
+        self._allocate(capacity)
+        self._reset_aggregates()
+        self._duplicates = None
+        self._search = None
+        # Identifies this store in the shared artifact cache
+        self.uid = uuid.uuid4().hex
+        self.version = 0
+        if studies:
+            self.extend(studies)
+
+    # -- storage -----------------------------------------------------------
+
+    def _build_layouts(self):
+        scales = [get_scale(t) for t in STUDY_TYPES]
+        self.criteria = criteria_union()
+        self.option_categories = tuple(
+            _ordered_union(
+                scale.option_keys[scale.criteria.index(name)]
+                for scale in scales
+                if name in scale.criteria
+            )
+            for name in self.criteria
+        )
+        self.domains = domain_union()
+        self._layouts = tuple(
+            _TypeLayout(t, self.criteria, self.option_categories, self.domains) for t in STUDY_TYPES
+        )
+        # Max stars per (study type, domain); 0 where a type has no such domain
+        self.domain_max = np.zeros((len(STUDY_TYPES), len(self.domains)), dtype=np.int16)
+        for t, layout in enumerate(self._layouts):
+            self.domain_max[t, layout.domain_columns] = layout.scale.domain_max
+        self._scale_revision = scale_revision()
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._columns = {
+            "study_id": np.empty(capacity, dtype=np.int64),
+            "study_type": np.empty(capacity, dtype=np.int8),
+            "quality_rating": np.empty(capacity, dtype=np.int8),
+            "total_stars": np.empty(capacity, dtype=np.int16),
+            "publication_year": np.empty(capacity, dtype=np.int32),
+            "answers": np.full((capacity, len(self.criteria)), MISSING, dtype=np.int8),
+            # MISSING / NaN where the study's type has no such domain
+            "domain_stars": np.full((capacity, len(self.domains)), MISSING, dtype=np.int8),
+            "domain_percentage": np.full((capacity, len(self.domains)), np.nan),
+            # NaN where a study did not report the outcome
+            "effect": np.full((capacity, len(self.outcomes)), np.nan),
+            "variance": np.full((capacity, len(self.outcomes)), np.nan),
+        }
+        for field in TEXT_FIELDS:
+            self._columns[field] = np.empty(capacity, dtype=object)
+
+    def _reset_aggregates(self):
+        self.aggregates = SummaryAggregates(STUDY_TYPES, self.domains, self.domain_max)
+
+    def _aggregate(self, rows, sign=1):
+        columns = self._columns
+        self.aggregates.update(
+            columns["study_type"][rows], columns["quality_rating"][rows],
+            columns["total_stars"][rows], columns["domain_stars"][rows], sign,
+        )
+
+    def _reserve(self, extra):
+        needed = self._n + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, 2 * self._capacity)
+        columns = self._columns
+        self._allocate(capacity)
+        for name, column in columns.items():
+            self._columns[name][:self._n] = column[:self._n]
+
+    def _effect_columns(self, outcomes):
+        """Column positions of ``outcomes``, adding columns for outcomes not seen before"""
+        new = [outcome for outcome in outcomes if outcome not in self.outcomes]
+        if new:
+            self.outcomes += tuple(new)
+            padding = np.full((self._capacity, len(new)), np.nan)
+            for name in ("effect", "variance"):
+                self._columns[name] = np.hstack([self._columns[name], padding])
+        return np.asarray([self.outcomes.index(outcome) for outcome in outcomes], dtype=np.intp)
+
+    def _write_effects(self, rows, effects):
+        """Store ``(outcomes, effect, variance)`` arrays (see ``parse_effects``) at a row slice"""
+        outcomes, effect, variance = effects
+        columns = self._effect_columns(outcomes)
+        for name, values in (("effect", effect), ("variance", variance)):
+            target = self._columns[name][rows]
+            target[:] = np.nan
+            target[:, columns] = values
+
+    def _touch(self):
+        self.version += 1
+        ARTIFACTS.discard(self.uid)
+
+    def __len__(self):
+        return self._n
+
+    def __bool__(self):
+        return self._n > 0
+
+    def column(self, name):
+        """Read-only view of a column over the stored rows"""
+        view = self._columns[name][:self._n].view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def ids(self):
+        return self.column("study_id")
+
+    # -- mutation ----------------------------------------------------------
+
+    def add(self, study, study_id=None):
+        """Append one study dict (as built by the assessment form) and return its id"""
+        return self.extend([study], None if study_id is None else [study_id])[0]
+
+    @_locked
+    def extend(self, studies, ids=None):
+        """Append many study dicts, scoring each study type in one batch.
+
+        ``ids`` lets a storage backend keep its own primary keys; by default
+        ids are assigned sequentially.
+        """
+        studies = list(studies)
+        if not studies:
+            return []
+        type_codes = np.asarray([STUDY_TYPES.index(s["study_type"]) for s in studies], dtype=np.int8)
+        years = [int(s["publication_year"]) for s in studies]
+        texts = {field: [s.get(field) or "" for s in studies] for field in TEXT_FIELDS}
+        effects = parse_effects(s.get("effects") for s in studies)
+
+        def encode(layout, members):
+            return layout.scale.encode(studies[i]["assessment"] for i in members)
+
+        return self._append(len(studies), ids, type_codes, years, texts, encode, effects)
+
+    @_locked
+    def extend_frame(self, frame, ids=None):
+        """Append studies from a table in the CSV export layout, encoding whole columns at once.
+
+        ``frame`` needs the ``EXPORT_COLUMNS`` names and one ``NOS_<criterion>``
+        column per criterion (see ``src.batch.normalize_frame``), and may have
+        ``Effect_<outcome>`` and ``Variance_<outcome>`` columns.  Stored total
+        stars and quality ratings are ignored; every study is rescored.
+        Raises ``ValueError`` for unknown study types, missing years or
+        invalid effects.
+        """
+        if not len(frame):
+            return []
+        type_codes = pd.Index(STUDY_TYPES).get_indexer(frame["Study_Type"]).astype(np.int8)
+        if (type_codes == MISSING).any():
+            raise ValueError("Unknown study type in import")
+        years = pd.to_numeric(frame["Publication_Year"], errors="coerce")
+        if years.isna().any():
+            raise ValueError("Missing publication year in import")
+        texts = {
+            field: frame[EXPORT_COLUMNS[field]].to_numpy(dtype=object, na_value="")
+            for field in TEXT_FIELDS
+        }
+        outcomes = tuple(
+            column[len(EFFECT_PREFIX):] for column in frame.columns
+            if column.startswith(EFFECT_PREFIX) and f"{VARIANCE_PREFIX}{column[len(EFFECT_PREFIX):]}" in frame
+        )
+        effects = (outcomes,) + tuple(
+            np.column_stack([
+                pd.to_numeric(frame[f"{prefix}{outcome}"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+                for outcome in outcomes
+            ]) if outcomes else np.empty((len(frame), 0))
+            for prefix in (EFFECT_PREFIX, VARIANCE_PREFIX)
+        )
+        check_effects(*effects)
+
+        def encode(layout, members):
+            return layout.scale.encode_columns(
+                {name: frame[f"NOS_{name}"].iloc[members] for name in layout.scale.criteria}, len(members)
+            )
+
+        return self._append(len(frame), ids, type_codes, years.to_numpy(dtype=np.int32), texts, encode, effects)
+
+    def _append(self, n, ids, type_codes, years, texts, encode, effects):
+        """Write ``n`` new rows; ``encode(layout, members)`` gives local option codes per study type"""
+        self._reserve(n)
+        start, stop = self._n, self._n + n
+        rows = slice(start, stop)
+        columns = self._columns
+
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+        columns["study_id"][rows] = ids
+        columns["study_type"][rows] = type_codes
+        columns["publication_year"][rows] = years
+        for field in TEXT_FIELDS:
+            columns[field][rows] = texts[field]
+        self._write_effects(rows, effects)
+
+        answers = columns["answers"]
+        answers[rows] = MISSING
+        for t, layout in enumerate(self._layouts):
+            members = np.flatnonzero(type_codes == t)
+            if not len(members):
+                continue
+            answers[start + members[:, None], layout.columns] = layout.store_codes(encode(layout, members))
+
+        self._n = stop
+        self._next_id = max(self._next_id, int(ids.max()) + 1)
+        if self._duplicates is not None:
+            self._index_duplicates(rows)
+        if self._search is not None:
+            self._index_text(rows)
+        self._score(np.arange(start, stop))
+        self._aggregate(rows)
+        self._touch()
+        return ids.tolist()
+
+    @timed("scoring/store")
+    def _score(self, rows):
+        """Recompute stars, quality and domain scores for the given row positions"""
+        columns = self._columns
+        type_codes = columns["study_type"][rows]
+        columns["domain_stars"][rows] = MISSING
+        columns["domain_percentage"][rows] = np.nan
+        for t, layout in enumerate(self._layouts):
+            members = rows[type_codes == t]
+            if not len(members):
+                continue
+            result = layout.scale.score(layout.local_codes(columns["answers"][members]))
+            columns["total_stars"][members] = result.total_stars
+            columns["quality_rating"][members] = result.quality_codes
+            target = (members[:, None], layout.domain_columns)
+            columns["domain_stars"][target] = result.domain_stars
+            domain_max = layout.scale.domain_max
+            columns["domain_percentage"][target] = np.divide(
+                result.domain_stars * 100.0, domain_max,
+                out=np.zeros(result.domain_stars.shape), where=domain_max > 0,
+            )
+
+    @_locked
+    def rescore(self):
+        """Rescore every study with the current scales"""
+        self._score(np.arange(self._n))
+        self._reset_aggregates()
+        self._aggregate(slice(0, self._n))
+        self._touch()
+
+    @_locked
+    def refresh_scales(self):
+        """Re-encode and rescore every study if the scales were reloaded since they were scored.
+
+        Cheap when nothing changed, so it can run on every rerun.
+        """
+        if self._scale_revision == scale_revision():
+            return False
+        records, ids, next_id = self.to_records(), self.ids.copy(), self._next_id
+        self._build_layouts()
+        self._n = 0
+        self.outcomes = ()
+        self._allocate(self._capacity)
+        self._reset_aggregates()
+        self._duplicates = self._search = None
+        self.extend(records)
+        self._columns["study_id"][:len(ids)] = ids
+        self._next_id = next_id
+        return True
+
+    def position(self, study_id):
+        """Row position of a study id"""
+        matches = np.flatnonzero(self.ids == study_id)
+        if not len(matches):
+            raise KeyError(study_id)
+        return int(matches[0])
+
+    @_locked
+    def delete(self, position):
+        """Remove the study at a row position"""
+        if not 0 <= position < self._n:
+            raise IndexError(position)
+        self._aggregate(slice(position, position + 1), sign=-1)
+        if self._duplicates is not None:
+            self._duplicates.remove(int(self._columns["study_id"][position]), self._duplicate_keys(position))
+        if self._search is not None:
+            self._search.remove(int(self._columns["study_id"][position]))
+        stop = self._n
+        for column in self._columns.values():
+            column[position:stop - 1] = column[position + 1:stop]
+        for field in TEXT_FIELDS:
+            self._columns[field][stop - 1] = None
+        self._n -= 1
+        self._touch()
+
+    @_locked
+    def remove(self, study_id):
+        """Remove a study by id"""
+        self.delete(self.position(study_id))
+
+    @_locked
+    def replace(self, position, study):
+        """Overwrite the study at a row position with a study dict, keeping its id"""
+        if not 0 <= position < self._n:
+            raise IndexError(position)
+        columns = self._columns
+        row = slice(position, position + 1)
+        t = STUDY_TYPES.index(study["study_type"])
+        layout = self._layouts[t]
+        codes = layout.store_codes(layout.scale.encode([study["assessment"]]))
+        effects = parse_effects([study.get("effects")])
+        self._aggregate(row, sign=-1)
+        if self._duplicates is not None:
+            self._duplicates.remove(int(columns["study_id"][position]), self._duplicate_keys(position))
+        if self._search is not None:
+            self._search.remove(int(columns["study_id"][position]))
+        columns["study_type"][position] = t
+        columns["publication_year"][position] = int(study["publication_year"])
+        for field in TEXT_FIELDS:
+            columns[field][position] = study.get(field) or ""
+        self._write_effects(row, effects)
+        columns["answers"][position] = MISSING
+        columns["answers"][position, layout.columns] = codes[0]
+        self._score(np.arange(position, position + 1))
+        self._aggregate(row)
+        if self._duplicates is not None:
+            self._duplicates.add(int(columns["study_id"][position]), self._duplicate_keys(position))
+        if self._search is not None:
+            self._index_text(row)
+        self._touch()
+
+    @_locked
+    def update(self, study_id, study):
+        """Overwrite a study by id"""
+        self.replace(self.position(study_id), study)
+
+    @_locked
+    def clear(self):
+        self._n = 0
+        self.outcomes = ()
+        self._allocate(self._capacity)
+        self._reset_aggregates()
+        self._duplicates = self._search = None
+        self._touch()
+
+    # -- duplicates --------------------------------------------------------
+
+    def _duplicate_keys(self, position):
+        return duplicate_keys(*(self._columns[field][position] for field in DUPLICATE_KEY_FIELDS))
+
+    def _index_duplicates(self, rows):
+        columns = self._columns
+        rows_values = zip(*(columns[field][rows].tolist() for field in DUPLICATE_KEY_FIELDS))
+        for study_id, values in zip(columns["study_id"][rows].tolist(), rows_values):
+            self._duplicates.add(study_id, duplicate_keys(*values))
+
+    @_locked
+    def find_duplicates(self, keys):
+        """Ids of stored studies sharing either of ``keys`` (see ``src.duplicates.duplicate_keys``)"""
+        if self._duplicates is None:
+            self._duplicates = DuplicateIndex()
+            self._index_duplicates(slice(0, self._n))
+        return self._duplicates.find(keys)
+
+    # -- search ------------------------------------------------------------
+
+    def _index_text(self, rows):
+        columns = self._columns
+        texts = zip(*(columns[field][rows].tolist() for field in SEARCH_FIELDS))
+        self._search.add_many(
+            (study_id, dict(zip(SEARCH_FIELDS, values)))
+            for study_id, values in zip(columns["study_id"][rows].tolist(), texts)
+        )
+
+    def search(self, query, limit=None):
+        """Array of the ids of the studies matching ``query``, best match first (see ``src.search``).
+
+        Results are cached until the next change, since a page asks for the
+        same search several times per rerun.
+        """
+        def build():
+            if self._search is None:
+                self._search = SearchIndex()
+                self._index_text(slice(0, self._n))
+            return np.asarray(self._search.search(query), dtype=np.int64)
+        ids = self.cached(("search", " ".join(tokenize(query))), build)
+        return ids if limit is None else ids[:limit]
+
+    # -- reads -------------------------------------------------------------
+
+    def assessment(self, position):
+        """``{criterion: option}`` dict for one stored study"""
+        layout = self._layouts[self._columns["study_type"][position]]
+        local = layout.local_codes(self._columns["answers"][position:position + 1])[0]
+        return {
+            name: keys[code]
+            for name, keys, code in zip(layout.scale.criteria, layout.scale.option_keys, local)
+            if code != MISSING
+        }
+
+    def effects(self, position):
+        """``{outcome: {"effect", "variance"}}`` dict of the outcomes a stored study reported"""
+        effect = self._columns["effect"][position]
+        variance = self._columns["variance"][position]
+        return {
+            outcome: {"effect": float(effect[j]), "variance": float(variance[j])}
+            for j, outcome in enumerate(self.outcomes)
+            if not np.isnan(effect[j])
+        }
+
+    @_locked
+    def get(self, position):
+        """Study dict at a row position, in the same shape the form saves"""
+        if not 0 <= position < self._n:
+            raise IndexError(position)
+        columns = self._columns
+        study = {
+            "study_name": columns["study_name"][position],
+            "authors": columns["authors"][position],
+            "publication_year": int(columns["publication_year"][position]),
+            "journal": columns["journal"][position],
+            "doi": columns["doi"][position],
+            "study_type": STUDY_TYPES[columns["study_type"][position]],
+            "assessment": self.assessment(position),
+            "total_stars": int(columns["total_stars"][position]),
+            "quality_rating": QUALITY_LABELS[columns["quality_rating"][position]],
+            "notes": columns["notes"][position],
+            "assessment_date": columns["assessment_date"][position],
+            "rater": columns["rater"][position],
+        }
+        # Only studies with effect sizes carry the key, so other records keep their layout
+        effects = self.effects(position)
+        if effects:
+            study["effects"] = effects
+        return study
+
+    @_locked
+    def domain_scores(self, position):
+        """``{domain: (stars, max_stars, percentage)}`` for one stored study"""
+        study_type = self._columns["study_type"][position]
+        layout = self._layouts[study_type]
+        return {
+            name: (
+                int(self._columns["domain_stars"][position, j]),
+                int(self.domain_max[study_type, j]),
+                float(self._columns["domain_percentage"][position, j]),
+            )
+            for name, j in zip(layout.scale.domains, layout.domain_columns)
+        }
+
+    def __iter__(self):
+        return (self.get(i) for i in range(self._n))
+
+    def to_records(self):
+        """All studies as a list of dicts (the JSON export shape)"""
+        return self.records()
+
+    @property
+    def cache_key(self):
+        """``(uid, version)``; changes with every mutation"""
+        return self.uid, self.version
+
+    def content_hash(self):
+        """SHA-1 of the stored studies and their scores; equal reviews hash equal across stores"""
+        def build():
+            layout = (self.criteria, self.option_categories, self.domains, self.outcomes)
+            digest = hashlib.sha1(repr(layout).encode("utf-8"))
+            for name in (
+                "study_type", "publication_year", "answers", "total_stars", "quality_rating", "domain_stars",
+                "effect", "variance",
+            ):
+                digest.update(np.ascontiguousarray(self.column(name)).tobytes())
+            for field in ("study_name", "authors"):
+                digest.update("\x1f".join(map(str, self.column(field))).encode("utf-8"))
+            return digest.hexdigest()
+        return self.cached("content_hash", build)
+
+    def cached(self, name, build):
+        """Artifact ``name`` derived from the current data, built with ``build()`` on a miss"""
+        def locked_build():
+            with self.lock:
+                return build()
+        return ARTIFACTS.get((self.uid, self.version, name), locked_build)
+
+    def chunks(self, chunksize):
+        """Row slices of at most ``chunksize`` rows covering the store (one empty slice if it is empty)"""
+        return [slice(start, start + chunksize) for start in range(0, max(self._n, 1), chunksize)]
+
+    def _categorical(self, name, categories, rows):
+        return pd.Categorical.from_codes(self.column(name)[rows], categories=list(categories))
+
+    def _used_criteria(self):
+        return (self.column("answers") != MISSING).any(axis=0)
+
+    def _applicable_domains(self):
+        return (self.column("domain_stars") != MISSING).any(axis=0)
+
+    @timed("frame/answers")
+    def _answers_frame(self, rows, used):
+        answers = self.column("answers")[rows]
+        return pd.DataFrame({
+            name: pd.Categorical.from_codes(answers[:, j], categories=list(categories))
+            for j, (name, categories) in enumerate(zip(self.criteria, self.option_categories))
+            if used[j]
+        }, copy=False)
+
+    def answers_frame(self, used_only=True):
+        """Categorical DataFrame of option answers, one column per criterion"""
+        def build():
+            used = self._used_criteria() if used_only else np.ones(len(self.criteria), dtype=bool)
+            return self._answers_frame(slice(None), used)
+        return self.cached(("answers", used_only), build)
+
+    @timed("frame/studies")
+    def _frame(self, rows):
+        data = {"study_id": self.column("study_id")[rows]}
+        for field in ("study_name", "authors", "publication_year", "journal", "doi"):
+            data[field] = self.column(field)[rows]
+        data["study_type"] = self._categorical("study_type", STUDY_TYPES, rows)
+        data["total_stars"] = self.column("total_stars")[rows]
+        data["quality_rating"] = self._categorical("quality_rating", QUALITY_LABELS, rows)
+        data["assessment_date"] = self.column("assessment_date")[rows]
+        data["notes"] = self.column("notes")[rows]
+        data["rater"] = self.column("rater")[rows]
+        return pd.DataFrame(data, copy=False)
+
+    def frame(self):
+        """DataFrame view of study-level columns with categorical type and quality"""
+        return self.cached("frame", lambda: self._frame(slice(None)))
+
+    def domain_frame(self):
+        """Wide table of domain percentages, one row per study and NaN where a domain does not apply"""
+        def build():
+            with span("frame/domains"):
+                return pd.DataFrame(
+                    self.column("domain_percentage"),
+                    index=pd.Index(self.column("study_name"), name="Study"),
+                    columns=pd.Index(self.domains, name="Domain"),
+                )
+        return self.cached("domains", build)
+
+    @timed("frame/detailed")
+    def _detailed_frame(self, rows):
+        frame = self._frame(rows)[list(DETAILED_COLUMNS)].rename(columns=DETAILED_COLUMNS)
+        stars = self.column("domain_stars")[rows]
+        domain_max = self.domain_max[self.column("study_type")[rows]]
+        percentage = self.column("domain_percentage")[rows]
+        domains = {}
+        for j in np.flatnonzero(self._applicable_domains()):
+            name = self.domains[j]
+            applies = stars[:, j] != MISSING
+            for suffix, values in (("Stars", stars[:, j]), ("Max_Stars", domain_max[:, j])):
+                values = pd.array(values, dtype="Int16")
+                values[~applies] = pd.NA
+                domains[f"{name}_{suffix}"] = values
+            domains[f"{name}_Percentage"] = percentage[:, j]
+        return pd.concat([frame, pd.DataFrame(domains, index=frame.index)], axis=1)
+
+    def detailed_frame(self, rows=None):
+        """Export table with ``<Domain>_Stars``, ``_Max_Stars`` and ``_Percentage`` columns per domain.
+
+        Pass a row slice to build just that chunk; the columns are the same
+        for every chunk.
+        """
+        if rows is not None:
+            return self._detailed_frame(rows)
+        return self.cached("detailed", lambda: self._detailed_frame(slice(None)))
+
+    def _reported_outcomes(self):
+        return np.flatnonzero(~np.isnan(self.column("effect")).all(axis=0))
+
+    def _effects_frame(self, rows):
+        """``Effect_<outcome>`` and ``Variance_<outcome>`` columns of every outcome in the review"""
+        effect, variance = self.column("effect")[rows], self.column("variance")[rows]
+        data = {}
+        for j in self._reported_outcomes():
+            data[f"{EFFECT_PREFIX}{self.outcomes[j]}"] = effect[:, j]
+            data[f"{VARIANCE_PREFIX}{self.outcomes[j]}"] = variance[:, j]
+        return pd.DataFrame(data, index=pd.RangeIndex(len(effect)))
+
+    @timed("frame/export")
+    def _export_frame(self, rows):
+        frame = self._frame(rows)[list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS)
+        answers = self._answers_frame(rows, self._used_criteria()).add_prefix("NOS_")
+        return pd.concat([frame, answers, self._effects_frame(rows)], axis=1)
+
+    def export_frame(self, rows=None):
+        """Flat export table: study columns, one ``NOS_<criterion>`` column per criterion, then effect columns.
+
+        Pass a row slice to build just that chunk; the columns are the same
+        for every chunk.
+        """
+        if rows is not None:
+            return self._export_frame(rows)
+        return self.cached("export", lambda: self._export_frame(slice(None)))
+
+    @_locked
+    def records(self, rows=slice(None)):
+        """Study dicts for a row slice"""
+        return [self.get(i) for i in range(*rows.indices(self._n))]
+
+    @timed("frame/arrow")
+    def _arrow(self, rows):
+        import pyarrow as pa
+
+        def dictionary(codes, categories):
+            # Arrow null marks a missing answer
+            missing = codes == MISSING
+            return pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=missing if missing.any() else None),
+                pa.array(list(categories), type=pa.string()),
+            )
+
+        def column(name):
+            return self.column(name)[rows]
+
+        arrays = {
+            "study_id": pa.array(column("study_id")),
+            "study_name": pa.array(column("study_name"), type=pa.string()),
+            "authors": pa.array(column("authors"), type=pa.string()),
+            "publication_year": pa.array(column("publication_year")),
+            "journal": pa.array(column("journal"), type=pa.string()),
+            "doi": pa.array(column("doi"), type=pa.string()),
+            "study_type": dictionary(column("study_type"), STUDY_TYPES),
+            "total_stars": pa.array(column("total_stars")),
+            "quality_rating": dictionary(column("quality_rating"), QUALITY_LABELS),
+            "assessment_date": pa.array(column("assessment_date"), type=pa.string()),
+            "notes": pa.array(column("notes"), type=pa.string()),
+            "rater": pa.array(column("rater"), type=pa.string()),
+        }
+        answers = column("answers")
+        domain_stars = column("domain_stars")
+        for j, name in enumerate(self.domains):
+            arrays[f"{name}_Stars"] = pa.array(domain_stars[:, j], mask=domain_stars[:, j] == MISSING)
+        for j, (name, categories) in enumerate(zip(self.criteria, self.option_categories)):
+            arrays[f"NOS_{name}"] = dictionary(np.ascontiguousarray(answers[:, j]), categories)
+        for name, values in self._effects_frame(rows).items():
+            arrays[name] = pa.array(values.to_numpy(), from_pandas=True)
+        return pa.table(arrays)
+
+    def arrow(self, rows=None):
+        """Arrow table of study columns and answers with dictionary-encoded categories"""
+        if rows is not None:
+            return self._arrow(rows)
+        return self.cached("arrow", lambda: self._arrow(slice(None)))
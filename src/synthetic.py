@@ -0,0 +1,127 @@
+"""Seeded synthetic reviews for benchmarks and timing runs.
+
+``generate_studies`` draws study types and answers uniformly from
+``NOS_CRITERIA`` with a NumPy generator, so the same seed always produces the
+same review.  Scores come from the compiled scales, as if every study had
+been saved through the assessment form.  With ``outcomes``, studies also
+report effect sizes, with lower-quality studies overstating the effect as
+they tend to in real reviews.  ``generate_ratings`` builds a
+dual- or multi-reviewer review of the same studies for agreement statistics,
+and ``reference_export`` writes studies' metadata as a reference manager
+export.
+"""
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from .scoring import QUALITY_LABELS, get_scale
+from .store import STUDY_TYPES
+
+JOURNALS = ("BMJ", "Lancet", "JAMA", "PLoS One", "BMC Public Health", "Int J Epidemiol")
+# Synthetic effects: the share of studies reporting each outcome, between-study
+# standard deviation, and the bias added per quality level below Good
+REPORTING_RATE = 0.7
+EFFECT_SD = 0.2
+QUALITY_BIAS = 0.15
+
+
+def generate_studies(n, seed=0, study_types=STUDY_TYPES, outcomes=()):
+    """``n`` study dicts in the shape the assessment form saves, with effect sizes for ``outcomes``"""
+    rng = np.random.default_rng(seed)
+    types = rng.integers(len(study_types), size=n)
+    years = rng.integers(1990, 2025, size=n)
+    journals = rng.integers(len(JOURNALS), size=n)
+    studies = [None] * n
+    for t, study_type in enumerate(study_types):
+        members = np.flatnonzero(types == t)
+        if not len(members):
+            continue
+        scale = get_scale(study_type)
+        counts = np.asarray([len(keys) for keys in scale.option_keys])
+        codes = rng.integers(0, counts, size=(len(members), len(counts)))
+        result = scale.score(codes)
+        for row, i in enumerate(members.tolist()):
+            studies[i] = {
+                "study_name": f"Study {i + 1}",
+                "authors": f"Author {i % 97 + 1} et al.",
+                "publication_year": int(years[i]),
+                "journal": JOURNALS[journals[i]],
+                "doi": f"10.1000/nos.{seed}.{i + 1}",
+                "study_type": study_type,
+                "assessment": {
+                    name: keys[code] for name, keys, code in zip(scale.criteria, scale.option_keys, codes[row].tolist())
+                },
+                "total_stars": int(result.total_stars[row]),
+                "quality_rating": QUALITY_LABELS[result.quality_codes[row]],
+                "notes": "",
+                "assessment_date": "2024-01-01 00:00:00",
+            }
+    if outcomes:
+        _add_effects(studies, outcomes, np.random.default_rng([seed, len(outcomes)]))
+    return studies
+
+
+def _add_effects(studies, outcomes, rng):
+    quality = np.asarray([QUALITY_LABELS.index(study["quality_rating"]) for study in studies])
+    shape = (len(studies), len(outcomes))
+    truth = rng.normal(0, 0.5, len(outcomes))
+    variance = 4 / rng.integers(40, 2000, size=shape)
+    effect = rng.normal(truth + QUALITY_BIAS * quality[:, None], np.sqrt(EFFECT_SD ** 2 + variance))
+    reported = rng.random(shape) < REPORTING_RATE
+    for i, study in enumerate(studies):
+        effects = {
+            outcome: {"effect": float(effect[i, j]), "variance": float(variance[i, j])}
+            for j, outcome in enumerate(outcomes) if reported[i, j]
+        }
+        if effects:
+            study["effects"] = effects
+
+
+def generate_ratings(n, raters=3, agreement=0.8, seed=0, study_types=STUDY_TYPES):
+    """``n`` studies each assessed by ``raters`` reviewers, tagged ``Rater 1``, ``Rater 2``, ...
+
+    Each rater keeps the reference answer to a criterion with probability
+    ``agreement`` and picks an option at random otherwise.
+    """
+    reference = generate_studies(n, seed, study_types)
+    rng = np.random.default_rng([seed, raters])
+    studies = []
+    for r in range(raters):
+        for study in reference:
+            scale = get_scale(study["study_type"])
+            assessment = dict(study["assessment"])
+            for name, keys in zip(scale.criteria, scale.option_keys):
+                if rng.random() >= agreement:
+                    assessment[name] = keys[rng.integers(len(keys))]
+            result = scale.score(scale.encode([assessment]))
+            studies.append(dict(
+                study, assessment=assessment, total_stars=int(result.total_stars[0]),
+                quality_rating=QUALITY_LABELS[result.quality_codes[0]], rater=f"Rater {r + 1}",
+            ))
+    return studies
+
+
+def reference_export(studies, fmt):
+    """Metadata of ``studies`` as the text of a RIS, BibTeX or EndNote XML (``fmt`` "ris", "bib", "xml") export"""
+    if fmt == "ris":
+        return "".join(
+            f"TY  - JOUR\nAU  - {s['authors']}\nTI  - {s['study_name']}\nJO  - {s['journal']}\n"
+            f"PY  - {s['publication_year']}\nDO  - {s['doi']}\nER  - \n\n"
+            for s in studies
+        )
+    if fmt == "bib":
+        return "".join(
+            f"@article{{study{i},\n  title = {{{s['study_name']}}},\n  author = {{{s['authors']}}},\n"
+            f"  journal = {{{s['journal']}}},\n  year = {s['publication_year']},\n  doi = {{{s['doi']}}}\n}}\n\n"
+            for i, s in enumerate(studies)
+        )
+    if fmt == "xml":
+        records = "".join(
+            f"<record><contributors><authors><author>{escape(s['authors'])}</author></authors></contributors>"
+            f"<titles><title>{escape(s['study_name'])}</title><secondary-title>{escape(s['journal'])}"
+            f"</secondary-title></titles><dates><year>{s['publication_year']}</year></dates>"
+            f"<electronic-resource-num>{escape(s['doi'])}</electronic-resource-num></record>\n"
+            for s in studies
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?>\n<xml><records>\n{records}</records></xml>\n'
+    raise ValueError(f"Unsupported reference format {fmt!r}")
@@ -0,0 +1,130 @@
+"""Static markup of the app: the stylesheet, header, developer banner and footer.
+
+Kept out of ``NOS Scale.py`` so the strings are built once per process
+instead of on every rerun of the script.
+"""
+
+APP_CSS = """
+<style>
+    .main-header {
+        background: linear-gradient(135deg, #2c3e50 0%, #3498db 100%);
+        padding: 2rem;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        color: white;
+        text-align: center;
+    }
+    
+    .developer-info {
+        background: linear-gradient(135deg, #f3f4f6, #e5e7eb);
+        padding: 1rem;
+        border-radius: 8px;
+        border-left: 4px solid #3498db;
+        margin: 1rem 0;
+    }
+    
+    .assessment-container {
+        background: linear-gradient(135deg, #f8f9fa, #e9ecef);
+        padding: 1.5rem;
+        border-radius: 10px;
+        border-left: 4px solid #3498db;
+        margin: 1rem 0;
+    }
+    
+    .study-card {
+        background: white;
+        padding: 1rem;
+        border-radius: 8px;
+        border: 2px solid #dee2e6;
+        margin: 0.5rem 0;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    
+    .domain-header {
+        background: linear-gradient(135deg, #6c757d, #495057);
+        color: white;
+        padding: 0.5rem 1rem;
+        border-radius: 5px;
+        font-weight: bold;
+        margin: 1rem 0 0.5rem 0;
+    }
+    
+    .good-quality {
+        background-color: #28a745;
+        color: white;
+        padding: 0.2rem 0.5rem;
+        border-radius: 3px;
+        font-size: 0.8rem;
+    }
+    
+    .fair-quality {
+        background-color: #ffc107;
+        color: black;
+        padding: 0.2rem 0.5rem;
+        border-radius: 3px;
+        font-size: 0.8rem;
+    }
+    
+    .poor-quality {
+        background-color: #dc3545;
+        color: white;
+        padding: 0.2rem 0.5rem;
+        border-radius: 3px;
+        font-size: 0.8rem;
+    }
+    
+    .summary-container {
+        background: linear-gradient(135deg, #e8f5e8, #d1ecf1);
+        padding: 1.5rem;
+        border-radius: 10px;
+        border: 2px solid #28a745;
+        margin: 1rem 0;
+    }
+    
+    .star-display {
+        font-size: 1.2rem;
+        color: #ffd700;
+    }
+    
+    .quality-bar {
+        height: 30px;
+        border-radius: 5px;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        color: white;
+        font-weight: bold;
+        margin: 2px 0;
+    }
+    
+    .quality-good { background-color: #28a745; }
+    .quality-fair { background-color: #ffc107; color: black; }
+    .quality-poor { background-color: #dc3545; }
+</style>
+"""
+
+HEADER_HTML = """
+    <div class="main-header">
+        <h1>📊 Newcastle-Ottawa Scale Assessment Tool</h1>
+        <h3>Systematic Risk of Bias Assessment for Observational Studies</h3>
+    </div>
+    """
+
+DEVELOPER_HTML = """
+    <div class="developer-info">
+        <strong>🎓 Developed by:</strong> Muhammad Nabeel Saddique<br>
+        <strong>📚 Institution:</strong> 4th Year MBBS Student, King Edward Medical University, Lahore, Pakistan<br>
+        <strong>🔬 Research Focus:</strong> Systematic Review, Meta-Analysis, Evidence-Based Medicine<br>
+        <strong>🏢 Founder:</strong> Nibras Research Academy - Mentoring young researchers in systematic reviews<br>
+        <strong>🛠️ Research Tools Expertise:</strong> Rayyan, Zotero, EndNote, WebPlotDigitizer, Meta-Converter, RevMan, MetaXL, Jamovi, CMA, OpenMeta, R Studio
+    </div>
+    """
+
+FOOTER_HTML = """
+    <div style="text-align: center; color: #666; padding: 1rem;">
+        <p><strong>Newcastle-Ottawa Scale Assessment Tool</strong></p>
+        <p>Developed for systematic review and meta-analysis research</p>
+        <p>© 2024 Muhammad Nabeel Saddique | Nibras Research Academy</p>
+        <p><em>For publication-quality bias assessment in observational studies</em></p>
+    </div>
+    """
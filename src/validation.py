@@ -0,0 +1,148 @@
+"""Vectorized validation of assessment tables.
+
+``validate_frame`` checks one chunk in the batch layout (see ``src.batch``)
+with whole-column operations: study types against ``NOS_CRITERIA``, every
+answer against its criterion's options, required metadata, effect sizes and
+their variances, and stored total stars and quality ratings against a
+recomputation.  It returns one row per violation, so callers can stream a file
+chunk by chunk and write the report as they go.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .batch import effect_columns, normalize_frame, score_columns
+from .scoring import MISSING, QUALITY_LABELS, get_scale
+from .store import EFFECT_PREFIX, STUDY_TYPES, VARIANCE_PREFIX, criteria_union
+
+ERROR = "error"
+WARNING = "warning"
+
+REQUIRED_COLUMNS = ("Study_Name", "Study_Type", "Publication_Year")
+VIOLATION_COLUMNS = ("row", "column", "severity", "message", "value", "expected")
+MIN_YEAR = 1900
+
+
+def _blank(values):
+    return values.isna().to_numpy() | values.astype(str).str.strip().eq("").to_numpy()
+
+
+class _Report:
+    """Collects violations for one chunk"""
+
+    def __init__(self, frame, first_row):
+        self.frame = frame
+        self.rows = np.arange(first_row, first_row + len(frame))
+        self.parts = []
+
+    def add(self, mask, column, message, severity=ERROR, expected=None, values=None):
+        positions = np.flatnonzero(mask)
+        if not len(positions):
+            return
+        if values is None:
+            values = self.frame[column].to_numpy(dtype=object)
+        if isinstance(expected, (np.ndarray, pd.Series, pd.api.extensions.ExtensionArray)):
+            expected = np.asarray(expected, dtype=object)[positions]
+        self.parts.append(pd.DataFrame({
+            "row": self.rows[positions],
+            "column": column,
+            "severity": severity,
+            "message": message,
+            "value": np.asarray(values, dtype=object)[positions],
+            "expected": expected,
+        }))
+
+    def result(self):
+        if not self.parts:
+            return pd.DataFrame(columns=list(VIOLATION_COLUMNS))
+        return pd.concat(self.parts, ignore_index=True)
+
+
+def validate_frame(frame, first_row=1):
+    """Violations in one chunk; ``first_row`` is the 1-based record number of its first row"""
+    raw = normalize_frame(frame, coerce=False)
+    report = _Report(raw, first_row)
+
+    # Required metadata
+    for column in REQUIRED_COLUMNS:
+        report.add(_blank(raw[column]), column, "missing required value")
+
+    present = ~_blank(raw["Publication_Year"])
+    year = pd.to_numeric(raw["Publication_Year"], errors="coerce").to_numpy(dtype=float)
+    report.add(present & np.isnan(year), "Publication_Year", "not a number")
+    last_year = datetime.now().year
+    with np.errstate(invalid="ignore"):
+        bad_year = (year < MIN_YEAR) | (year > last_year) | (year != np.round(year))
+    report.add(present & ~np.isnan(year) & bad_year, "Publication_Year", "not a year", expected=f"{MIN_YEAR}-{last_year}")
+
+    study_types = raw["Study_Type"]
+    report.add(
+        ~_blank(study_types) & ~study_types.isin(STUDY_TYPES).to_numpy(),
+        "Study_Type", "unknown study type", expected=", ".join(STUDY_TYPES),
+    )
+
+    # Answers, checked one study type at a time against that type's options
+    study_types = study_types.to_numpy(dtype=object)
+    for study_type in STUDY_TYPES:
+        in_type = study_types == study_type
+        if not in_type.any():
+            continue
+        scale = get_scale(study_type)
+        for name in criteria_union():
+            column = f"NOS_{name}"
+            answered = raw[column].notna().to_numpy()
+            if name not in scale.criteria:
+                report.add(in_type & answered, column, f"criterion does not apply to {study_type}", WARNING)
+                continue
+            keys = scale.option_keys[scale.criteria.index(name)]
+            known = raw[column].isin(keys).to_numpy()
+            report.add(in_type & ~answered, column, "missing answer", expected=", ".join(keys))
+            report.add(in_type & answered & ~known, column, "unknown option", expected=", ".join(keys))
+
+    # Effect sizes come in pairs with a positive variance
+    for column in effect_columns(raw):
+        if not column.startswith(EFFECT_PREFIX):
+            continue
+        outcome = column[len(EFFECT_PREFIX):]
+        variance_column = f"{VARIANCE_PREFIX}{outcome}"
+        effect_present = ~_blank(raw[column])
+        effect = pd.to_numeric(raw[column], errors="coerce").to_numpy(dtype=float)
+        report.add(effect_present & ~np.isfinite(effect), column, "not a number")
+        if variance_column not in raw:
+            report.add(effect_present, column, "effect size without a variance", expected=variance_column)
+            continue
+        variance_present = ~_blank(raw[variance_column])
+        variance = pd.to_numeric(raw[variance_column], errors="coerce").to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            report.add(
+                variance_present & ~(np.isfinite(variance) & (variance > 0)), variance_column,
+                "not a positive number",
+            )
+        report.add(effect_present & ~variance_present, variance_column, "missing variance for the effect size")
+        report.add(variance_present & ~effect_present, column, "missing effect size for the variance")
+
+    # Stored scores against a recomputation
+    totals, quality, _ = score_columns(raw)
+    scorable = totals != MISSING
+    stored_present = ~_blank(raw["Total_Stars"])
+    stored = pd.to_numeric(raw["Total_Stars"], errors="coerce").to_numpy(dtype=float)
+    report.add(stored_present & np.isnan(stored), "Total_Stars", "not a number")
+    report.add(
+        stored_present & scorable & ~np.isnan(stored) & (stored != totals),
+        "Total_Stars", "differs from recomputed total", expected=totals,
+    )
+    # Index MISSING (-1) picks the trailing None
+    recomputed_quality = np.asarray(QUALITY_LABELS + (None,), dtype=object)[quality]
+    stored_quality = raw["Quality_Rating"]
+    report.add(
+        ~_blank(stored_quality) & scorable & (stored_quality.to_numpy(dtype=object) != recomputed_quality),
+        "Quality_Rating", "differs from recomputed rating", expected=recomputed_quality,
+    )
+
+    return report.result().sort_values(["row", "column"], kind="stable", ignore_index=True)
+
+
+def summarize(violations):
+    """Violation counts per column, severity and message"""
+    return violations.groupby(["column", "severity", "message"], sort=True).size().rename("count")
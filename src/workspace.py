@@ -0,0 +1,173 @@
+"""Reviews shared by every session of the app process.
+
+``open_workspace`` returns one ``Workspace`` per review name, so reviewers
+working on the same review read a single in-memory copy instead of one per
+browser session.  Sessions write deltas (save, update, delete) through the
+workspace, which applies them to the underlying storage backend under a lock.
+
+Every study carries a version number.  ``update`` and ``delete`` take the
+version the caller last saw and raise ``ConflictError`` if another reviewer
+has changed or deleted the study since, so concurrent edits are never lost
+silently.  ``revision`` counts all writes to the review; sessions compare it
+with the value they last rendered to pick up other reviewers' changes.
+"""
+import os
+import threading
+
+from .storage import StorageBackend, open_backend
+
+DEFAULT_REVIEW = "default"
+
+
+class ConflictError(Exception):
+    """A study was changed or deleted by someone else since it was read"""
+
+
+class Workspace(StorageBackend):
+    """Storage backend shared between sessions, with optimistic versions per study"""
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self._lock = threading.RLock()
+        # Studies missing here are still at version 1; deleted ones map to None
+        self._versions = {}
+        self.revision = 0
+
+    def study_version(self, study_id):
+        """Current version of a study; pass it back to ``update`` or ``delete``"""
+        return self._versions.get(study_id, 1)
+
+    def _check(self, study_id, expected_version):
+        version = self.study_version(study_id)
+        if version is None:
+            raise ConflictError(f"Study {study_id} was deleted by another reviewer")
+        if expected_version is not None and version != expected_version:
+            raise ConflictError(f"Study {study_id} was changed by another reviewer")
+
+    # -- writes ------------------------------------------------------------
+
+    def save_many(self, studies):
+        with self._lock:
+            ids = self.backend.save_many(studies)
+            self.revision += 1
+        return ids
+
+    def save_frame(self, frame):
+        with self._lock:
+            ids = self.backend.save_frame(frame)
+            self.revision += 1
+        return ids
+
+    def update(self, study_id, study, expected_version=None):
+        """Replace a study; returns its new version"""
+        with self._lock:
+            self._check(study_id, expected_version)
+            try:
+                self.backend.update(study_id, study)
+            except KeyError:
+                raise ConflictError(f"Study {study_id} was deleted by another reviewer") from None
+            version = self._versions[study_id] = self.study_version(study_id) + 1
+            self.revision += 1
+        return version
+
+    def delete(self, study_id, expected_version=None):
+        with self._lock:
+            self._check(study_id, expected_version)
+            try:
+                self.backend.delete(study_id)
+            except KeyError:
+                raise ConflictError(f"Study {study_id} was deleted by another reviewer") from None
+            self._versions[study_id] = None
+            self.revision += 1
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+            self._versions.clear()
+            self.revision += 1
+
+    def refresh_scales(self):
+        with self._lock:
+            refreshed = self.backend.refresh_scales()
+            if refreshed:
+                # Other sessions rerun to show the new scores
+                self.revision += 1
+        return refreshed
+
+    def add_references(self, references):
+        with self._lock:
+            ids = self.backend.add_references(references)
+            self.revision += 1
+        return ids
+
+    def remove_reference(self, reference_id):
+        """Take a reference off the pending studies; ``ConflictError`` if someone else already did"""
+        with self._lock:
+            try:
+                self.backend.remove_reference(reference_id)
+            except KeyError:
+                raise ConflictError(f"Pending study {reference_id} was already removed by another reviewer") from None
+            self.revision += 1
+
+    def clear_references(self):
+        with self._lock:
+            self.backend.clear_references()
+            self.revision += 1
+
+    # -- reads -------------------------------------------------------------
+
+    def count(self, **filters):
+        return self.backend.count(**filters)
+
+    def query(self, order_by="study_id", descending=False, offset=0, limit=None, **filters):
+        return self.backend.query(order_by, descending, offset, limit, **filters)
+
+    @property
+    def store(self):
+        return self.backend.store
+
+    def domain_scores(self, study_id, study):
+        return self.backend.domain_scores(study_id, study)
+
+    def find_duplicates(self, keys):
+        return self.backend.find_duplicates(keys)
+
+    def reference_count(self):
+        return self.backend.reference_count()
+
+    def references(self, offset=0, limit=None):
+        return self.backend.references(offset, limit)
+
+    def find_references(self, keys):
+        return self.backend.find_references(keys)
+
+
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+
+def open_workspace(name=None, path=None):
+    """The process-wide workspace for a review, opened on first use.
+
+    With ``path`` or ``NOS_DATABASE`` set, the SQLite database is the review
+    and ``name`` is ignored; otherwise each name is a separate in-memory review.
+    """
+    path = path or os.environ.get("NOS_DATABASE")
+    key = ("sqlite", os.path.abspath(path)) if path else ("memory", name or DEFAULT_REVIEW)
+    with _workspaces_lock:
+        workspace = _workspaces.get(key)
+        if workspace is None:
+            label = os.path.splitext(os.path.basename(path))[0] if path else key[1]
+            workspace = _workspaces[key] = Workspace(label, open_backend(path))
+        return workspace
+
+
+def close_workspaces():
+    """Close and forget every open workspace"""
+    with _workspaces_lock:
+        for workspace in _workspaces.values():
+            close = getattr(workspace.backend, "close", None)
+            if close is not None:
+                close()
+        _workspaces.clear()
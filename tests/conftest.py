@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from src.synthetic import generate_studies
+
+
+@pytest.fixture
+def studies():
+    """A seeded review of every study type, some studies reporting effect sizes"""
+    return generate_studies(60, seed=3, outcomes=("mortality", "stroke"))
+
+
+@pytest.fixture
+def edited_scales(tmp_path, monkeypatch):
+    """A ``NOS_SCALES`` directory lowering the cohort study thresholds to 5 stars for Good and 3 for Fair.
+
+    The scales are not reloaded until the test does so; they are restored afterwards.
+    """
+    from src import definitions
+    from src.scoring import reload_scales
+
+    directory = tmp_path / "scales"
+    directory.mkdir()
+    with open(os.path.join(definitions.SCALES_DIR, "10_cohort.yaml"), encoding="utf-8") as handle:
+        text = handle.read()
+    text = text.replace("good: {total: 7}", "good: {total: 5}").replace("fair: {total: 5}", "fair: {total: 3}")
+    (directory / "cohort.yaml").write_text(text, encoding="utf-8")
+    monkeypatch.setenv("NOS_SCALES", str(directory))
+    yield directory
+    monkeypatch.delenv("NOS_SCALES")
+    reload_scales()
@@ -0,0 +1,131 @@
+import pandas as pd
+import pytest
+
+from src.agreement import agreement, rating_array
+from src.scoring import get_scale
+from src.store import StudyStore
+
+# Every cohort criterion at its first (starred) option
+BASE = {
+    criterion.key: criterion.options[0].key
+    for domain in get_scale("Cohort Studies").definition.domains for criterion in domain.criteria
+}
+
+
+def assessed(rater, number, comparability=None, assessment=None):
+    """A cohort study ``number`` assessed by ``rater``, all criteria alike except comparability"""
+    if assessment is None:
+        assessment = dict(BASE, comparability=comparability)
+        if comparability is None:
+            del assessment["comparability"]
+    return {
+        "study_name": f"Study {number}", "authors": "Smith J", "publication_year": 2020, "journal": "BMJ",
+        "doi": f"10.1000/{number}", "study_type": "Cohort Studies", "assessment": assessment, "rater": rater,
+    }
+
+
+def ratings(answers):
+    """``{rater: [comparability answer per study]}`` as a review"""
+    return [
+        assessed(rater, number, answer)
+        for rater, column in answers.items() for number, answer in enumerate(column, start=1)
+    ]
+
+
+TWO_RATERS = {
+    "A": ["most_important", "most_important", "additional_factor", "no_control"],
+    "B": ["most_important", "additional_factor", "additional_factor", "no_control"],
+}
+
+
+def comparability(result):
+    return result.criteria.loc["comparability"]
+
+
+def test_two_raters():
+    result = agreement(StudyStore(ratings(TWO_RATERS)))
+    assert result.raters == ("A", "B")
+    row = comparability(result)
+    assert row["studies"] == 4
+    # Observed 3/4; chance 1/2*1/4 + 1/4*1/2 + 1/4*1/4 = 5/16 for Cohen and (3/8)^2 * 2 + (1/4)^2 = 11/32 for Fleiss
+    assert row["percent_agreement"] == pytest.approx(0.75)
+    assert row["cohen_kappa"] == pytest.approx(7 / 11)
+    assert row["fleiss_kappa"] == pytest.approx(13 / 21)
+    # The domain has this one criterion, and its stars tell the three options apart
+    domain = result.domains.loc["Comparability"]
+    assert domain[["percent_agreement", "cohen_kappa", "fleiss_kappa"]].tolist() == pytest.approx(
+        row[["percent_agreement", "cohen_kappa", "fleiss_kappa"]].tolist()
+    )
+    assert result.criteria.loc["representativeness", "percent_agreement"] == 1
+
+
+def test_three_raters():
+    result = agreement(StudyStore(ratings({
+        "A": ["most_important", "most_important", "additional_factor"],
+        "B": ["most_important", "most_important", "no_control"],
+        "C": ["most_important", "additional_factor", "no_control"],
+    })))
+    row = comparability(result)
+    # Per-study pairwise agreement 1, 1/3 and 1/3; pooled shares 5/9, 2/9 and 2/9
+    assert row["percent_agreement"] == pytest.approx(5 / 9)
+    assert row["fleiss_kappa"] == pytest.approx(0.25)
+    # Cohen's kappa of the pairs AB, AC and BC is 0.4, 0 and 0.5
+    assert row["cohen_kappa"] == pytest.approx(0.3)
+
+
+def test_missing_answer_drops_the_study_from_that_criterion():
+    review = ratings(TWO_RATERS) + [assessed("A", 5, "most_important"), assessed("B", 5, None)]
+    result = agreement(StudyStore(review))
+    assert comparability(result)["studies"] == 4
+    assert comparability(result)["cohen_kappa"] == pytest.approx(7 / 11)
+    assert result.criteria.loc["representativeness", "studies"] == 5
+
+
+def test_latest_assessment_of_a_rater_counts():
+    review = [assessed("A", 2, "no_control")] + ratings(TWO_RATERS)
+    array = rating_array(StudyStore(review))
+    assert array.studies == ("doi:10.1000/2", "doi:10.1000/1", "doi:10.1000/3", "doi:10.1000/4")
+    assert comparability(agreement(StudyStore(review)))["cohen_kappa"] == pytest.approx(7 / 11)
+
+
+def stars_assessment(total):
+    """A cohort assessment worth ``total`` stars"""
+    assessment = {}
+    for domain in get_scale("Cohort Studies").definition.domains:
+        for criterion in domain.criteria:
+            options = sorted(criterion.options, key=lambda option: -option.stars)
+            option = next(option for option in options if option.stars <= total)
+            assessment[criterion.key] = option.key
+            total -= option.stars
+    assert total == 0
+    return assessment
+
+
+def test_icc_matches_shrout_and_fleiss():
+    # Shrout & Fleiss (1979), table 2, less one star each so scores fit the 9-star scale: ICC(2,1) = 0.29
+    scores = [[9, 2, 5, 8], [6, 1, 3, 2], [8, 4, 6, 8], [7, 1, 2, 6], [10, 5, 6, 9], [6, 2, 4, 7]]
+    review = [
+        assessed(rater, number, assessment=stars_assessment(row[j] - 1))
+        for number, row in enumerate(scores, start=1) for j, rater in enumerate("ABCD")
+    ]
+    result = agreement(StudyStore(review))
+    assert result.icc["studies"] == 6
+    assert result.icc["icc"] == pytest.approx(0.2898, abs=1e-4)
+
+
+# Kappas of criteria every rater answered alike are undefined in every replicate
+@pytest.mark.filterwarnings("ignore:All-NaN slice:RuntimeWarning")
+def test_bootstrap_does_not_depend_on_workers():
+    review = ratings({rater: column * 5 for rater, column in TWO_RATERS.items()})
+    serial = agreement(StudyStore(review), bootstrap=600, seed=7, workers=1)
+    parallel = agreement(StudyStore(review), bootstrap=600, seed=7, workers=2)
+    pd.testing.assert_frame_equal(serial.criteria, parallel.criteria)
+    pd.testing.assert_series_equal(serial.icc, parallel.icc)
+    row = comparability(serial)
+    assert row["cohen_kappa_low"] <= row["cohen_kappa"] <= row["cohen_kappa_high"]
+    assert row["cohen_kappa_low"] < row["cohen_kappa_high"]
+
+
+def test_one_rater_is_an_error():
+    with pytest.raises(ValueError, match="two raters"):
+        agreement(StudyStore(ratings({"A": TWO_RATERS["A"]})))
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from src.storage import MemoryBackend
+from src.workspace import Workspace
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "NOS Scale.py")
+
+
+@pytest.fixture
+def app(studies):
+    at = AppTest.from_file(APP, default_timeout=120).run()
+    at.session_state.backend = Workspace("test", MemoryBackend(studies))
+    return at
+
+
+def test_every_page_renders(app):
+    pages = app.sidebar.selectbox[0].options
+    assert "Add New Study" in pages
+    for page in pages:
+        app.sidebar.selectbox[0].select(page).run()
+        assert not app.exception, page
+
+
+def test_startup_timings_cover_every_page(app):
+    from scripts.measure_startup import PAGES
+
+    assert list(PAGES) == list(app.sidebar.selectbox[0].options)
+
+
+def test_summary_plot_can_be_weighted(app):
+    app.sidebar.selectbox[0].select("Generate Report").run()
+    weighting = app.selectbox(key="summary_weights")
+    assert weighting.options[1:] == ["Inverse variance of mortality", "Inverse variance of stroke"]
+    weighting.select("stroke").run()
+    assert not app.exception
+    assert app.selectbox(key="summary_weights").value == "stroke"
+
+
+def test_star_filter_follows_reloaded_scales(app, edited_scales):
+    from src import definitions
+
+    app.sidebar.selectbox[0].select("View All Studies").run()
+    (before,) = [slider for slider in app.slider if slider.label == "Total Stars"]
+    assert before.max == 10 and before.value == (0, 10)
+
+    # A second star for truly representative samples raises the adapted scale to 11
+    with open(os.path.join(definitions.SCALES_DIR, "40_cross_sectional_adapted.yaml"), encoding="utf-8") as handle:
+        text = handle.read()
+    (edited_scales / "adapted.yaml").write_text(
+        text.replace("{key: truly_representative, stars: 1", "{key: truly_representative, stars: 2"), encoding="utf-8",
+    )
+    app.run()
+    assert not app.exception
+    (after,) = [slider for slider in app.slider if slider.label == "Total Stars"]
+    assert after.max == 11 and after.value == (0, 11)
@@ -0,0 +1,86 @@
+import json
+
+import pandas as pd
+import pytest
+
+from scripts import batch_assessment
+from src.batch import ChunkWriter, read_chunks, scan_outcomes, score_chunks
+from src.store import StudyStore
+
+RECORDS = [
+    {
+        "study_name": "First", "study_type": "Cohort Studies", "publication_year": 2001, "assessment": {},
+        "effects": {"mortality": {"effect": 0.1, "variance": 0.01}},
+    },
+    {
+        "study_name": "Second", "study_type": "Cohort Studies", "publication_year": 2002, "assessment": {},
+        "effects": {"mortality": {"effect": 0.2, "variance": 0.02}, "stroke": {"effect": 0.3, "variance": 0.03}},
+    },
+]
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    path = tmp_path / "studies.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in RECORDS), encoding="utf-8")
+    return path
+
+
+def test_scan_outcomes_collects_every_record(jsonl):
+    assert scan_outcomes(str(jsonl)) == ("mortality", "stroke")
+
+
+@pytest.mark.parametrize("suffix", ["csv", "parquet", "jsonl"])
+def test_batch_keeps_outcomes_reported_in_later_chunks(jsonl, tmp_path, suffix):
+    output = tmp_path / f"scored.{suffix}"
+    assert batch_assessment.main(["-i", str(jsonl), "-o", str(output), "--chunksize", "1", "-q"]) == 0
+
+    read = {"csv": pd.read_csv, "parquet": pd.read_parquet, "jsonl": lambda path: pd.read_json(path, lines=True)}
+    scored = read[suffix](output)
+    assert list(scored["Study_Name"]) == ["First", "Second"]
+    assert scored["Effect_stroke"].isna().tolist() == [True, False]
+    assert scored["Variance_stroke"].iloc[1] == pytest.approx(0.03)
+    assert scored["Effect_mortality"].tolist() == pytest.approx([0.1, 0.2])
+
+
+def test_batch_rejects_outcomes_missing_from_declared_list(jsonl, tmp_path, capsys):
+    output = tmp_path / "scored.csv"
+    args = ["-i", str(jsonl), "-o", str(output), "--chunksize", "1", "-q", "--outcomes", "mortality"]
+    assert batch_assessment.main(args) == 2
+    assert "Effect_stroke" in capsys.readouterr().err
+
+
+def test_writer_reorders_later_chunks_to_the_first(jsonl, tmp_path):
+    chunks = list(score_chunks(read_chunks(str(jsonl), chunksize=1), outcomes=("mortality", "stroke")))
+    output = tmp_path / "scored.csv"
+    with ChunkWriter(str(output)) as writer:
+        writer.write(chunks[0])
+        writer.write(chunks[1][chunks[1].columns[::-1]])
+    assert list(pd.read_csv(output)["Study_Name"]) == ["First", "Second"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_scores_match_the_app(tmp_path, studies, workers):
+    source = tmp_path / "sheet.csv"
+    frame = StudyStore(studies).export_frame().drop(columns=["Total_Stars", "Quality_Rating"])
+    frame.to_csv(source, index=False)
+    output = tmp_path / "scored.csv"
+    args = ["-i", str(source), "-o", str(output), "--chunksize", "16", "--workers", str(workers), "-q"]
+    assert batch_assessment.main(args) == 0
+
+    scored = pd.read_csv(output)
+    assert scored["Total_Stars"].tolist() == [study["total_stars"] for study in studies]
+    assert scored["Quality_Rating"].tolist() == [study["quality_rating"] for study in studies]
+    for i in (0, len(studies) - 1):
+        domains = StudyStore([studies[i]]).domain_scores(0)
+        for name, (stars, _, _) in domains.items():
+            assert scored[f"{name}_Stars"].iloc[i] == stars
+
+
+def test_unknown_study_types_are_left_unscored(tmp_path, capsys):
+    source = tmp_path / "sheet.csv"
+    source.write_text("Study_Name,Study_Type,Publication_Year\nTrial,Randomised Trial,2020\n", encoding="utf-8")
+    output = tmp_path / "scored.json"
+    assert batch_assessment.main(["-i", str(source), "-o", str(output), "-q"]) == 0
+    assert pd.read_json(output)["Total_Stars"].isna().all()
+    assert "unknown study type" in capsys.readouterr().err
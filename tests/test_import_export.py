@@ -0,0 +1,231 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src.export import EXPORT_FORMATS, write_export
+from src.importer import import_file, import_references
+from src.references import format_author, read_references
+from src.storage import MemoryBackend, SQLiteBackend
+from src.store import StudyStore
+from src.synthetic import reference_export
+
+
+def export(store, fmt, **options):
+    buffer = io.BytesIO()
+    write_export(store, fmt, buffer, **options)
+    return buffer.getvalue()
+
+
+def split_effects(records):
+    """Records without their effect sizes, and the effect sizes as flat floats"""
+    rest, values = [], []
+    for record in records:
+        record = dict(record)
+        for outcome, effect in sorted(record.pop("effects", {}).items()):
+            values.extend([effect["effect"], effect["variance"]])
+        rest.append(record)
+    return rest, values
+
+
+@pytest.mark.parametrize("fmt", ["csv", "json"])
+def test_export_import_round_trip(tmp_path, studies, fmt):
+    store = StudyStore(studies)
+    path = tmp_path / f"review.{fmt}"
+    path.write_bytes(export(store, fmt, chunksize=7))
+
+    backend = MemoryBackend()
+    result = import_file(backend, str(path), chunksize=25)
+    assert len(result.ids) == len(studies)
+    assert result.skipped == result.duplicates == 0
+    imported = backend.store.to_records()
+    if fmt == "json":
+        assert imported == store.to_records()
+    else:
+        # CSV keeps 16 significant digits of each effect size
+        (imported, imported_effects), (expected, expected_effects) = map(split_effects, (imported, store.to_records()))
+        assert imported == expected
+        assert imported_effects == pytest.approx(expected_effects, rel=1e-14)
+
+    again = import_file(backend, str(path))
+    assert again.ids == [] and again.duplicates == len(studies)
+
+
+def test_chunked_exports_match_whole_exports(studies):
+    store = StudyStore(studies)
+    for fmt in ("csv", "json"):
+        assert export(store, fmt, chunksize=4) == export(store, fmt, chunksize=1000)
+    assert export(store, "csv", detailed=True, chunksize=4) == export(store, "csv", detailed=True, chunksize=1000)
+    assert export(StudyStore(), "json") == b"[]"
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_columnar_exports(studies, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    store = StudyStore(studies)
+    data = export(store, fmt, chunksize=8)
+    table = pq.read_table(io.BytesIO(data)) if fmt == "parquet" else pa.ipc.open_file(io.BytesIO(data)).read_all()
+    assert table.num_rows == len(studies)
+    frame = table.to_pandas()
+    assert frame["study_name"].tolist() == [study["study_name"] for study in studies]
+    assert frame["quality_rating"].astype(str).tolist() == [study["quality_rating"] for study in studies]
+    for i, study in enumerate(studies[:10]):
+        for name, option in study["assessment"].items():
+            assert frame[f"NOS_{name}"].iloc[i] == option
+    assert set(EXPORT_FORMATS) == {"csv", "json", "parquet", "arrow"}
+
+
+def test_import_reports_bad_rows_and_rescores(tmp_path, studies):
+    frame = StudyStore(studies[:3]).export_frame().astype(object)
+    frame.loc[0, "Study_Type"] = "Randomised Trial"
+    frame.loc[1, "Total_Stars"] = 0
+    path = tmp_path / "sheet.csv"
+    frame.to_csv(path, index=False)
+
+    backend = MemoryBackend()
+    result = import_file(backend, str(path))
+    assert result.skipped == 1
+    assert len(result.ids) == 2
+    assert set(result.violations["row"]) >= {1, 2}
+    assert backend.store.get(0)["total_stars"] == studies[1]["total_stars"]
+
+
+@pytest.mark.parametrize("fmt", ["ris", "bib", "xml"])
+@pytest.mark.parametrize("backend_type", ["memory", "sqlite"])
+def test_reference_round_trip(tmp_path, studies, fmt, backend_type):
+    path = tmp_path / f"export.{fmt}"
+    records = [dict(study, authors="Smith, John A.") for study in studies[:20]]
+    # The last record repeats the first under another title
+    path.write_text(reference_export(records + [dict(records[0], study_name="Retitled")], fmt), encoding="utf-8")
+
+    backend = MemoryBackend() if backend_type == "memory" else SQLiteBackend(str(tmp_path / "review.db"))
+    backend.save_many(studies[:2])
+    result = import_references(backend, str(path), chunksize=6)
+    assert result.duplicates == 3
+    assert len(result.ids) == 18
+    pending = [reference for _, reference in backend.references()]
+    assert pending == [
+        {
+            "study_name": study["study_name"], "authors": "Smith JA", "publication_year": study["publication_year"],
+            "journal": study["journal"], "doi": study["doi"],
+        }
+        for study in studies[2:20]
+    ]
+    assert import_references(backend, str(path)).ids == []
+
+
+BIBTEX = r"""
+@string{bmj = "British Medical Journal"}
+@comment{ignored}
+@Article{smith2020,
+  author = {Smith, John and M{\"u}ller, J{\"o}rg and {World Health Organization} and others},
+  title = {Smoking and {COPD}:
+           a cohort study},
+  journal = bmj,
+  year = 2020,
+  doi = {https://doi.org/10.1136/bmj.m1},
+}
+@book(jones, title = "Plain \& simple", author = "K. Jones", date = {2019-05-01})
+"""
+
+RIS = """TY  - JOUR
+AU  - Doe, Jane
+A1  - Roe, R.
+ED  - Editor, E.
+TI  - A long title
+      continued here
+JO  - Lancet
+PY  - 2018///
+DO  - 10.1016/S0140(18)1.
+ER  -
+"""
+
+ENDNOTE = """<?xml version="1.0" encoding="UTF-8"?>
+<xml><records>
+<record><contributors><authors><author>Lee, Ann</author><author>Kim B</author></authors></contributors>
+<titles><title><style>Cross-sectional survey</style></title></titles>
+<periodical><full-title>JAMA</full-title></periodical>
+<dates><pub-dates><date>March 2015</date></pub-dates></dates></record>
+</records></xml>
+"""
+
+
+def test_bibtex_parsing():
+    first, second = read_references(io.StringIO(BIBTEX), "bib")
+    assert first == {
+        "study_name": "Smoking and COPD: a cohort study",
+        "authors": "Smith J, Müller J, World Health Organization",
+        "publication_year": 2020,
+        "journal": "British Medical Journal",
+        "doi": "10.1136/bmj.m1",
+    }
+    assert second["study_name"] == "Plain & simple"
+    assert second["authors"] == "Jones K"
+    assert second["publication_year"] == 2019
+
+
+def test_ris_parsing():
+    (reference,) = read_references(io.StringIO(RIS), "ris")
+    assert reference == {
+        "study_name": "A long title continued here",
+        "authors": "Doe J, Roe R",
+        "publication_year": 2018,
+        "journal": "Lancet",
+        "doi": "10.1016/S0140(18)1",
+    }
+
+
+def test_endnote_parsing():
+    (reference,) = read_references(io.BytesIO(ENDNOTE.encode()), "xml")
+    assert reference == {
+        "study_name": "Cross-sectional survey",
+        "authors": "Lee A, Kim B",
+        "publication_year": 2015,
+        "journal": "JAMA",
+        "doi": "",
+    }
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Smith, John Adam", "Smith JA"),
+    ("John Adam Smith", "Smith JA"),
+    ("Smith JA", "Smith JA"),
+    ("Smith J.A.", "Smith JA"),
+    ("Smith J, et al.", "Smith J"),
+    ("", ""),
+])
+def test_format_author(name, expected):
+    assert format_author(name) == expected
+
+
+def test_missing_titles_are_reported(tmp_path):
+    path = tmp_path / "export.ris"
+    path.write_text("TY  - JOUR\nAU  - Doe, J\nER  - \n" + RIS, encoding="utf-8")
+    result = import_references(MemoryBackend(), str(path))
+    assert result.skipped == 1 and len(result.ids) == 1
+    assert result.violations[["row", "message"]].values.tolist() == [[1, "missing title"]]
+
+
+def test_csv_export_reads_back_as_a_table(studies):
+    frame = pd.read_csv(io.BytesIO(export(StudyStore(studies), "csv")))
+    assert len(frame) == len(studies)
+    assert frame["Total_Stars"].tolist() == [study["total_stars"] for study in studies]
+
+
+def test_large_exports_are_streamed_not_cached(studies, monkeypatch):
+    from src import export as exports
+    from src.cache import ARTIFACTS
+
+    store = StudyStore(studies)
+    small = exports.cached_export(store, "csv")
+    assert small == export(store, "csv") and exports.cached_export(store, "csv") is small
+
+    monkeypatch.setattr(exports, "EXPORT_CACHE_ROWS", len(studies) - 1)
+    entries = len(ARTIFACTS)
+    for fmt in EXPORT_FORMATS:
+        with exports.cached_export(store, fmt) as handle:
+            assert isinstance(handle, io.RawIOBase)
+            assert handle.read() == export(store, fmt)
+    assert len(ARTIFACTS) == entries
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.meta import EffectData, leave_one_out, pool, quality_exclusion, stratified
+
+# Five studies of one outcome; the expected values below were worked out from
+# the textbook formulas, REML by maximising its likelihood numerically
+EFFECT = np.array([0.10, 0.30, 0.50, -0.20, 0.60])
+VARIANCE = np.array([0.04, 0.09, 0.01, 0.16, 0.04])
+# Good, Good, Fair, Poor, Fair
+QUALITY = np.array([0, 0, 1, 2, 1])
+Q = 6.5695020746887955
+I2 = 39.112584872888036
+
+
+def data(effect=EFFECT, variance=VARIANCE):
+    return EffectData(
+        ("mortality",), np.array([f"Study {i}" for i in range(1, len(effect) + 1)], dtype=object),
+        np.asarray(effect, dtype=float)[:, None], np.asarray(variance, dtype=float)[:, None],
+        QUALITY[:len(effect)], np.zeros(len(effect), dtype=np.int8),
+    )
+
+
+@pytest.mark.parametrize("method, estimate, se, tau2", [
+    ("fixed", 0.4157676348547718, 0.0772987951680997, 0.0),
+    ("DL", 0.36090493673052426, 0.1176893536391008, 0.02591004184100417),
+    ("REML", 0.361554661851225, 0.1170682350316223, 0.025343608827342955),
+])
+def test_pooled_estimates(method, estimate, se, tau2):
+    pooled = pool(EFFECT, VARIANCE, np.ones(5), method)
+    assert pooled.studies.tolist() == [5]
+    assert pooled.estimate[0] == pytest.approx(estimate, rel=1e-7)
+    assert pooled.se[0] == pytest.approx(se, rel=1e-7)
+    assert pooled.tau2[0] == pytest.approx(tau2, rel=1e-6, abs=1e-12)
+    assert pooled.q[0] == pytest.approx(Q) and pooled.i2[0] == pytest.approx(I2)
+
+
+@pytest.mark.parametrize("method", ["fixed", "DL", "REML"])
+def test_weights_count_and_exclude_studies(method):
+    weights = np.array([[2, 1, 1, 0, 1], [1, 1, 0, 1, 1], [0, 0, 0, 0, 0]], dtype=float)
+    pooled = pool(EFFECT, VARIANCE, weights, method)
+    twice = pool(EFFECT[[0, 0, 1, 2, 4]], VARIANCE[[0, 0, 1, 2, 4]], np.ones(5), method)
+    without = pool(np.delete(EFFECT, 2), np.delete(VARIANCE, 2), np.ones(4), method)
+    assert pooled.estimate[0] == pytest.approx(twice.estimate[0]) and pooled.tau2[0] == pytest.approx(twice.tau2[0])
+    assert pooled.estimate[1] == pytest.approx(without.estimate[0]) and pooled.se[1] == pytest.approx(without.se[0])
+    assert pooled.studies.tolist() == [4, 4, 0] and np.isnan(pooled.estimate[2])
+    # An unreported effect takes no part, whatever its weight
+    missing = pool(np.where(np.arange(5) == 2, np.nan, EFFECT), VARIANCE, np.ones(5), method)
+    assert missing.estimate[0] == pytest.approx(without.estimate[0])
+
+
+def test_single_study_has_no_heterogeneity():
+    pooled = pool(EFFECT[:1], VARIANCE[:1], np.ones(1), "REML")
+    assert pooled.estimate[0] == EFFECT[0] and pooled.se[0] == pytest.approx(0.2)
+    assert pooled.tau2[0] == 0 and pooled.i2[0] == 0
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="Unknown pooling method"):
+        pool(EFFECT, VARIANCE, np.ones(5), "Bayes")
+
+
+def test_stratified_by_quality():
+    table = stratified(data(), by=("quality_rating",), method="fixed")
+    assert table.index.tolist() == [
+        ("mortality", "All", "All studies"),
+        ("mortality", "Quality", "Good Quality"),
+        ("mortality", "Quality", "Fair Quality"),
+        ("mortality", "Quality", "Poor Quality"),
+    ]
+    assert table["Studies"].tolist() == [5, 2, 2, 1]
+    assert table["Estimate"].iloc[0] == pytest.approx(0.4157676348547718)
+    for row, members in zip(table.index[1:], ([0, 1], [2, 4], [3])):
+        expected = pool(EFFECT[members], VARIANCE[members], np.ones(len(members)), "fixed")
+        assert table.loc[row, "Estimate"] == pytest.approx(expected.estimate[0])
+    # Q between the fixed-effect subgroup estimates around their weighted mean
+    subgroups = table.iloc[1:]
+    w = 1 / subgroups["SE"] ** 2
+    mean = (w * subgroups["Estimate"]).sum() / w.sum()
+    assert table["Q between"].iloc[1] == pytest.approx((w * (subgroups["Estimate"] - mean) ** 2).sum())
+    assert table["Q between"].isna().sum() == 3
+    z = 1.959963984540054
+    assert table["CI Low"].iloc[0] == pytest.approx(0.4157676348547718 - z * 0.0772987951680997)
+
+
+def test_empty_subgroups_are_left_out():
+    table = stratified(data(EFFECT[:2], VARIANCE[:2]), by=("quality_rating",))
+    assert table.index.get_level_values("Subgroup").tolist() == ["All studies", "Good Quality"]
+
+
+def test_quality_exclusion():
+    table = quality_exclusion(data(), method="DL")
+    assert table.index.get_level_values("Studies").tolist() == [
+        "All studies", "Without Poor Quality", "Good Quality only",
+    ]
+    assert table["Studies"].tolist() == [5, 4, 2]
+    assert table["Tau²"].iloc[0] == pytest.approx(0.02591004184100417)
+    kept = QUALITY <= 1
+    assert table["Estimate"].iloc[1] == pytest.approx(pool(EFFECT[kept], VARIANCE[kept], np.ones(4), "DL").estimate[0])
+
+
+def test_leave_one_out():
+    table = leave_one_out(data(), "mortality", method="REML")
+    assert table.index.tolist() == [f"Study {i}" for i in range(1, 6)]
+    for i, estimate in enumerate(table["Estimate"]):
+        expected = pool(np.delete(EFFECT, i), np.delete(VARIANCE, i), np.ones(4), "REML").estimate[0]
+        assert estimate == pytest.approx(expected)
+    assert table["Change"].tolist() == pytest.approx((table["Estimate"] - 0.361554661851225).tolist(), abs=1e-8)
+    with pytest.raises(ValueError, match="No study reports"):
+        leave_one_out(data(np.full(5, np.nan)), "mortality")
+
+
+def test_bootstrap_does_not_depend_on_workers():
+    options = {"by": ("quality_rating",), "bootstrap": 600, "seed": 11}
+    serial = stratified(data(), workers=1, **options)
+    parallel = stratified(data(), workers=2, **options)
+    pd.testing.assert_frame_equal(serial, parallel)
+    everything = serial.iloc[0]
+    assert everything["Boot Low"] < everything["Estimate"] < everything["Boot High"]
+    # A subgroup of one study is that study in every replicate
+    assert serial.loc[("mortality", "Quality", "Poor Quality"), ["Boot Low", "Boot High"]].tolist() == [-0.2, -0.2]
+    assert not stratified(data(), workers=1, **dict(options, seed=12)).equals(serial)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.plots import inverse_variance_weights, judgement_grid, summary_plot, summary_shares
+from src.store import StudyStore
+
+
+def test_inverse_variance_weights(studies):
+    store = StudyStore(studies)
+    weights = inverse_variance_weights(store, "mortality")
+    expected = [
+        1 / study["effects"]["mortality"]["variance"] if "mortality" in study.get("effects", {}) else 0
+        for study in studies
+    ]
+    assert np.allclose(weights, expected)
+    assert 0 < np.count_nonzero(weights) < len(studies)
+
+
+def test_weighted_summary_leaves_out_studies_without_the_outcome(studies):
+    store = StudyStore(studies)
+    weights = inverse_variance_weights(store, "mortality")
+    grid, _ = judgement_grid(store)
+    reporting = weights > 0
+    # Equal weights over the reporting studies give the unweighted shares of those studies alone
+    assert np.allclose(summary_shares(grid, reporting.astype(float)), summary_shares(grid[reporting]))
+    assert np.allclose(summary_shares(grid, np.ones(len(grid))), summary_shares(grid))
+    assert summary_plot(store, "svg", weights) != summary_plot(store, "svg")
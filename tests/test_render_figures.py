@@ -0,0 +1,70 @@
+import json
+import os
+
+from scripts import render_figures
+from src.store import StudyStore
+
+
+def write_review(path, studies):
+    path.write_text(json.dumps(StudyStore(studies).to_records()), encoding="utf-8")
+
+
+def figures(directory):
+    return sorted(name for name in os.listdir(directory))
+
+
+def test_renders_every_figure_and_skips_unchanged_reviews(tmp_path, studies):
+    reviews, output = tmp_path / "reviews", tmp_path / "figures"
+    reviews.mkdir()
+    write_review(reviews / "first.json", studies)
+    write_review(reviews / "second.json", studies[:5])
+    args = [str(reviews), str(output), "--rows-per-page", "25", "--workers", "2", "-q"]
+
+    assert render_figures.main(args) == 0
+    assert figures(output / "first") == [
+        "distribution.png", "domains.png", "summary.png",
+        "traffic_light_p1.png", "traffic_light_p2.png", "traffic_light_p3.png",
+    ]
+    assert "traffic_light.png" in figures(output / "second")
+    manifest = json.loads((output / render_figures.MANIFEST).read_text(encoding="utf-8"))
+    assert manifest["first.json"]["studies"] == len(studies)
+
+    modified = os.path.getmtime(output / "first" / "summary.png")
+    assert render_figures.main(args) == 0
+    assert os.path.getmtime(output / "first" / "summary.png") == modified
+
+
+def test_stale_traffic_light_pages_are_removed(tmp_path, studies):
+    reviews, output = tmp_path / "reviews", tmp_path / "figures"
+    reviews.mkdir()
+    write_review(reviews / "review.json", studies)
+    args = [str(reviews), str(output), "--rows-per-page", "25", "--workers", "1", "-q"]
+    assert render_figures.main(args) == 0
+
+    write_review(reviews / "review.json", studies[:30])
+    assert render_figures.main(args) == 0
+    assert figures(output / "review") == [
+        "distribution.png", "domains.png", "summary.png", "traffic_light_p1.png", "traffic_light_p2.png",
+    ]
+
+    # Also without a manifest to say which files an earlier run wrote
+    os.remove(output / render_figures.MANIFEST)
+    write_review(reviews / "review.json", studies[:10])
+    assert render_figures.main(args) == 0
+    assert figures(output / "review") == ["distribution.png", "domains.png", "summary.png", "traffic_light.png"]
+
+
+def test_a_failing_review_does_not_stop_the_run(tmp_path, capsys, studies):
+    reviews, output = tmp_path / "reviews", tmp_path / "figures"
+    reviews.mkdir()
+    write_review(reviews / "good.json", studies[:5])
+    # Records that are not objects fail inside the importer with an AttributeError
+    (reviews / "bad.json").write_text("[1, 2]", encoding="utf-8")
+
+    assert render_figures.main([str(reviews), str(output), "--workers", "2"]) == 1
+    err = capsys.readouterr().err
+    assert "nos-figures: bad.json: AttributeError" in err
+    assert "1 reviews rendered, 0 unchanged, 1 failed" in err
+    assert "summary.png" in figures(output / "good")
+    manifest = json.loads((output / render_figures.MANIFEST).read_text(encoding="utf-8"))
+    assert list(manifest) == ["good.json"]
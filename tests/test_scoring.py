@@ -0,0 +1,226 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src import definitions
+from src.criteria import NOS_CRITERIA
+from src.definitions import ScaleDefinitionError, load_definitions, parse_definition
+from src.scoring import (
+    QUALITY_LABELS, CompiledScale, calculate_total_stars, domain_scores, get_quality_rating, get_scale,
+    rate_assessment,
+)
+
+# Stars per option of the three study types the app shipped with
+BASELINE_STARS = {
+    "Cohort Studies": {
+        "representativeness": {
+            "truly_representative": 1, "somewhat_representative": 1, "selected_group": 0, "no_description": 0,
+        },
+        "selection_nonexposed": {"same_community": 1, "different_source": 0, "no_description": 0},
+        "ascertainment_exposure": {
+            "secure_record": 1, "structured_interview": 1, "written_self_report": 0, "no_description": 0,
+        },
+        "outcome_not_present": {"yes": 1, "no": 0},
+        "comparability": {"most_important": 1, "additional_factor": 2, "no_control": 0},
+        "assessment_outcome": {"independent_blind": 1, "record_linkage": 1, "self_report": 0, "no_description": 0},
+        "adequate_followup_length": {"yes": 1, "no": 0},
+        "adequacy_followup": {"complete_followup": 1, "small_loss": 1, "high_loss": 0, "no_statement": 0},
+    },
+    "Case-Control Studies": {
+        "case_definition": {"independent_validation": 1, "record_linkage": 0, "no_description": 0},
+        "representativeness_cases": {"consecutive_series": 1, "potential_selection": 0},
+        "selection_controls": {"community_controls": 1, "hospital_controls": 0, "no_description": 0},
+        "definition_controls": {"no_history": 1, "no_description": 0},
+        "comparability": {"most_important": 1, "additional_factor": 2, "no_control": 0},
+        "ascertainment_exposure": {
+            "secure_record": 1, "structured_interview": 1, "interview_not_blinded": 0, "written_self_report": 0,
+            "no_description": 0,
+        },
+        "same_method": {"yes": 1, "no": 0},
+        "non_response_rate": {"same_rate": 1, "non_respondents": 0, "rate_different": 0},
+    },
+    "Cross-Sectional Studies": {
+        "representativeness": {
+            "truly_representative": 1, "somewhat_representative": 1, "selected_group": 0, "no_description": 0,
+        },
+        "sample_size": {"justified": 1, "not_justified": 0},
+        "non_respondents": {"comparability": 1, "response_rate": 0, "no_description": 0},
+        "exposure_outcome": {"validated_tool": 1, "non_validated": 0},
+        "comparability": {"most_important": 1, "additional_factor": 2, "no_control": 0},
+        "assessment_outcome": {"independent_blind": 1, "record_linkage": 1, "self_report": 0, "no_description": 0},
+        "statistical_test": {"appropriate": 1, "inappropriate": 0},
+    },
+}
+
+
+def baseline_total(assessment, study_type):
+    """Total stars as the original app summed them"""
+    stars = BASELINE_STARS[study_type]
+    return sum(stars[name].get(option, 0) for name, option in assessment.items() if name in stars)
+
+
+def baseline_quality(total_stars, study_type):
+    """Quality label as the original app rated it"""
+    good, fair = (7, 5) if study_type in ("Cohort Studies", "Case-Control Studies") else (6, 4)
+    return QUALITY_LABELS[0 if total_stars >= good else 1 if total_stars >= fair else 2]
+
+
+def every_assessment(study_type):
+    stars = BASELINE_STARS[study_type]
+    for options in itertools.product(*stars.values()):
+        yield dict(zip(stars, options))
+
+
+@pytest.mark.parametrize("study_type", list(BASELINE_STARS))
+def test_shipped_scales_keep_the_original_stars(study_type):
+    criteria = {name: c["stars"] for domain in NOS_CRITERIA[study_type].values() for name, c in domain.items()}
+    assert criteria == BASELINE_STARS[study_type]
+
+
+@pytest.mark.parametrize("study_type", list(BASELINE_STARS))
+def test_compiled_scale_matches_baseline_on_every_answer_combination(study_type):
+    assessments = list(every_assessment(study_type))
+    scale = get_scale(study_type)
+    result = scale.score(scale.encode(assessments))
+    expected_totals = [baseline_total(a, study_type) for a in assessments]
+    assert result.total_stars.tolist() == expected_totals
+    assert result.quality_labels().tolist() == [baseline_quality(t, study_type) for t in expected_totals]
+
+
+@pytest.mark.parametrize("study_type", list(BASELINE_STARS))
+def test_single_study_helpers_match_baseline(study_type):
+    rng = np.random.default_rng(7)
+    assessments = list(every_assessment(study_type))
+    for i in rng.choice(len(assessments), 50, replace=False):
+        assessment = assessments[i]
+        total = baseline_total(assessment, study_type)
+        assert calculate_total_stars(assessment, study_type) == total
+        assert rate_assessment(assessment, study_type)[:2] == (total, baseline_quality(total, study_type))
+        assert get_quality_rating(total, study_type)[0] == baseline_quality(total, study_type)
+        assert sum(stars for stars, _, _ in domain_scores(assessment, study_type).values()) == total
+
+
+def test_unanswered_and_unknown_options_score_nothing():
+    scale = get_scale("Cohort Studies")
+    result = scale.score(scale.encode([{}, {"representativeness": "not_an_option", "comparability": "most_important"}]))
+    assert result.total_stars.tolist() == [0, 1]
+    assert result.quality_labels().tolist() == ["Poor Quality", "Poor Quality"]
+
+
+def test_ahrq_variant_rates_from_domain_minimums():
+    scale = get_scale("Cohort Studies (AHRQ)")
+    assert scale.criteria == get_scale("Cohort Studies").criteria
+    full = {name: max(stars, key=stars.get) for name, stars in BASELINE_STARS["Cohort Studies"].items()}
+    weak_selection = dict(full, representativeness="no_description", selection_nonexposed="no_description")
+    uncontrolled = dict(full, comparability="no_control")
+    result = scale.score(scale.encode([full, weak_selection, uncontrolled]))
+    # 9, 7 and 7 stars: all Good by the total-based rule, but AHRQ looks at the domains
+    assert result.total_stars.tolist() == [9, 7, 7]
+    assert result.quality_labels().tolist() == ["Good Quality", "Fair Quality", "Poor Quality"]
+    with pytest.raises(ValueError):
+        scale.classify(np.asarray([9]))
+
+
+SCALE_YAML = """\
+name: Pilot Scale
+quality:
+  good: {total: 2}
+  fair: {total: 1}
+domains:
+  - name: Selection
+    criteria:
+      - key: sampling
+        question: Sampling
+        options:
+          - {key: random, stars: 1, label: Random}
+          - {key: convenience, stars: 0, label: Convenience}
+  - name: Outcome
+    criteria:
+      - key: blinding
+        question: Blinding
+        max_stars: 2
+        options:
+          - {key: double, stars: 2, label: Double}
+          - {key: none, stars: 0, label: None}
+"""
+
+
+def test_yaml_scale_compiles_and_scores(tmp_path):
+    (tmp_path / "pilot.yaml").write_text(SCALE_YAML, encoding="utf-8")
+    (tmp_path / "pilot_strict.yaml").write_text(
+        "name: Pilot Scale (strict)\nextends: Pilot Scale\nquality:\n"
+        "  good: {total: 3}\n  fair: {domains: {Outcome: 2}}\n",
+        encoding="utf-8",
+    )
+    loaded = load_definitions([str(tmp_path)])
+    assert list(loaded) == ["Pilot Scale", "Pilot Scale (strict)"]
+
+    scale = CompiledScale(loaded["Pilot Scale"])
+    assert scale.domains == ("Selection", "Outcome")
+    assert scale.max_stars == 3
+    answers = [{"sampling": "random", "blinding": "double"}, {"sampling": "convenience", "blinding": "double"}, {}]
+    result = scale.score(scale.encode(answers))
+    assert result.total_stars.tolist() == [3, 2, 0]
+    assert result.domain_stars.tolist() == [[1, 2], [0, 2], [0, 0]]
+    assert result.quality_labels().tolist() == ["Good Quality", "Good Quality", "Poor Quality"]
+
+    strict = CompiledScale(loaded["Pilot Scale (strict)"])
+    assert strict.criteria == scale.criteria
+    assert strict.score(strict.encode(answers)).quality_labels().tolist() == [
+        "Good Quality", "Fair Quality", "Poor Quality",
+    ]
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"quality": {"good": {"total": 9}, "fair": {"total": 1}}}, "above the scale's maximum"),
+    ({"quality": {"good": {"total": 1}, "fair": {"total": 2}}}, "below the fair total"),
+    ({"quality": {"good": {"domains": {"Exposure": 1}}, "fair": {"total": 1}}}, "unknown domain"),
+    ({"colour": "red"}, "unknown fields"),
+])
+def test_invalid_definitions_are_rejected(change, message):
+    import yaml
+
+    data = dict(yaml.safe_load(SCALE_YAML), **change)
+    with pytest.raises(ScaleDefinitionError, match=message):
+        parse_definition(data, "pilot.yaml")
+
+
+def test_shipped_definitions_load_from_yaml():
+    loaded = load_definitions([definitions.SCALES_DIR])
+    assert set(BASELINE_STARS) <= set(loaded)
+    for name, definition in loaded.items():
+        assert CompiledScale(definition).criteria == get_scale(name).criteria
+
+
+def cohort_ratings(studies):
+    return [
+        rate_assessment(study["assessment"], study["study_type"])[1]
+        for study in studies if study["study_type"] == "Cohort Studies"
+    ]
+
+
+def test_edited_scale_files_are_reloaded(edited_scales, studies):
+    from src.scoring import reload_changed_scales, scale_fingerprint, scale_revision
+
+    before, revision, fingerprint = cohort_ratings(studies), scale_revision(), scale_fingerprint()
+    assert reload_changed_scales()
+    assert not reload_changed_scales()
+    assert scale_revision() == revision + 1 and scale_fingerprint() != fingerprint
+    after = cohort_ratings(studies)
+    assert after != before and after.count("Good Quality") > before.count("Good Quality")
+    assert get_scale("Cohort Studies").definition.quality.good_total == 5
+
+
+def test_new_study_types_need_a_restart(edited_scales, studies):
+    from src.scoring import reload_changed_scales
+
+    (edited_scales / "other.yaml").write_text(
+        (edited_scales / "cohort.yaml").read_text(encoding="utf-8").replace("name: Cohort Studies", "name: Other"),
+        encoding="utf-8",
+    )
+    before = cohort_ratings(studies)
+    with pytest.raises(ScaleDefinitionError, match="restart"):
+        reload_changed_scales()
+    assert "Other" not in definitions.SCALE_DEFINITIONS
+    assert cohort_ratings(studies) == before
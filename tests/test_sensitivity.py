@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from src.definitions import QualityRule
+from src.scoring import QUALITY_LABELS, get_scale
+from src.sensitivity import (
+    SensitivityRule, baseline_rule, cutoff_grid, cutoff_rule, evaluate, reclassification_table, rule_table,
+    scale_rule, shifted_rules, summary,
+)
+from src.store import StudyStore
+
+
+def cohort(number, **stars):
+    """A cohort study with the given stars in each domain (``Selection=4, Comparability=1, ...``)"""
+    assessment = {}
+    for domain in get_scale("Cohort Studies").definition.domains:
+        remaining = stars[domain.name]
+        for criterion in domain.criteria:
+            options = sorted(criterion.options, key=lambda option: -option.stars)
+            option = next(option for option in options if option.stars <= remaining)
+            assessment[criterion.key] = option.key
+            remaining -= option.stars
+        assert remaining == 0
+    return {
+        "study_name": f"Study {number}", "authors": "", "publication_year": 2020, "journal": "", "doi": "",
+        "study_type": "Cohort Studies", "assessment": assessment,
+    }
+
+
+# 4, 6 and 8 stars: Poor, Fair and Good under the cohort scale's cut-offs of 7 and 5
+PROFILES = [
+    cohort(1, Selection=2, Comparability=0, Outcome=2),
+    cohort(2, Selection=3, Comparability=1, Outcome=2),
+    cohort(3, Selection=4, Comparability=2, Outcome=2),
+]
+
+
+def test_baseline_rule_reproduces_stored_ratings(studies):
+    store = StudyStore(studies)
+    result = evaluate(store, [baseline_rule(), cutoff_rule(7, 5)])
+    stored = [study["quality_rating"] for study in studies]
+    assert [QUALITY_LABELS[code] for code in result.baseline_codes()] == stored
+    assert [QUALITY_LABELS[code] for code in result.codes(0)] == stored
+    table = summary(result)
+    assert table["Reclassified"].iloc[0] == 0
+    assert table[["Good", "Fair", "Poor"]].iloc[0].tolist() == [stored.count(label) for label in QUALITY_LABELS]
+    assert np.array_equal(np.diag(result.reclassification[0]), table[["Good", "Fair", "Poor"]].iloc[0])
+
+
+def test_cutoff_rules_reclassify_known_profiles():
+    store = StudyStore(PROFILES)
+    assert [study["total_stars"] for study in store] == [4, 6, 8]
+    result = evaluate(store, [cutoff_rule(6, 3), cutoff_rule(9, 7)])
+    assert result.baseline_codes().tolist() == [2, 1, 0]
+    assert result.codes(0).tolist() == [1, 0, 0]
+    assert result.codes(1).tolist() == [2, 2, 1]
+    assert result.changes().tolist() == [1, 2, 1]
+
+    table = summary(result)
+    assert table.index.tolist() == ["Good ≥ 6, Fair ≥ 3", "Good ≥ 9, Fair ≥ 7"]
+    assert table[["Upgraded", "Downgraded", "Good cut-off", "Fair cut-off"]].values.tolist() == [
+        [2, 0, 6, 3], [0, 2, 9, 7],
+    ]
+    crosstab = reclassification_table(result, 0)
+    assert crosstab.loc["Fair", "Good"] == crosstab.loc["Poor", "Fair"] == crosstab.loc["Good", "Good"] == 1
+    assert crosstab.values.sum() == 3
+
+
+def test_cutoff_grid_and_shifts():
+    grid = cutoff_grid(range(5, 8), range(4, 7))
+    assert all(rule.cutoffs[0] >= rule.cutoffs[1] for rule in grid) and len(grid) == 8
+    (down,) = shifted_rules([-2])
+    quality = dict(down.rules)["Cohort Studies"]
+    assert (quality.good_total, quality.fair_total) == (5, 3)
+    assert evaluate(StudyStore(PROFILES), [down]).codes(0).tolist() == [1, 0, 0]
+
+
+def test_ahrq_rule_applies_domain_minimums():
+    review = PROFILES + [
+        # 7 stars, Good by total, but one Outcome star is below the AHRQ minimum of 2
+        cohort(4, Selection=4, Comparability=2, Outcome=1),
+        # 5 stars: Fair both ways
+        cohort(5, Selection=2, Comparability=1, Outcome=2),
+    ]
+    rule = scale_rule("AHRQ", ["Cohort Studies (AHRQ)", "Case-Control Studies (AHRQ)"])
+    rules = dict(rule.rules)
+    assert rules["Cohort Studies"] == get_scale("Cohort Studies (AHRQ)").definition.quality
+    # No AHRQ rule has the cross-sectional criteria, so that type keeps its own rule
+    assert "Cross-Sectional Studies" not in rules
+
+    result = evaluate(StudyStore(review), [rule])
+    assert result.baseline_codes().tolist() == [2, 1, 0, 0, 1]
+    # Study 1 has no Comparability star; study 2 meets every Good minimum with 6 stars
+    assert result.codes(0).tolist() == [2, 0, 0, 2, 1]
+    assert summary(result)[["Upgraded", "Downgraded"]].values.tolist() == [[1, 1]]
+
+
+def test_unknown_study_types_and_domains_are_errors():
+    domains = StudyStore().domains
+    with pytest.raises(ValueError, match="unknown study type 'Randomised Trials'"):
+        rule_table([SensitivityRule("Trials", (("Randomised Trials", QualityRule(7, 5)),))], domains)
+    exposure = QualityRule(7, 5, good_domains=(("Exposure", 2),))
+    with pytest.raises(ValueError, match="Cohort Studies has no domain 'Exposure'"):
+        rule_table([SensitivityRule("Exposure", (("Cohort Studies", exposure),))], domains)
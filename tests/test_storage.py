@@ -0,0 +1,124 @@
+import pytest
+
+from src.duplicates import study_duplicate_keys
+from src.storage import MemoryBackend, SQLiteBackend
+from src.workspace import ConflictError, Workspace
+
+QUERIES = [
+    {},
+    {"order_by": "study_name"},
+    {"order_by": "quality_rating", "descending": True},
+    {"order_by": "study_type", "offset": 5, "limit": 10},
+    {"order_by": "total_stars", "years": (2000, 2015)},
+    {"study_types": ["Cohort Studies", "Cross-Sectional Studies"], "qualities": ["Good Quality"]},
+    {"stars": (3, 6), "order_by": "publication_year", "descending": True},
+    {"search": "study 1", "order_by": "relevance"},
+    {"study_types": []},
+]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        backend = SQLiteBackend(str(tmp_path / "review.db"))
+        yield backend
+        backend.close()
+
+
+@pytest.fixture
+def pair(tmp_path, studies):
+    memory, sqlite = MemoryBackend(), SQLiteBackend(str(tmp_path / "review.db"))
+    for backend in (memory, sqlite):
+        backend.save_many(studies)
+    yield memory, sqlite
+    sqlite.close()
+
+
+def pages(backend, **query):
+    return [study for _, study in backend.query(**query)]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_backends_answer_queries_alike(pair, query):
+    memory, sqlite = pair
+    filters = {key: value for key, value in query.items() if key not in ("order_by", "descending", "offset", "limit")}
+    assert pages(memory, **query) == pages(sqlite, **query)
+    assert memory.count(**filters) == sqlite.count(**filters)
+
+
+def test_backends_agree_after_updates_and_deletes(pair, studies):
+    memory, sqlite = pair
+    for backend in (memory, sqlite):
+        ids = [study_id for study_id, _ in backend.query()]
+        backend.update(ids[3], dict(studies[40], study_name="Updated"))
+        backend.delete(ids[7])
+        with pytest.raises(KeyError):
+            backend.delete(ids[7])
+    assert pages(memory) == pages(sqlite)
+    assert memory.count() == sqlite.count() == len(studies) - 1
+    assert memory.store.to_records() == sqlite.store.to_records()
+
+
+def test_sqlite_reopens_with_the_same_review(tmp_path, studies):
+    path = str(tmp_path / "review.db")
+    first = SQLiteBackend(path)
+    first.save_many(studies)
+    first.close()
+    reopened = SQLiteBackend(path)
+    assert reopened.store.to_records() == MemoryBackend(studies).store.to_records()
+    reopened.close()
+
+
+def test_duplicates_found_by_doi_and_title(backend, studies):
+    ids = backend.save_many(studies[:5])
+    assert backend.find_duplicates(study_duplicate_keys(studies[2])) == [ids[2]]
+    retitled = dict(studies[2], doi="")
+    assert backend.find_duplicates(study_duplicate_keys(retitled)) == [ids[2]]
+    assert backend.find_duplicates(study_duplicate_keys(studies[6])) == []
+
+
+def test_reference_queue(backend):
+    references = [
+        {"study_name": "Alpha", "authors": "Smith J", "publication_year": 2001, "journal": "BMJ", "doi": "10.1/a"},
+        {"study_name": "Beta", "authors": "Jones K", "publication_year": 2002, "journal": "", "doi": ""},
+    ]
+    ids = backend.add_references(references)
+    assert backend.reference_count() == 2
+    assert backend.references() == list(zip(ids, references))
+    assert backend.find_references(study_duplicate_keys(references[1])) == [ids[1]]
+    backend.remove_reference(ids[0])
+    with pytest.raises(KeyError):
+        backend.remove_reference(ids[0])
+    assert backend.references(limit=5) == [(ids[1], references[1])]
+    backend.clear_references()
+    assert backend.reference_count() == 0
+
+
+def test_workspace_rejects_stale_writes(backend, studies):
+    workspace = Workspace("review", backend)
+    study_id = workspace.save(studies[0])
+    version = workspace.study_version(study_id)
+    workspace.update(study_id, dict(studies[0], notes="first edit"), expected_version=version)
+    with pytest.raises(ConflictError):
+        workspace.update(study_id, dict(studies[0], notes="stale edit"), expected_version=version)
+    with pytest.raises(ConflictError):
+        workspace.remove_reference(12345)
+
+
+def test_sqlite_rescores_stored_studies_when_scales_change(tmp_path, studies, edited_scales):
+    from src.scoring import reload_changed_scales
+
+    path = str(tmp_path / "review.db")
+    backend = Workspace("review", SQLiteBackend(path))
+    backend.save_many(studies)
+    revision = backend.revision
+    assert not backend.refresh_scales()
+
+    reload_changed_scales()
+    assert backend.refresh_scales()
+    assert backend.revision > revision
+    assert pages(backend) == pages(MemoryBackend(studies))
+    assert not backend.refresh_scales()
+    backend.backend.close()
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.batch import normalize_frame
+from src.duplicates import study_duplicate_keys
+from src.scoring import rate_assessment
+from src.store import StudyStore
+
+
+def comparable(study):
+    """A study dict without the keys the store is free to fill in"""
+    return {key: value for key, value in study.items() if key != "rater" or value}
+
+
+def test_round_trip_keeps_every_study(studies):
+    store = StudyStore(studies)
+    assert len(store) == len(studies)
+    assert [comparable(study) for study in store] == [comparable(study) for study in studies]
+    assert store.to_records() == list(store)
+
+
+def test_scores_match_single_study_scoring(studies):
+    store = StudyStore(studies)
+    for i, study in enumerate(studies):
+        total, quality, _ = rate_assessment(study["assessment"], study["study_type"])
+        assert store.get(i)["total_stars"] == total
+        assert store.get(i)["quality_rating"] == quality
+
+
+def test_extend_frame_matches_extend(studies):
+    frame = normalize_frame(StudyStore(studies).export_frame(), coerce=False)
+    assert list(StudyStore().extend(studies)) == list(range(len(studies)))
+    staged = StudyStore()
+    staged.extend_frame(frame)
+    assert [comparable(study) for study in staged] == [comparable(study) for study in studies]
+
+
+def test_delete_and_replace_keep_ids_and_aggregates(studies):
+    store = StudyStore(studies)
+    ids = store.ids.tolist()
+
+    store.delete(0)
+    store.remove(ids[10])
+    assert store.ids.tolist() == ids[1:10] + ids[11:]
+    with pytest.raises(KeyError):
+        store.position(ids[10])
+    with pytest.raises(IndexError):
+        store.delete(len(store))
+
+    position = store.position(ids[5])
+    replacement = dict(studies[20], study_name="Replacement", effects={"stroke": {"effect": 0.5, "variance": 0.1}})
+    store.replace(position, replacement)
+    assert int(store.ids[position]) == ids[5]
+    replaced = store.get(position)
+    assert replaced["study_name"] == "Replacement"
+    assert replaced["assessment"] == studies[20]["assessment"]
+    assert replaced["effects"] == {"stroke": {"effect": 0.5, "variance": 0.1}}
+
+    # Incremental aggregates and search agree with a store built from scratch
+    rebuilt = StudyStore(list(store))
+    for name in ("quality_counts", "type_counts", "star_counts", "domain_star_sums"):
+        assert np.array_equal(getattr(store.aggregates, name), getattr(rebuilt.aggregates, name))
+    assert store.search("Replacement").tolist() == [ids[5]]
+    assert store.find_duplicates(study_duplicate_keys(studies[10])) == []
+    assert store.find_duplicates(study_duplicate_keys(studies[11])) == [ids[11]]
+
+
+def test_clear_and_version(studies):
+    store = StudyStore(studies)
+    version = store.version
+    store.clear()
+    assert len(store) == 0 and store.version > version
+    assert store.outcomes == ()
+    store.add(studies[0])
+    assert store.get(0)["study_name"] == studies[0]["study_name"]
+
+
+def test_export_frame_layout(studies):
+    frame = StudyStore(studies).export_frame()
+    assert list(frame.columns[:3]) == ["Study_Name", "Authors", "Publication_Year"]
+    assert {"Effect_mortality", "Variance_mortality", "Effect_stroke", "Variance_stroke"} <= set(frame.columns)
+    reported = [study.get("effects", {}).get("mortality", {}).get("effect", np.nan) for study in studies]
+    assert np.allclose(frame["Effect_mortality"], pd.Series(reported, dtype=float), equal_nan=True)
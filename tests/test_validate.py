@@ -0,0 +1,58 @@
+import json
+
+import pandas as pd
+import pytest
+
+from scripts import validate_data
+from src.store import StudyStore
+
+
+@pytest.mark.parametrize("name, content", [("empty.json", "[]\n"), ("empty.jsonl", ""), ("empty.csv", "Study_Name\n")])
+def test_empty_input_validates_cleanly(tmp_path, capsys, name, content):
+    source = tmp_path / name
+    source.write_text(content, encoding="utf-8")
+    report = tmp_path / "violations.csv"
+    assert validate_data.main(["-i", str(source), "-r", str(report)]) == 0
+    assert "0 rows validated" in capsys.readouterr().out
+    assert list(pd.read_csv(report).columns) == ["row", "column", "severity", "message", "value", "expected"]
+
+
+def test_violations_are_reported_and_fail_the_run(tmp_path, capsys, studies):
+    frame = StudyStore(studies[:4]).export_frame().astype(object)
+    frame.loc[0, "NOS_comparability"] = "everything"
+    frame.loc[2, "Total_Stars"] = 99
+    source = tmp_path / "sheet.csv"
+    frame.to_csv(source, index=False)
+    report = tmp_path / "violations.jsonl"
+
+    assert validate_data.main(["-i", str(source), "-r", str(report), "--chunksize", "2"]) == 1
+    out = capsys.readouterr().out
+    assert "4 rows validated" in out and "2 errors" in out
+    violations = pd.read_json(report, lines=True)
+    assert sorted(violations["row"]) == [1, 3]
+    assert set(violations["column"]) == {"NOS_comparability", "Total_Stars"}
+
+
+def test_clean_file_passes(tmp_path, studies):
+    source = tmp_path / "review.json"
+    source.write_text(json.dumps(StudyStore(studies).to_records()), encoding="utf-8")
+    assert validate_data.main(["-i", str(source), "--strict"]) == 0
+
+
+def test_unreadable_input_exits_with_usage_error(tmp_path, capsys):
+    assert validate_data.main(["-i", str(tmp_path / "missing.csv")]) == 2
+    assert "nos-validate:" in capsys.readouterr().err
+
+
+def test_csv_report_has_one_header_when_the_first_chunk_is_clean(tmp_path, studies):
+    frame = StudyStore(studies[:20]).export_frame().astype(object)
+    frame.loc[15, "Total_Stars"] = 99
+    source = tmp_path / "sheet.csv"
+    frame.to_csv(source, index=False)
+    report = tmp_path / "violations.csv"
+
+    assert validate_data.main(["-i", str(source), "-r", str(report), "--chunksize", "10"]) == 1
+    lines = report.read_text(encoding="utf-8").splitlines()
+    assert lines[0].startswith("row,") and sum(line.startswith("row,") for line in lines) == 1
+    violations = pd.read_csv(report)
+    assert violations[["row", "column"]].values.tolist() == [[16, "Total_Stars"]]